@@ -0,0 +1,81 @@
+import threading
+import time
+
+import grpc
+
+from storage import Storage
+
+# Seconds between reads of the stored message bytes from the storage
+REFRESH_INTERVAL = 0.1
+
+
+class Admission:
+    """
+    Admission control of the messages the server stores: a quota of messages per inbox, and a budget of message bytes
+    for the whole server.
+
+    Once the stored bytes pass high_watermark of the budget, bulk sends (SendMessages streams and group messages) are
+    turned away, so that single messages still get through while the rest of the budget lasts. Past the budget, every
+    send is turned away until deletes or expiries free some of it. Rejections tell the client to retry after
+    retry_after seconds.
+
+    The stored bytes are read from the storage at most every REFRESH_INTERVAL seconds, and the bytes admitted since are
+    added to them, so a check costs O(1). Both limits are soft: concurrent sends may overshoot them slightly.
+    A limit of 0 turns it off.
+    """
+
+    def __init__(self, storage: Storage, inbox_quota: int, budget: int, high_watermark: float, retry_after: float):
+        self.storage = storage
+        self.inbox_quota = inbox_quota
+        self.budget = budget
+        self.high_watermark = high_watermark
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self.stored_bytes = 0
+        self.admitted_bytes = 0  # admitted since the stored bytes were read
+        self.refreshed = float("-inf")
+        self.rejected = 0
+
+    def used_bytes(self) -> int:
+        now = time.monotonic()
+        with self.lock:
+            if now - self.refreshed >= REFRESH_INTERVAL:
+                self.stored_bytes, self.admitted_bytes, self.refreshed = self.storage.message_bytes, 0, now
+            return self.stored_bytes + self.admitted_bytes
+
+    def check(self, recipient: str | None, size: int, bulk: bool = False, pending: int = 0) -> str | None:
+        """
+        Admit a message of size bytes to the recipient's inbox (None for a group message), counting its bytes.
+        pending is the number of messages already admitted to the inbox but not stored yet (by a batch).
+
+        Returns None if the message is admitted, and otherwise the reason why it is not.
+        """
+        if self.budget:
+            limit = self.budget * self.high_watermark if bulk else self.budget
+            if self.used_bytes() + size > limit:
+                return self.reject("the server is out of space for messages")
+
+        if recipient is not None and self.inbox_quota:
+            inbox_size = self.storage.inbox_size(recipient)
+            if inbox_size is not None and inbox_size + pending >= self.inbox_quota:
+                return self.reject(f"the inbox of \"{recipient}\" is full")
+
+        with self.lock:
+            self.admitted_bytes += size
+        return None
+
+    def reject(self, reason: str) -> str:
+        with self.lock:
+            self.rejected += 1
+        return f"{reason}, retry in {self.retry_after:g} s."
+
+    def abort(self, context: grpc.ServicerContext, error_message: str):
+        """
+        End a call with RESOURCE_EXHAUSTED, and the retry-after trailing metadata in seconds.
+
+        The handler returns normally after this (it works on both sync and grpc.aio contexts).
+        """
+        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        context.set_details(error_message)
+        context.set_trailing_metadata((("retry-after", f"{self.retry_after:g}"),))
@@ -0,0 +1,90 @@
+"""
+Benchmark of pushing many messages over gRPC: one SendMessage call per message against one SendMessages stream.
+
+The benchmark serves a ChatServer on a local port with the configured storage backend and metrics interceptor, creates
+the recipients, then has one sender (like an integration pushing notifications) send the same number of messages both
+ways and reports the messages per second. The stream carries the messages in requests of --chunk messages each.
+
+Usage: python -m benchmarks.bulk_send [--messages 50000] [--users 1000] [--chunk 500] [--port 8010]
+"""
+
+import argparse
+import tempfile
+import time
+import uuid
+
+from concurrent import futures
+
+import server
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, MAX_WORKERS, STORAGE_BACKEND
+from metrics import MetricsInterceptor
+from server import ChatServer, create_storage
+
+SENDER = "notifier"
+
+
+def make_messages(count: int, usernames: list[str]) -> list[Message]:
+    return [Message(id=uuid.uuid4().bytes,
+                    sender=SENDER,
+                    recipient=usernames[i % len(usernames)],
+                    body=f"benchmark message number {i}",
+                    timestamp=float(i)) for i in range(count)]
+
+
+def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed:7.2f} s  ({count / elapsed:10.0f} messages/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark unary against streamed message sends")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=500, help="messages per SendMessages request")
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+
+    server.DEBUG = False
+    with tempfile.TemporaryDirectory(prefix="bulk-send-bench-") as data_dir:
+        chat_server = ChatServer(create_storage(data_dir if STORAGE_BACKEND == "sqlite" else None))
+        grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS),
+                                  interceptors=[MetricsInterceptor(chat_server.metrics)])
+        add_ChatServicer_to_server(chat_server, grpc_server)
+        grpc_server.add_insecure_port(f"{LOCALHOST}:{args.port}")
+        grpc_server.start()
+
+        usernames = [f"user{i}" for i in range(args.users)]
+        for username in usernames:
+            chat_server.storage.create_user(username, "password")
+
+        unary_requests = [SendMessageRequest(username=SENDER, message=message)
+                          for message in make_messages(args.messages, usernames)]
+        stream_messages = make_messages(args.messages, usernames)
+        stream_requests = [SendMessagesRequest(username=SENDER, messages=stream_messages[i:i + args.chunk])
+                           for i in range(0, args.messages, args.chunk)]
+
+        with grpc.insecure_channel(f"{LOCALHOST}:{args.port}") as channel:
+            stub = ChatStub(channel)
+
+            def unary():
+                for request in unary_requests:
+                    assert stub.SendMessage(request).status == Status.SUCCESS
+
+            def streamed():
+                resp = stub.SendMessages(iter(stream_requests))
+                assert resp.status == Status.SUCCESS and len(resp.results) == args.messages
+
+            timed("SendMessage", args.messages, unary)
+            timed("SendMessages", args.messages, streamed)
+
+        grpc_server.stop(None)
+        chat_server.storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of GetMessages over a large inbox, with and without compressed responses.
+
+The benchmark serves a ChatServer on a local port, fills one inbox with --messages messages of chat-like text, and
+connects to it through a TCP proxy that counts the bytes on the wire both ways. It then syncs the whole inbox with
+GetMessages (in pages of --limit messages) --repeat times with each compression algorithm, and reports the bytes on
+the wire and the latency per sync. Every sync is made on a new channel, so each one pays for its own connection.
+
+Usage: python -m benchmarks.compression [--messages 20000] [--limit 5000] [--body 200] [--repeat 5] [--port 8012]
+"""
+
+import argparse
+import random
+import socket
+import threading
+import time
+import uuid
+
+from concurrent import futures
+
+import server
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, MAX_WORKERS
+from server import ChatServer
+from transport import ALGORITHMS, CompressionInterceptor, channel_options, server_options
+
+RECIPIENT = "reader"
+WORDS = ("the meeting is moved to tomorrow at noon, can you send me the slides before then? thanks, "
+         "sounds good, I will be there in ten minutes. did you see the latest build results on the dashboard").split()
+
+
+class ByteCounter:
+    """TCP proxy from a local port to the server that counts the bytes it forwards, in each direction."""
+
+    def __init__(self, port: int, target: tuple[str, int]):
+        self.target = target
+        self.sent = 0  # client to server
+        self.received = 0  # server to client
+        self.lock = threading.Lock()
+        self.listener = socket.create_server((LOCALHOST, port))
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            client = self.listener.accept()[0]
+            upstream = socket.create_connection(self.target)
+            threading.Thread(target=self.pipe, args=(client, upstream, "sent"), daemon=True).start()
+            threading.Thread(target=self.pipe, args=(upstream, client, "received"), daemon=True).start()
+
+    def pipe(self, source: socket.socket, sink: socket.socket, counter: str):
+        try:
+            while data := source.recv(65536):
+                sink.sendall(data)
+                with self.lock:
+                    setattr(self, counter, getattr(self, counter) + len(data))
+        except OSError:
+            pass
+        finally:
+            sink.close()
+
+    def reset(self) -> tuple[int, int]:
+        with self.lock:
+            counts = self.sent, self.received
+            self.sent = self.received = 0
+        return counts
+
+
+def sync(addr: str, limit: int) -> int:
+    """Get every message of the inbox, a page at a time, returning how many there were."""
+    count, page_token = 0, b""
+    with grpc.insecure_channel(addr, options=channel_options()) as channel:
+        stub = ChatStub(channel)
+        while True:
+            resp = stub.GetMessages(GetMessagesRequest(username=RECIPIENT, limit=limit, page_token=page_token))
+            assert resp.status == Status.SUCCESS
+            count += len(resp.messages)
+            page_token = resp.next_page_token
+            if not page_token:
+                return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed GetMessages responses")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=5000, help="messages per GetMessages page")
+    parser.add_argument("--body", type=int, default=200, help="message body size in characters")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8012, help="server port (the proxy listens on the next one)")
+    args = parser.parse_args()
+
+    server.DEBUG = False
+    chat_server = ChatServer()
+    compression = CompressionInterceptor({})
+    grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS), interceptors=[compression],
+                              options=server_options())
+    add_ChatServicer_to_server(chat_server, grpc_server)
+    grpc_server.add_insecure_port(f"{LOCALHOST}:{args.port}")
+    grpc_server.start()
+    proxy = ByteCounter(args.port + 1, (LOCALHOST, args.port))
+
+    rng = random.Random(0)
+    chat_server.storage.create_user(RECIPIENT, "password")
+    chat_server.storage.send_messages([
+        Message(id=uuid.UUID(int=rng.getrandbits(128)).bytes,
+                sender=f"friend{rng.randrange(50)}",
+                recipient=RECIPIENT,
+                body=" ".join(rng.choice(WORDS) for _ in range(args.body // 5))[:args.body],
+                timestamp=1_700_000_000 + i) for i in range(args.messages)])
+
+    print(f"{args.messages} messages of {args.body} characters, in pages of {args.limit}")
+    for name, algorithm in ALGORITHMS.items():
+        compression.compression["GetMessages"] = algorithm
+        proxy.reset()
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            assert sync(f"{LOCALHOST}:{args.port + 1}", args.limit) == args.messages
+            latencies.append(time.perf_counter() - start)
+        sent, received = proxy.reset()
+        print(f"{name:<8} {received / args.repeat / 2 ** 20:8.2f} MiB received, "
+              f"{sent / args.repeat / 2 ** 10:6.1f} KiB sent   {min(latencies) * 1000:8.1f} ms best, "
+              f"{sum(latencies) / args.repeat * 1000:8.1f} ms mean per sync")
+
+    grpc_server.stop(None)
+    chat_server.storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of messaging a large group: one copy of the message per recipient against one group message.
+
+The benchmark fills an in-memory storage with the members of one group, then sends the same messages three ways and
+reports the send latency and the memory the messages take:
+- copies: one message per member in a single send_messages batch, the way a client had to message a group before;
+- fan-out on write: group messages delivered to every member's inbox as they are sent (a group under the fan-out limit);
+- fan-out on read: group messages stored once and delivered to each member's inbox when the member syncs.
+For fan-out on read it also times the first sync of every member, which is where the deliveries happen.
+
+Usage: python -m benchmarks.group_send [--members 500] [--messages 200] [--body 200]
+"""
+
+import argparse
+import time
+import tracemalloc
+import uuid
+
+from protos.chat_pb2 import Message
+from config import STATE_SHARDS
+from storage import MemoryStorage
+
+SENDER = "member0"
+
+
+def make_storage(usernames: list[str], fanout_limit: int) -> MemoryStorage:
+    storage = MemoryStorage(STATE_SHARDS, group_fanout_limit=fanout_limit)
+    for username in usernames:
+        storage.create_user(username, "password")
+    assert storage.create_group("group", usernames) == []
+    return storage
+
+
+def run(label: str, send, count: int, sync=None):
+    """Time count sends and measure the memory they leave allocated, then the same for the syncs, if any."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(count):
+        send(i)
+    elapsed = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0] - baseline
+
+    line = f"{label:<18} {elapsed / count * 1000:8.3f} ms/send   {allocated / 2 ** 20:8.1f} MiB"
+    if sync is not None:
+        start = time.perf_counter()
+        sync()
+        elapsed = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[0] - baseline
+        line += f"   (first sync of every member {elapsed:6.2f} s, then {allocated / 2 ** 20:.1f} MiB)"
+    tracemalloc.stop()
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group messages against per-recipient copies")
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--body", type=int, default=200, help="message body size in characters")
+    args = parser.parse_args()
+
+    usernames = [f"member{i}" for i in range(args.members)]
+    body = "x" * args.body
+    print(f"{args.members} members, {args.messages} messages of {args.body} characters")
+
+    storage = make_storage(usernames, args.members)
+
+    def send_copies(i: int):
+        storage.send_messages([Message(id=uuid.uuid4().bytes, sender=SENDER, recipient=username, body=body,
+                                       timestamp=i) for username in usernames])
+
+    run("copies", send_copies, args.messages)
+
+    for label, fanout_limit in [("fan-out on write", args.members), ("fan-out on read", 0)]:
+        storage = make_storage(usernames, fanout_limit)
+
+        def send_group(i: int):
+            storage.send_group_message(Message(id=uuid.uuid4().bytes, sender=SENDER, group="group", body=body,
+                                               timestamp=i))
+
+        def sync_all():
+            for username in usernames:
+                storage.get_messages(username, 0, 1, None, True)
+
+        run(label, send_group, args.messages, sync_all if fanout_limit == 0 else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of ListUsers searches over many accounts.
+
+The benchmark fills an in-memory storage with random usernames, then times a few searches two ways: the indexed
+list_users (one page of results) and a scan that matches every username with fnmatch, the way ListUsers used to.
+It also reports the size of the ListUsers response each way.
+
+Usage: python -m benchmarks.list_users [--users 1000000] [--limit 100] [--repeat 20]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from fnmatch import fnmatch
+
+from protos.chat_pb2 import ListUsersResponse, Status
+from config import STATE_SHARDS
+from storage import MemoryStorage
+
+PATTERNS = ["ali*", "b?b*", "zz*x", "*son", "*"]
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexed ListUsers searches")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100, help="usernames per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    storage = MemoryStorage(STATE_SHARDS)
+    for _ in range(args.users):
+        username = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+        storage.create_user(username, "password")
+    usernames = [username for shard in storage.shards for username in shard.usernames]
+
+    def scan(pattern: str) -> list[str]:
+        return sorted(username for username in usernames if fnmatch(username, pattern))
+
+    print(f"{len(usernames)} users")
+    for pattern in PATTERNS:
+        scan_time, matches = timed(lambda: scan(pattern), max(1, args.repeat // 10))
+        index_time, (page, _) = timed(lambda: storage.list_users(pattern, args.limit), args.repeat)
+
+        scan_size = ListUsersResponse(status=Status.SUCCESS, usernames=matches).ByteSize()
+        page_size = ListUsersResponse(status=Status.SUCCESS, usernames=page).ByteSize()
+        print(f"{pattern:<6} {len(matches):8} matches   "
+              f"scan {scan_time * 1000:8.2f} ms ({scan_size:9} bytes)   "
+              f"indexed page {index_time * 1000:8.2f} ms ({page_size:6} bytes)")
+
+
+if __name__ == "__main__":
+    main()
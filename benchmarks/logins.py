@@ -0,0 +1,103 @@
+"""
+Benchmark of logins per second under concurrency, with passwords hashed by scrypt on the process pool.
+
+The benchmark serves a ChatServer on a local port, creates the users through Authenticate (one hash each), then has
+--clients threads log in as those users for --seconds, twice: with the verified-login cache turned off, so that every
+login runs the KDF, and with it on, so that only the first login of each user does. While the logins run, another
+thread times Echo calls, to show how much the hashing holds up the requests that do not need it.
+
+Usage: python -m benchmarks.logins [--users 100] [--clients 16] [--seconds 5] [--port 8011]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from concurrent import futures
+
+import server
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import CREDENTIAL_CACHE_TTL, LOCALHOST, MAX_WORKERS, SCRYPT_N, SCRYPT_P, SCRYPT_R
+from metrics import MetricsInterceptor
+from server import ChatServer
+
+
+def run(label: str, stub: ChatStub, usernames: list[str], clients: int, seconds: float):
+    """Log in from clients threads for seconds while timing Echo calls, and report both."""
+    stop = threading.Event()
+    logins = [0] * clients
+    echoes = []
+
+    def login(i: int):
+        while not stop.is_set():
+            username = usernames[(logins[i] * clients + i) % len(usernames)]
+            req = AuthRequest(action_type=AuthRequest.ActionType.LOGIN, username=username, password=username)
+            assert stub.Authenticate(req).status == Status.SUCCESS
+            logins[i] += 1
+
+    def echo():
+        while not stop.is_set():
+            start = time.perf_counter()
+            stub.Echo(EchoRequest(message="ping"))
+            echoes.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login, args=(i,)) for i in range(clients)] + [threading.Thread(target=echo)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    echo_p99 = statistics.quantiles(echoes, n=100)[98] if len(echoes) > 1 else echoes[0]
+    print(f"{label:<10} {sum(logins) / seconds:10.0f} logins/s   Echo p50 {statistics.median(echoes) * 1000:6.2f} ms, "
+          f"p99 {echo_p99 * 1000:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=16, help="threads logging in at once")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    server.DEBUG = False
+    chat_server = ChatServer()
+    grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS),
+                              interceptors=[MetricsInterceptor(chat_server.metrics)])
+    add_ChatServicer_to_server(chat_server, grpc_server)
+    grpc_server.add_insecure_port(f"{LOCALHOST}:{args.port}")
+    grpc_server.start()
+
+    print(f"scrypt n={SCRYPT_N} r={SCRYPT_R} p={SCRYPT_P} on {chat_server.credentials.workers} processes, "
+          f"{args.clients} clients, {args.users} users")
+    with grpc.insecure_channel(f"{LOCALHOST}:{args.port}") as channel:
+        stub = ChatStub(channel)
+
+        usernames = [f"user{i}" for i in range(args.users)]
+        start = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=args.clients) as executor:
+            for resp in executor.map(lambda username: stub.Authenticate(
+                    AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username=username,
+                                password=username)), usernames):
+                assert resp.status == Status.SUCCESS
+        elapsed = time.perf_counter() - start
+        print(f"{'create':<10} {args.users / elapsed:10.0f} accounts/s")
+
+        chat_server.credentials.cache_ttl = 0
+        run("no cache", stub, usernames, args.clients, args.seconds)
+        chat_server.credentials.cache_ttl = CREDENTIAL_CACHE_TTL or 60
+        run("cache", stub, usernames, args.clients, args.seconds)
+
+    grpc_server.stop(None)
+    chat_server.credentials.close()
+    chat_server.storage.close()
+
+
+if __name__ == "__main__":
+    main()
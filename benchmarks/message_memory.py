@@ -0,0 +1,70 @@
+"""
+Benchmark of the memory taken by the messages the in-memory storage holds.
+
+Each layout is filled with the same messages in a fresh process, and the growth of the process's peak resident set
+size is divided by the number of messages:
+
+- protobuf: one Message object per message in a dict keyed by UUID (how shards stored messages before MessageStore)
+- columnar: a MessageStore
+
+Usage: python -m benchmarks.message_memory [--messages 1000000] [--users 10000] [--body-size 32]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import uuid
+
+from protos.chat_pb2 import Message
+from storage.message_store import MessageStore
+
+
+def generate(args: argparse.Namespace):
+    body = "x" * args.body_size
+    for i in range(args.messages):
+        yield uuid.uuid4(), Message(sender=f"user{(i + 1) % args.users}",
+                                    recipient=f"user{i % args.users}",
+                                    body=body,
+                                    timestamp=float(i))
+
+
+def peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def fill(layout: str, args: argparse.Namespace, results):
+    before = peak_rss()
+    if layout == "protobuf":
+        messages = {}
+        for message_id, message in generate(args):
+            message.id = message_id.bytes
+            messages[message_id] = message
+    else:
+        messages = MessageStore()
+        for message_id, message in generate(args):
+            messages.add(message_id, message)
+
+    results.put((layout, (peak_rss() - before) / args.messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory per stored message")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--body-size", type=int, default=32, help="characters per message body")
+    args = parser.parse_args()
+
+    mp_context = multiprocessing.get_context("spawn")
+    results = mp_context.Queue()
+    for layout in ["protobuf", "columnar"]:
+        process = mp_context.Process(target=fill, args=(layout, args, results))
+        process.start()
+        layout, per_message = results.get()
+        process.join()
+        print(f"{layout:<10} {per_message:8.1f} bytes/message ({args.messages} messages, "
+              f"{args.body_size}-character bodies)")
+
+
+if __name__ == "__main__":
+    main()
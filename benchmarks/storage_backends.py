@@ -0,0 +1,109 @@
+"""
+Benchmark of the storage backends against each other.
+
+The benchmark runs the same workload against each backend through the Storage interface: sending messages to a set
+of users, marking them read and deleting them in batches, and paging through every inbox. Persistent backends run with
+fsync on by default, like the server does.
+
+Usage: python -m benchmarks.storage_backends [--messages 100000] [--users 1000] [--batch 10] [--no-fsync]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from protos.chat_pb2 import Message
+from config import STATE_SHARDS
+from storage import MemoryStorage, SqliteStorage, Storage, WriteAheadLog
+
+
+def open_storage(backend: str, data_dir: str, fsync: bool) -> Storage:
+    match backend:
+        case "memory":
+            return MemoryStorage(STATE_SHARDS)
+        case "memory+wal":
+            return MemoryStorage(STATE_SHARDS, WriteAheadLog(data_dir, fsync=fsync))
+        case "sqlite":
+            return SqliteStorage(os.path.join(data_dir, "chat.db"), fsync=fsync)
+
+
+def timed(label: str, count: int, unit: str, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed:7.2f} s  ({count / elapsed:10.0f} {unit}/s)")
+
+
+def run(backend: str, args: argparse.Namespace):
+    data_dir = tempfile.mkdtemp(prefix="storage-bench-")
+    try:
+        storage = open_storage(backend, data_dir, not args.no_fsync)
+        usernames = [f"user{i}" for i in range(args.users)]
+        for username in usernames:
+            storage.create_user(username, "password")
+
+        inboxes = {username: [] for username in usernames}
+        messages = []
+        for i in range(args.messages):
+            recipient = usernames[i % args.users]
+            message = Message(id=uuid.uuid4().bytes,
+                              sender=usernames[(i + 1) % args.users],
+                              recipient=recipient,
+                              body=f"benchmark message number {i}",
+                              timestamp=float(i))
+            messages.append(message)
+            inboxes[recipient].append(message.id)
+
+        # Batches of message IDs from the same inbox
+        batches = [(username, ids[i:i + args.batch])
+                   for username, ids in inboxes.items() for i in range(0, len(ids), args.batch)]
+
+        def send():
+            for message in messages:
+                storage.send_message(message)
+
+        def read():
+            for username, ids in batches:
+                storage.read_messages(username, ids)
+
+        def page():
+            for username in usernames:
+                after = None
+                while True:
+                    sync = storage.get_messages(username, 0, 100, after, True)
+                    after = sync.next_key
+                    if after is None:
+                        break
+
+        def delete():
+            for username, ids in batches:
+                storage.delete_messages(username, ids)
+
+        print(f"{backend}:")
+        timed("send", args.messages, "messages", send)
+        timed("read", len(batches), "batches", read)
+        timed("page", args.messages, "messages", page)
+        timed("delete", len(batches), "batches", delete)
+        storage.close()
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the storage backends")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--batch", type=int, default=10, help="message IDs per read and delete request")
+    parser.add_argument("--no-fsync", action="store_true", help="do not sync persistent backends on every commit")
+    parser.add_argument("--backends", nargs="+", default=["memory", "memory+wal", "sqlite"])
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        run(backend, args)
+
+
+if __name__ == "__main__":
+    main()
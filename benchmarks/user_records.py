@@ -0,0 +1,68 @@
+"""
+Benchmark of the user records the in-memory storage keeps for every account.
+
+The benchmark creates the accounts, then mutates every inbox the way the request handlers do: adds messages, marks one
+read, and deletes one. It reports the time of each step and the growth of the process's peak resident set size per
+user.
+
+Usage: python -m benchmarks.user_records [--users 1000000] [--messages-per-user 2]
+"""
+
+import argparse
+import resource
+import time
+import uuid
+
+from entity import User
+
+
+def peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {elapsed:7.2f} s  ({count / elapsed:10.0f} ops/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark account creation and inbox mutation")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--messages-per-user", type=int, default=2)
+    args = parser.parse_args()
+
+    usernames = [f"user{i}" for i in range(args.users)]
+    message_ids = [[uuid.uuid4() for _ in range(args.messages_per_user)] for _ in range(args.users)]
+    users = []
+    before = peak_rss()
+
+    def create():
+        for username in usernames:
+            users.append(User(username=username, password="password"))
+
+    def add():
+        for user, ids in zip(users, message_ids):
+            for timestamp, message_id in enumerate(ids):
+                user.add_message(message_id, float(timestamp))
+
+    def touch():
+        for user, ids in zip(users, message_ids):
+            user.touch_message(ids[0])
+
+    def delete():
+        for user, ids in zip(users, message_ids):
+            user.delete_message(ids[-1])
+
+    timed("create", args.users, create)
+    timed("add", args.users * args.messages_per_user, add)
+    timed("touch", args.users, touch)
+    timed("delete", args.users, delete)
+    print(f"memory   {(peak_rss() - before) / args.users:7.1f} bytes/user "
+          f"({args.users} users, {args.messages_per_user - 1} messages left in each inbox)")
+
+
+if __name__ == "__main__":
+    main()
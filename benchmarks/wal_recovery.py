@@ -0,0 +1,84 @@
+"""
+Benchmark of the restart time of a server that persists its state to the write-ahead log.
+
+The benchmark fills a fresh log directory with users and messages, then measures how long a new storage takes to
+recover the state: once by replaying the whole log, and once from a snapshot.
+
+Usage: python -m benchmarks.wal_recovery [--messages 1000000] [--users 10000]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+
+from protos.chat_pb2 import Message
+from config import STATE_SHARDS
+from storage import MemoryStorage, WriteAheadLog
+
+
+def open_storage(data_dir: str) -> MemoryStorage:
+    return MemoryStorage(STATE_SHARDS, WriteAheadLog(data_dir, fsync=False, snapshot_every=0))
+
+
+def timed_recovery(data_dir: str) -> tuple[float, MemoryStorage]:
+    start = time.perf_counter()
+    storage = open_storage(data_dir)
+    return time.perf_counter() - start, storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark write-ahead log recovery")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="wal-bench-")
+    try:
+        # Fill the log: every 10th message is read and every 20th is deleted
+        storage = open_storage(data_dir)
+        usernames = [f"user{i}" for i in range(args.users)]
+        for username in usernames:
+            storage.create_user(username, "password")
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            recipient = usernames[i % args.users]
+            message = Message(id=uuid.uuid4().bytes,
+                              sender=usernames[(i + 1) % args.users],
+                              recipient=recipient,
+                              body=f"benchmark message number {i}",
+                              timestamp=float(i))
+            storage.send_message(message)
+            if i % 10 == 0:
+                storage.read_messages(recipient, [message.id])
+            if i % 20 == 0:
+                storage.delete_messages(recipient, [message.id])
+        fill_time = time.perf_counter() - start
+        num_messages = len(storage.messages)
+        storage.close()
+        print(f"Logged {args.messages} sends to {args.users} users in {fill_time:.2f} s "
+              f"({args.messages / fill_time:.0f} sends/s, fsync off)")
+
+        # Restart by replaying the whole log
+        elapsed, storage = timed_recovery(data_dir)
+        assert len(storage.messages) == num_messages
+        print(f"Recovery from log only: {elapsed:.2f} s for {num_messages} messages")
+
+        # Restart from a snapshot
+        start = time.perf_counter()
+        storage.snapshot()
+        print(f"Snapshot written in {time.perf_counter() - start:.2f} s")
+        storage.close()
+
+        elapsed, storage = timed_recovery(data_dir)
+        assert len(storage.messages) == num_messages
+        print(f"Recovery from snapshot: {elapsed:.2f} s for {num_messages} messages")
+        storage.close()
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
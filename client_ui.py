@@ -1,5 +1,7 @@
 import argparse
+import bisect
 import hashlib
+import json
 import uuid
 import time
 
@@ -11,11 +13,47 @@ from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtCore import QThread
 from sys import argv
 
-from config import GUI_REFRESH_RATE
+from config import GUI_PAGE_SIZE, GUI_REFRESH_RATE
+from config import REQUEST_COMPRESSION
+from config import RETRY_BACKOFF_MULTIPLIER, RETRY_INITIAL_BACKOFF, RETRY_MAX_ATTEMPTS, RETRY_MAX_BACKOFF
 from protos.chat_pb2 import *
 from protos.chat_pb2_grpc import *
+from sessions import SessionTokens
+from transport import ClientCompression, channel_options, method_compression
 from ui import MainFrame
 
+# Idempotent RPCs are retried with exponential backoff while the server is unavailable
+# (the server answers a retried SendMessage with the result of the first attempt, so the message is stored once)
+RETRIED_METHODS = ["Echo", "GetMessages", "GetInboxSummary", "ListUsers", "SendMessage"]
+RETRY_SERVICE_CONFIG = {
+    "methodConfig": [{
+        "name": [{"service": "chat.Chat", "method": method} for method in RETRIED_METHODS],
+        "retryPolicy": {
+            "maxAttempts": RETRY_MAX_ATTEMPTS,
+            "initialBackoff": f"{RETRY_INITIAL_BACKOFF}s",
+            "maxBackoff": f"{RETRY_MAX_BACKOFF}s",
+            "backoffMultiplier": RETRY_BACKOFF_MULTIPLIER,
+            "retryableStatusCodes": ["UNAVAILABLE"],
+        },
+    }],
+}
+CHANNEL_OPTIONS = [("grpc.enable_retries", 1),
+                   ("grpc.service_config", json.dumps(RETRY_SERVICE_CONFIG))] + channel_options()
+# Requests of the methods configured with compression (responses are compressed as the server is configured)
+COMPRESSION = ClientCompression(method_compression(REQUEST_COMPRESSION))
+
+
+def retry_after(e: grpc.RpcError) -> float:
+    """The seconds a call shed with RESOURCE_EXHAUSTED says to wait before retrying, from its retry-after hint."""
+    return float(dict(e.trailing_metadata() or ()).get("retry-after", 1))
+
+
+def rpc_error_message(e: grpc.RpcError) -> str:
+    """The error to show for a failed call, with how long to wait if the server turned it away for now."""
+    if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return f"The server is busy, try again in {retry_after(e):g} s.\n\n{e.details()}"
+    return e.details() or f"The request failed: {e.code().name}"
+
 
 class UserSession:
     """
@@ -39,16 +77,20 @@ class UserSession:
         self.port = port
         self.channel = None
         self.stub = None
+        # Session token from logging in, sent with every call on both channels
+        self.tokens = SessionTokens()
 
         self.message_thread = None
         self.message_worker = None
         self.messages = None
+        self.search_pattern = ""
+        self.search_page_token = b""
 
         # Initialize connection for main GUI thread
         try:
             server_addr = f"{self.host}:{self.port}"
-            self.channel = grpc.insecure_channel(server_addr)
-            self.stub = ChatStub(self.channel)
+            self.channel = grpc.insecure_channel(server_addr, options=CHANNEL_OPTIONS)
+            self.stub = ChatStub(grpc.intercept_channel(self.channel, self.tokens, COMPRESSION))
         except Exception as e:
             print("Connection refused. Please check if the server is running.")
             print(e)
@@ -60,6 +102,7 @@ class UserSession:
         self.mainframe.logged_in.sign_out_button.clicked.connect(self.sign_out)
         self.mainframe.logged_in.delete_account_button.clicked.connect(self.delete_account)
         self.mainframe.central.list_account.search_button.clicked.connect(self.list_account_event)
+        self.mainframe.central.list_account.more_button.clicked.connect(self.list_more_accounts_event)
         self.mainframe.central.send_message.send_button.clicked.connect(self.send_message_event)
         self.mainframe.view_messages.read_button.clicked.connect(self.read_messages_event)
         self.mainframe.view_messages.delete_button.clicked.connect(self.delete_messages_event)
@@ -105,7 +148,12 @@ class UserSession:
         # Hash the password
         hashed_password = hash_string(password)
 
-        response = self.stub.Authenticate(AuthRequest(action_type=action, username=username, password=hashed_password))
+        try:
+            response = self.stub.Authenticate(AuthRequest(action_type=action, username=username,
+                                                          password=hashed_password))
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
+            return
 
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
@@ -124,6 +172,16 @@ class UserSession:
 
         self.start_logged_session()
 
+    def show_rpc_error(self, e: grpc.RpcError):
+        """
+        Show an error box for a call that failed with an RPC error, such as one turned away by the rate limiter or
+        admission control, instead of letting the error escape the event handler.
+
+        :param e: The error the call raised.
+        :return: None
+        """
+        QMessageBox.critical(self.window, 'Error', rpc_error_message(e))
+
     def sign_up(self):
         self.authenticate_user(AuthRequest.ActionType.CREATE_ACCOUNT)
 
@@ -149,6 +207,7 @@ class UserSession:
         self.mainframe.login.password_entry.setText("")
         self.mainframe.login.show()
         self.username = None
+        self.tokens.clear()
 
         clear_all_fields(self.mainframe)
 
@@ -160,20 +219,24 @@ class UserSession:
         response is an error, it displays an error box with the response
         message. If the response is not an error, it successfully deletes the
         user's account and signs the user out.
+        The request is sent before signing out, as it needs the session token
+        that signing out forgets.
 
         :return: None
         """
-        user_to_delete = self.username
-
-        self.sign_out()
-
-        response = self.stub.DeleteUser(DeleteUserRequest(username=user_to_delete))
+        try:
+            response = self.stub.DeleteUser(DeleteUserRequest(username=self.username))
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
+            return
 
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
             return
         print("Account deleted")
 
+        self.sign_out()
+
     def list_account_event(self):
         """
         Handle the list account button event.
@@ -187,17 +250,40 @@ class UserSession:
 
         :return: None
         """
-        search_string = self.mainframe.central.list_account.search_entry.text()
+        self.search_pattern = self.mainframe.central.list_account.search_entry.text()
+        self.search_page_token = b""
+        self.mainframe.central.list_account.account_list.clear()
+        self.list_more_accounts_event()
+
+    def list_more_accounts_event(self):
+        """
+        Handle the more button event of the list account frame.
+
+        This method fetches the next page of usernames matching the current search (the first page when called from
+        list_account_event) and appends them to the list widget. The more button stays enabled while the server
+        reports that there are more matches.
 
-        response = self.stub.ListUsers(ListUsersRequest(username=self.username, pattern=search_string))
+        :return: None
+        """
+        try:
+            response = self.stub.ListUsers(ListUsersRequest(username=self.username,
+                                                            pattern=self.search_pattern,
+                                                            limit=GUI_PAGE_SIZE,
+                                                            page_token=self.search_page_token))
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
+            return
 
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
             return
 
-        self.mainframe.central.list_account.account_list.clear()
-        for idx, user in enumerate(response.usernames):
-            self.mainframe.central.list_account.account_list.insertItem(idx, user)
+        account_list = self.mainframe.central.list_account.account_list
+        for user in response.usernames:
+            account_list.insertItem(account_list.count(), user)
+
+        self.search_page_token = response.next_page_token
+        self.mainframe.central.list_account.more_button.setEnabled(bool(response.next_page_token))
 
     def send_message_event(self):
         """
@@ -222,7 +308,11 @@ class UserSession:
                           timestamp=time.time())
         req = SendMessageRequest(username=self.username, message=message)
 
-        response = self.stub.SendMessage(req)
+        try:
+            response = self.stub.SendMessage(req)
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
+            return
 
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
@@ -234,16 +324,15 @@ class UserSession:
         """
         Handle a new list of messages from the server.
 
-        This method is called when a GetMessagesResponse is received from the server.
-        It stores the messages in the messages attribute, sorts them by timestamp in
-        descending order, and updates the messages list in the view messages frame.
+        This method is called whenever the MessageUpdaterWorker's copy of the inbox changes.
+        The messages arrive already sorted by timestamp in descending order. It stores them
+        in the messages attribute and updates the messages list in the view messages frame.
 
         :param messages: The list of messages retrieved from the server.
         :type messages: list[Message]
         :return: None
         """
         self.messages = messages
-        self.messages.sort(key=lambda x: x.timestamp, reverse=True)
         self.mainframe.view_messages.update_message_list(self.messages)
 
     def delete_messages_event(self):
@@ -269,7 +358,12 @@ class UserSession:
             msg = item.data(Qt.UserRole)
             ids_to_delete.append(msg.id)
 
-        response = self.stub.DeleteMessages(DeleteMessagesRequest(username=self.username, message_ids=ids_to_delete))
+        try:
+            response = self.stub.DeleteMessages(DeleteMessagesRequest(username=self.username,
+                                                                      message_ids=ids_to_delete))
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
+            return
 
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
@@ -280,56 +374,57 @@ class UserSession:
         Handle the read messages button event.
 
         This method is called when the read messages button in the view messages frame is clicked.
-        It constructs a read message request object with the IDs of the selected messages
-        and the currently logged-in user's username. It then sends the request to the server.
+        It constructs a read next request object with the number of messages to read
+        and the currently logged-in user's username. It then sends the request to the server,
+        which reads that many of the oldest unread messages.
         If the response is an error, it displays an error box with the response message.
-        If the response is not an error, it updates the messages list in the view messages frame
-        to mark the messages as read.
+        The messages list in the view messages frame is updated by the READ events of the message stream.
 
         :return: None
         """
         try:
             num_to_read = int(self.mainframe.view_messages.num_read_entry.text())
         except ValueError:
+            num_to_read = 0
+        if num_to_read <= 0:
             QMessageBox.critical(self.window, 'Error', "Please enter a valid number of messages to read")
             return
 
-        ids = [message.id for message in self.messages if not message.read]
-
-        num_to_read = min(num_to_read, len(ids))
-
         print("Number of messages to read:", num_to_read)
 
-        if num_to_read == 0:
-            QMessageBox.critical(self.window, 'Error', "No messages to read")
+        # make read next request
+        try:
+            response = self.stub.ReadNext(ReadNextRequest(username=self.username, count=num_to_read))
+        except grpc.RpcError as e:
+            self.show_rpc_error(e)
             return
 
-        ids = ids[-num_to_read:]
-
-        # make read message request
-        response = self.stub.ReadMessages(ReadMessagesRequest(username=self.username, message_ids=ids))
-
         if response.status == Status.ERROR:
             QMessageBox.critical(self.window, 'Error', response.error_message)
             return
 
+        if not response.messages:
+            QMessageBox.critical(self.window, 'Error', "No messages to read")
+            return
+
     def start_logged_session(self):
         """
         Start the logged-in session.
 
         This method is called after a user logs in. It creates a MessageUpdaterWorker
-        object with the server's hostname, port, the currently logged-in user's username,
-        and an update interval of 0.1 seconds. It then creates a QThread object and moves
-        the worker to the thread. It connects the worker's messages_received signal to
-        the handle_new_messages method and starts the thread. This causes the worker to
-        periodically poll the server for new messages and update the messages list in
-        the view messages frame with the new messages.
+        object with the server's hostname, port, and the currently logged-in user's username.
+        It then creates a QThread object and moves the worker to the thread. It connects the
+        worker's messages_received signal to the handle_new_messages method and starts the
+        thread. This causes the worker to subscribe to the server's message stream (or poll
+        the server if streaming is unavailable) and update the messages list in the view
+        messages frame whenever the inbox changes.
 
         :return: None
         """
         self.message_worker = MessageUpdaterWorker(host=self.host,
                                                    port=self.port,
-                                                   username=self.username)
+                                                   username=self.username,
+                                                   tokens=self.tokens)
 
         # Create the thread object
         self.message_thread = QThread()
@@ -340,8 +435,9 @@ class UserSession:
         # When the thread starts, run the worker's main loop
         self.message_thread.started.connect(self.message_worker.run)
 
-        # Connect the worker's signal to your handler in the main thread
+        # Connect the worker's signals to your handlers in the main thread
         self.message_worker.messages_received.connect(self.handle_new_messages)
+        self.message_worker.unread_count_received.connect(self.mainframe.view_messages.update_unread_count)
 
         # Start the thread
         self.message_thread.start()
@@ -369,51 +465,127 @@ class UserSession:
             self.message_thread = None
 
 
+class Inbox:
+    """
+    Local copy of a user's inbox, kept sorted by timestamp in descending order.
+
+    Messages are inserted at their sorted position as updates arrive, so the full list never has to be re-sorted.
+    """
+
+    def __init__(self):
+        self.messages: dict[bytes, Message] = {}
+        self.order: list[tuple[float, bytes]] = []  # (-timestamp, message ID) in ascending order
+
+    def put(self, message: Message):
+        """
+        Insert a new message or replace the stored copy of an existing one.
+
+        :param message: The message to store.
+        """
+        if message.id not in self.messages:
+            bisect.insort(self.order, (-message.timestamp, message.id))
+        self.messages[message.id] = message
+
+    def remove(self, message_id: bytes):
+        """
+        Remove a message if it is stored.
+
+        :param message_id: The ID of the message to remove.
+        """
+        message = self.messages.pop(message_id, None)
+        if message is not None:
+            del self.order[bisect.bisect_left(self.order, (-message.timestamp, message_id))]
+
+    def clear(self):
+        self.messages.clear()
+        self.order.clear()
+
+    def to_list(self) -> list[Message]:
+        return [self.messages[message_id] for _, message_id in self.order]
+
+
 class MessageUpdaterWorker(QObject):
     """
-    Worker class to periodically fetch new messages from a separate socket connection.
+    Worker class to keep the inbox up to date over a separate channel.
+
+    The worker subscribes to the server's message stream and applies pushed events to a local copy of the inbox.
+    If the stream is unavailable, it falls back to periodically polling the server with GetMessages.
     """
     messages_received = pyqtSignal(list)  # emitted when new messages arrive
+    unread_count_received = pyqtSignal(int)  # emitted with the inbox's unread count whenever the inbox changes
 
-    def __init__(self, host: str, port: int, username: str, parent=None):
+    def __init__(self, host: str, port: int, username: str, tokens: SessionTokens, parent=None):
         """
         :param host: Server's hostname or IP address
         :param port: Server's port
         :param username: The current user's name (for message queries, if needed)
+        :param tokens: The session tokens of the main channel, sent with the worker's calls too
         """
         super().__init__(parent)
 
         self.host = host
         self.port = port
         self.username = username
+        self.tokens = tokens
 
         self.running = False
         self.channel = None
         self.stub = None
+        self.stream = None
+
+        # Local copy of the inbox and the inbox sequence number it is synced to
+        self.inbox = Inbox()
+        self.seq = 0
+        # Unread count of the whole inbox, kept up to date from the stream events (None until it is fetched)
+        self.unread = None
 
     @pyqtSlot()
     def run(self):
         """
-        Start a separate thread to periodically poll the server for new messages
-        and emit them via the messages_received signal.
+        Keep the inbox up to date and emit it via the messages_received signal.
+
+        The worker stays on the message stream for as long as it is open.
+        Whenever the stream drops, the worker polls the server once and then tries to resubscribe.
+        If the server is at its limit of streams, the worker polls until its retry-after hint has passed.
+        A poll turned away by the server is retried after its retry-after hint.
+        If the server does not support streaming at all, the worker polls for the rest of the session.
 
         :return: None
         """
         self.running = True
 
-        self.channel = grpc.insecure_channel(f"{self.host}:{self.port}")
-        self.stub = ChatStub(self.channel)
+        self.channel = grpc.insecure_channel(f"{self.host}:{self.port}", options=CHANNEL_OPTIONS)
+        self.stub = ChatStub(grpc.intercept_channel(self.channel, self.tokens, COMPRESSION))
 
-        # 2) Start polling loop
+        streaming = True
+        subscribe_at = 0.0
         while self.running:
-            try:
-                response = self.stub.GetMessages(GetMessagesRequest(username=self.username))
-
-                if response.status == Status.ERROR:
-                    print(f"[MessageUpdaterWorker] Error: {response.error_message}")
-                else:
-                    self.messages_received.emit(list(response.messages))
+            if streaming and time.monotonic() >= subscribe_at:
+                try:
+                    self.subscribe()
+                except grpc.RpcError as e:
+                    if not self.running:
+                        break
+
+                    print(f"[MessageUpdaterWorker] Stream error: {e.code()}")
+                    if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                        streaming = False
+                    elif e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                        subscribe_at = time.monotonic() + retry_after(e)
+
+            if not self.running:
+                break
 
+            try:
+                self.poll()
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                    print(f"[MessageUpdaterWorker] Error: {e}")
+                    break
+                # Turned away by the server: wait as long as it says before polling again
+                print(f"[MessageUpdaterWorker] Poll error: {e.code()}")
+                time.sleep(retry_after(e))
+                continue
             except Exception as e:
                 print(f"[MessageUpdaterWorker] Error: {e}")
                 # On any critical error, you might want to break or handle differently
@@ -428,11 +600,133 @@ class MessageUpdaterWorker(QObject):
             self.stub = None
         print("[MessageUpdaterWorker] Worker thread stopped.")
 
+    def subscribe(self):
+        """
+        Consume the server's message stream until it ends.
+
+        The server replays the newest page of the inbox as NEW events followed by SYNCED when the stream opens,
+        so the local copy is rebuilt from scratch on every subscription.
+        The unread count is fetched once the replay is complete, and then counted from the events, so a burst of
+        events does not make a GetInboxSummary call each. The stream is cancelled however this returns, so that it
+        does not keep holding one of the server's stream slots.
+
+        :return: None
+        """
+        self.stream = self.stub.SubscribeMessages(SubscribeMessagesRequest(username=self.username,
+                                                                           limit=GUI_PAGE_SIZE))
+        self.inbox.clear()
+        self.unread = None
+
+        synced = False
+        try:
+            for event in self.stream:
+                previous = self.inbox.messages.get(event.message.id)
+                match event.event_type:
+                    case MessageEvent.EventType.NEW:
+                        self.inbox.put(event.message)
+                        if synced and previous is None and not event.message.read:
+                            self.count_unread(1)
+                    case MessageEvent.EventType.READ:
+                        self.inbox.put(event.message)
+                        if synced and (previous is None or not previous.read):
+                            self.count_unread(-1)
+                    case MessageEvent.EventType.DELETED:
+                        self.inbox.remove(event.message.id)
+                        if previous is None:
+                            # Not in the local copy, so whether it was unread is unknown
+                            self.unread = None
+                        elif not previous.read:
+                            self.count_unread(-1)
+                    case MessageEvent.EventType.SYNCED:
+                        synced = True
+
+                # Replayed messages carry no sequence number: the inbox is synced once SYNCED arrives
+                if event.seq:
+                    self.seq = event.seq
+
+                # Hold the UI update back until the initial replay is complete
+                if synced:
+                    self.messages_received.emit(self.inbox.to_list())
+                    if self.unread is None:
+                        self.update_unread_count()
+                    else:
+                        self.unread_count_received.emit(self.unread)
+        finally:
+            self.stream.cancel()
+
+    def poll(self):
+        """
+        Fetch the inbox changes since the last sync once with a GetMessages request.
+
+        The server answers with only the messages that changed after the local sequence number,
+        unless it has to fall back to a full sync of the newest page of the inbox.
+        The UI is only updated if something changed.
+
+        :return: None
+        """
+        response = self.stub.GetMessages(GetMessagesRequest(username=self.username,
+                                                            since_seq=self.seq,
+                                                            limit=GUI_PAGE_SIZE,
+                                                            direction=GetMessagesRequest.Direction.NEWEST_FIRST))
+
+        if response.status == Status.ERROR:
+            print(f"[MessageUpdaterWorker] Error: {response.error_message}")
+            return
+
+        if response.full_sync:
+            self.inbox.clear()
+        for message_id in response.deleted_ids:
+            self.inbox.remove(message_id)
+        for message in response.messages:
+            self.inbox.put(message)
+        self.seq = response.seq
+
+        if response.full_sync or response.messages or response.deleted_ids:
+            self.messages_received.emit(self.inbox.to_list())
+            self.update_unread_count()
+
+    def count_unread(self, change: int):
+        """
+        Add change to the unread count, if it is known.
+
+        :param change: The number of messages that became unread (negative if they were read or deleted).
+        :return: None
+        """
+        if self.unread is not None:
+            self.unread = max(0, self.unread + change)
+
+    def update_unread_count(self):
+        """
+        Fetch the unread count of the whole inbox with a GetInboxSummary request, which carries no messages.
+
+        The local copy only holds the newest page of the inbox, so it cannot be counted locally from scratch.
+        If the call fails (e.g. it is rate limited), the count stays unknown and is fetched again on the next change,
+        without ending the stream.
+
+        :return: None
+        """
+        try:
+            response = self.stub.GetInboxSummary(GetInboxSummaryRequest(username=self.username))
+        except grpc.RpcError as e:
+            print(f"[MessageUpdaterWorker] Summary error: {e.code()}")
+            self.unread = None
+            return
+
+        if response.status == Status.ERROR:
+            print(f"[MessageUpdaterWorker] Error: {response.error_message}")
+            self.unread = None
+            return
+
+        self.unread = response.unread
+        self.unread_count_received.emit(response.unread)
+
     def stop(self):
         """
-        Signal the worker loop to stop running.
+        Signal the worker loop to stop running and cancel the open stream, if any.
         """
         self.running = False
+        if self.stream is not None:
+            self.stream.cancel()
 
 
 def clear_all_fields(widget: QWidget | QFrame):
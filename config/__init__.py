@@ -10,16 +10,122 @@ PUBLIC_STATUS = config["network"]["public_status"]
 NETWORK_INTERFACE = config["network"]["interface"]
 LOCALHOST = config["network"]["localhost"]
 SERVER_PORT = config["network"]["server_port"]
+SERVER_MODE = config["server"]["mode"]
+MAX_WORKERS = config["server"]["max_workers"]
+MAX_STREAMS = config["server"]["max_streams"]
+STATE_SHARDS = config["server"]["state_shards"]
+SERVER_PROCESSES = config["server"]["processes"]
+SHARD_BASE_PORT = config["server"]["shard_base_port"]
+STORAGE_BACKEND = config["storage"]["backend"]
+PERSISTENCE_ENABLED = config["persistence"]["enabled"]
+PERSISTENCE_PATH = config["persistence"]["path"]
+WAL_FSYNC = config["persistence"]["fsync"]
+WAL_GROUP_COMMIT_DELAY = config["persistence"]["group_commit_ms"] / 1000
+WAL_SNAPSHOT_EVERY = config["persistence"]["snapshot_every"]
+METRICS_PORT = config["metrics"]["port"]
+GROUP_FANOUT_LIMIT = config["groups"]["fanout_limit"]
+RETENTION_MAX_AGE = config["retention"]["max_age"]
+RETENTION_MAX_MESSAGES = config["retention"]["max_messages"]
+RETENTION_READ_TTL = config["retention"]["read_ttl"]
+RETENTION_INTERVAL = config["retention"]["interval"]
+INBOX_QUOTA = config["admission"]["inbox_quota"]
+MEMORY_BUDGET = config["admission"]["budget_bytes"]
+MEMORY_HIGH_WATERMARK = config["admission"]["high_watermark"]
+RETRY_AFTER = config["admission"]["retry_after"]
+DEDUPE_WINDOW = config["dedupe"]["window"]
+DEDUPE_MAX_ENTRIES = config["dedupe"]["max_entries"]
+SCRYPT_N = config["auth"]["scrypt_n"]
+SCRYPT_R = config["auth"]["scrypt_r"]
+SCRYPT_P = config["auth"]["scrypt_p"]
+HASH_WORKERS = config["auth"]["hash_workers"]
+CREDENTIAL_CACHE_TTL = config["auth"]["cache_ttl"]
+CREDENTIAL_CACHE_MAX_ENTRIES = config["auth"]["cache_max_entries"]
+MAX_MESSAGE_BYTES = config["transport"]["max_message_bytes"]
+KEEPALIVE_TIME = config["transport"]["keepalive_time"]
+KEEPALIVE_TIMEOUT = config["transport"]["keepalive_timeout"]
+MAXIMUM_CONCURRENT_RPCS = config["transport"]["maximum_concurrent_rpcs"]
+MAX_CONCURRENT_STREAMS = config["transport"]["max_concurrent_streams"]
+FLOW_CONTROL_WINDOW = config["transport"]["flow_control_window"]
+RESPONSE_COMPRESSION = config["transport"]["compression"]["responses"]
+REQUEST_COMPRESSION = config["transport"]["compression"]["requests"]
+RATE_LIMIT = config["rate_limit"]["rate"]
+RATE_LIMIT_BURST = config["rate_limit"]["burst"]
+RATE_LIMIT_METHODS = config["rate_limit"]["methods"]
+MAX_CONCURRENT_RPCS = config["rate_limit"]["max_concurrent"]
+OVERLOAD_RETRY_AFTER = config["rate_limit"]["retry_after"]
+SESSION_SECRET = config["session"]["secret"]
+SESSION_TTL = config["session"]["ttl"]
+RETRY_MAX_ATTEMPTS = config["retry"]["max_attempts"]
+RETRY_INITIAL_BACKOFF = config["retry"]["initial_backoff"]
+RETRY_MAX_BACKOFF = config["retry"]["max_backoff"]
+RETRY_BACKOFF_MULTIPLIER = config["retry"]["backoff_multiplier"]
+LOG_PATH = config["logging"]["path"]
+LOG_SAMPLE_RATE = config["logging"]["sample_rate"]
+LOG_SUMMARY_INTERVAL = config["logging"]["summary_interval"]
 PROTOCOL_TYPE = config["protocol_type"]
 DEBUG = config["debug"]
 GUI_REFRESH_RATE = config["gui_refresh_rate"]
+GUI_PAGE_SIZE = config["gui_page_size"]
 
 __all__ = [
     "PUBLIC_STATUS",
     "NETWORK_INTERFACE",
     "LOCALHOST",
     "SERVER_PORT",
+    "SERVER_MODE",
+    "MAX_WORKERS",
+    "MAX_STREAMS",
+    "STATE_SHARDS",
+    "SERVER_PROCESSES",
+    "SHARD_BASE_PORT",
+    "STORAGE_BACKEND",
+    "PERSISTENCE_ENABLED",
+    "PERSISTENCE_PATH",
+    "WAL_FSYNC",
+    "WAL_GROUP_COMMIT_DELAY",
+    "WAL_SNAPSHOT_EVERY",
+    "METRICS_PORT",
+    "GROUP_FANOUT_LIMIT",
+    "RETENTION_MAX_AGE",
+    "RETENTION_MAX_MESSAGES",
+    "RETENTION_READ_TTL",
+    "RETENTION_INTERVAL",
+    "INBOX_QUOTA",
+    "MEMORY_BUDGET",
+    "MEMORY_HIGH_WATERMARK",
+    "RETRY_AFTER",
+    "DEDUPE_WINDOW",
+    "DEDUPE_MAX_ENTRIES",
+    "SCRYPT_N",
+    "SCRYPT_R",
+    "SCRYPT_P",
+    "HASH_WORKERS",
+    "CREDENTIAL_CACHE_TTL",
+    "CREDENTIAL_CACHE_MAX_ENTRIES",
+    "MAX_MESSAGE_BYTES",
+    "KEEPALIVE_TIME",
+    "KEEPALIVE_TIMEOUT",
+    "MAXIMUM_CONCURRENT_RPCS",
+    "MAX_CONCURRENT_STREAMS",
+    "FLOW_CONTROL_WINDOW",
+    "RESPONSE_COMPRESSION",
+    "REQUEST_COMPRESSION",
+    "RATE_LIMIT",
+    "RATE_LIMIT_BURST",
+    "RATE_LIMIT_METHODS",
+    "MAX_CONCURRENT_RPCS",
+    "OVERLOAD_RETRY_AFTER",
+    "SESSION_SECRET",
+    "SESSION_TTL",
+    "RETRY_MAX_ATTEMPTS",
+    "RETRY_INITIAL_BACKOFF",
+    "RETRY_MAX_BACKOFF",
+    "RETRY_BACKOFF_MULTIPLIER",
+    "LOG_PATH",
+    "LOG_SAMPLE_RATE",
+    "LOG_SUMMARY_INTERVAL",
     "PROTOCOL_TYPE",
     "DEBUG",
     "GUI_REFRESH_RATE",
+    "GUI_PAGE_SIZE",
 ]
@@ -0,0 +1,109 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent import futures
+
+# Prefix of the stored password hashes, followed by the scrypt cost, the salt, and the key: "scrypt$n$r$p$salt$key"
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def hash_password(password: str, n: int, r: int, p: int) -> str:
+    """Hash a password with scrypt and a random salt, into the string that is stored for the user."""
+    salt = os.urandom(SALT_BYTES)
+    key = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=KEY_BYTES)
+    return f"{SCHEME}${n}${r}${p}${salt.hex()}${key.hex()}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check a password against a stored hash, with the cost the hash was made with."""
+    _, n, r, p, salt, key = stored.split("$")
+    n, r, p = int(n), int(r), int(p)
+    attempt = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p, maxmem=256 * n * r * p,
+                             dklen=KEY_BYTES)
+    return hmac.compare_digest(attempt, bytes.fromhex(key))
+
+
+class Credentials:
+    """
+    Password hashing for the server, with scrypt on a pool of worker processes.
+
+    scrypt is made to be slow and to need memory (128 * n * r bytes), so each hash takes tens of milliseconds of CPU.
+    Running it on a process pool keeps it off the GIL, so the gRPC threads (or the event loop) go on serving other
+    requests, and hashes run in parallel on up to workers CPUs. The pool is started on the first hash.
+
+    Verified logins are remembered for cache_ttl seconds, so a user logging in again (or a login storm after a restart)
+    costs a keyed SHA-256 instead of a KDF run. The cache holds an HMAC of the password under a key that only lives in
+    this process, and the stored hash it was verified against, so a password change or a new account under the same
+    name misses. Failed logins are never cached.
+
+    Passwords stored before hashing was added are compared as they are.
+    """
+
+    def __init__(self, n: int, r: int, p: int, workers: int, cache_ttl: float, cache_max_entries: int):
+        self.cost = (n, r, p)
+        self.workers = workers or os.cpu_count()
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+
+        self.lock = threading.Lock()
+        self.pool: futures.ProcessPoolExecutor | None = None
+        self.key = os.urandom(32)
+        self.cache: OrderedDict[str, tuple[float, str, bytes]] = OrderedDict()  # username -> (expiry, stored, HMAC)
+        self.cache_hits = 0
+
+    def executor(self) -> futures.ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # Forking a process that runs gRPC threads is unsafe, so the workers are spawned
+                self.pool = futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def hash(self, password: str) -> str:
+        """Hash a new password on the pool, blocking the calling thread (but not the others) until it is done."""
+        return self.executor().submit(hash_password, password, *self.cost).result()
+
+    def verify(self, username: str, password: str, stored: str) -> bool:
+        """Check a user's password against their stored hash, from the cache if they logged in with it recently."""
+        if not stored.startswith(SCHEME + "$"):
+            return hmac.compare_digest(password.encode(), stored.encode())
+
+        digest = hmac.new(self.key, password.encode(), hashlib.sha256).digest()
+        now = time.monotonic()
+        with self.lock:
+            self.evict(now)
+            entry = self.cache.get(username)
+            if entry is not None and entry[1] == stored and hmac.compare_digest(entry[2], digest):
+                self.cache_hits += 1
+                return True
+
+        if not self.executor().submit(verify_password, password, stored).result():
+            return False
+
+        if self.cache_ttl:
+            with self.lock:
+                self.cache.pop(username, None)
+                self.evict(now)
+                self.cache[username] = (now + self.cache_ttl, stored, digest)
+        return True
+
+    def evict(self, now: float):
+        """Drop the expired entries, and the oldest entries to make room for one more. Must be called holding the lock."""
+        while self.cache:
+            username, (expiry, _, _) = next(iter(self.cache.items()))
+            if expiry > now and len(self.cache) < self.cache_max_entries:
+                break
+            del self.cache[username]
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent import futures
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class DedupeCache:
+    """
+    Bounded cache of the results of idempotent requests, keyed by a client-generated ID (with whatever else scopes it).
+
+    The first request with an ID runs, and every request with the same ID within the window gets its result instead of
+    running again, waiting for it if the first one is still running. Entries are evicted once they are older than the
+    window, or oldest first once there are more than max_entries. Every entry lives for the same window, so the
+    insertion order is also the expiry order and each eviction is O(1).
+    """
+
+    def __init__(self, max_entries: int, window: float):
+        self.max_entries = max_entries
+        self.window = window
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, tuple[float, futures.Future]] = OrderedDict()  # key -> (expiry, result)
+
+    def run(self, key: Hashable, fn: Callable[[], T], keep: Callable[[T], bool] = lambda value: True) -> T:
+        """
+        Return the result of fn, or of the first call with the same key if it is still in the cache.
+
+        Results for which keep returns False are handed to the calls already waiting for them, then forgotten.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.evict(now)
+            entry = self.entries.get(key)
+            if entry is None:
+                result = futures.Future()
+                self.entries[key] = (now + self.window, result)
+        if entry is not None:
+            return entry[1].result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            # A request that raised is not remembered, so a retry runs it again
+            self.forget(key, result)
+            result.set_exception(e)
+            raise
+
+        if not keep(value):
+            self.forget(key, result)
+        result.set_result(value)
+        return value
+
+    def forget(self, key: Hashable, result: futures.Future):
+        with self.lock:
+            if self.entries.get(key, (None, None))[1] is result:
+                del self.entries[key]
+
+    def evict(self, now: float):
+        """Drop the expired entries, and the oldest entries to make room for one more. Must be called holding the lock."""
+        while self.entries:
+            key, (expiry, _) = next(iter(self.entries.items()))
+            if expiry > now and len(self.entries) < self.max_entries:
+                break
+            del self.entries[key]
+
+    def __len__(self) -> int:
+        return len(self.entries)
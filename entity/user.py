@@ -1,17 +1,163 @@
+import bisect
 import uuid
 
-from pydantic import BaseModel, Field
+from collections import deque
 
+# Number of deleted message IDs a user remembers for delta syncs
+MAX_TOMBSTONES = 1024
 
-class User(BaseModel):
-    username: str
-    password: str
-    message_ids: set[uuid.UUID] = Field(default_factory=set)
 
-    def add_message(self, message_id: uuid.UUID):
+class User:
+    """
+    Account and inbox of one user.
+
+    The server keeps one of these per account, so it is a plain __slots__ class: no per-instance __dict__,
+    and no validation on the attribute accesses of the request handlers.
+    """
+
+    __slots__ = ("username", "password", "message_ids", "unread_senders", "seq", "floor_seq", "_unread",
+                 "_unread_queue", "_changes", "_tombstones", "_index")
+
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        # Message ID -> message timestamp
+        self.message_ids: dict[uuid.UUID, float] = {}
+
+        # Unread messages per sender (senders with none are left out), the set of unread message IDs, and the unread
+        # message IDs in arrival order (which may still hold IDs read or deleted since: they are skipped, and dropped
+        # once they make up most of the queue)
+        self.unread_senders: dict[str, int] = {}
+        self._unread: set[uuid.UUID] = set()
+        self._unread_queue: deque[uuid.UUID] = deque()
+
+        # Inbox change sequence number: bumped on every add, read, or delete
+        self.seq = 0
+        # Oldest sequence number a delta can be computed from (tombstones before it were dropped)
+        self.floor_seq = 0
+
+        # Message ID -> sequence number of its last change, in sequence order (plain dicts keep insertion order and
+        # take about half the memory of an OrderedDict, so a change is moved to the end by popping and reinserting it)
+        self._changes: dict[uuid.UUID, int] = {}
+        self._tombstones: dict[uuid.UUID, int] = {}
+
+        # (timestamp, message ID) of every message in the inbox, in ascending order
+        self._index: list[tuple[float, uuid.UUID]] = []
+
+    def __repr__(self):
+        return f"User(username={self.username!r}, messages={len(self.message_ids)}, seq={self.seq})"
+
+    def add_message(self, message_id: uuid.UUID, timestamp: float) -> int:
         assert message_id not in self.message_ids
-        self.message_ids.add(message_id)
+        self.message_ids[message_id] = timestamp
+        bisect.insort(self._index, (timestamp, message_id))
+        self._tombstones.pop(message_id, None)
+        return self.touch_message(message_id)
+
+    def touch_message(self, message_id: uuid.UUID) -> int:
+        assert message_id in self.message_ids
+        self.seq += 1
+        self._changes.pop(message_id, None)
+        self._changes[message_id] = self.seq
+        return self.seq
 
-    def delete_message(self, message_id: uuid.UUID):
+    def delete_message(self, message_id: uuid.UUID) -> int:
         assert message_id in self.message_ids
-        self.message_ids.remove(message_id)
+        timestamp = self.message_ids.pop(message_id)
+        del self._index[bisect.bisect_left(self._index, (timestamp, message_id))]
+        # Messages restored before a change log reset have no entry
+        self._changes.pop(message_id, None)
+
+        self.seq += 1
+        self._tombstones[message_id] = self.seq
+
+        # Forget the oldest tombstones: deltas from before them can no longer be computed
+        while len(self._tombstones) > MAX_TOMBSTONES:
+            self.floor_seq = self._tombstones.pop(next(iter(self._tombstones)))
+
+        return self.seq
+
+    @property
+    def unread(self) -> int:
+        return len(self._unread)
+
+    def add_unread(self, message_id: uuid.UUID, sender: str):
+        """Count a message that arrived unread."""
+        self._unread.add(message_id)
+        self._unread_queue.append(message_id)
+        self.unread_senders[sender] = self.unread_senders.get(sender, 0) + 1
+
+    def remove_unread(self, message_id: uuid.UUID, sender: str):
+        """Stop counting an unread message once it is read or deleted."""
+        self._unread.remove(message_id)
+        count = self.unread_senders.pop(sender) - 1
+        if count:
+            self.unread_senders[sender] = count
+
+        if len(self._unread_queue) > 2 * len(self._unread) + 64:
+            self._unread_queue = deque(message_id for message_id in self._unread_queue if message_id in self._unread)
+
+    def oldest_unread(self, count: int) -> list[uuid.UUID]:
+        """Collect the IDs of up to count of the oldest unread messages, in arrival order. They stay unread."""
+        queue = self._unread_queue
+        while queue and queue[0] not in self._unread:
+            queue.popleft()
+
+        # A message deleted and sent again may be queued twice
+        ids = {}
+        for message_id in queue:
+            if len(ids) == count:
+                break
+            if message_id in self._unread:
+                ids[message_id] = None
+        return list(ids)
+
+    def reset_changes(self, seq: int):
+        """Forget the change log and continue from the given sequence number: deltas from before it need a full sync."""
+        self.seq = self.floor_seq = seq
+        self._changes.clear()
+        self._tombstones.clear()
+
+    def changes_since(self, seq: int) -> tuple[list[uuid.UUID], list[uuid.UUID]] | None:
+        """
+        Collect the messages that changed and were deleted after the given sequence number.
+
+        Both lists are in sequence order and the cost is proportional to the number of changes, not the inbox size.
+        Returns None if a delta cannot be computed from the given sequence number and a full sync is needed.
+        """
+        if seq < self.floor_seq or seq > self.seq or seq == 0:
+            return None
+
+        def collect(log: dict[uuid.UUID, int]) -> list[uuid.UUID]:
+            ids = []
+            for message_id in reversed(log):
+                if log[message_id] <= seq:
+                    break
+                ids.append(message_id)
+            ids.reverse()
+            return ids
+
+        return collect(self._changes), collect(self._tombstones)
+
+    def page(self, limit: int = 0, after: tuple[float, uuid.UUID] | None = None,
+             newest_first: bool = False) -> tuple[list[uuid.UUID], tuple[float, uuid.UUID] | None]:
+        """
+        Collect one page of message IDs in timestamp order.
+
+        The page starts right after the given (timestamp, message ID) key and holds at most limit IDs (0 for no limit).
+        Returns the IDs and the key to continue from, or None if this is the last page.
+        """
+        if newest_first:
+            end = bisect.bisect_left(self._index, after) if after is not None else len(self._index)
+            start = max(0, end - limit) if limit else 0
+            keys = self._index[start:end]
+            keys.reverse()
+            more = start > 0
+        else:
+            start = bisect.bisect_right(self._index, after) if after is not None else 0
+            end = start + limit if limit else len(self._index)
+            keys = self._index[start:end]
+            more = end < len(self._index)
+
+        next_key = keys[-1] if more and keys else None
+        return [message_id for _, message_id in keys], next_key
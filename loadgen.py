@@ -0,0 +1,316 @@
+"""
+Headless load generator: simulated chat users against a running server.
+
+Every simulated user has an account, a thread, and a random number generator seeded from --seed and the user's index.
+In a loop it picks an RPC from the --mix (by weight), makes it, and waits an exponentially distributed think time of
+--think seconds on average. The users are split across --processes worker processes, each with one channel to the
+server. After every user has logged in, all of them run for --duration seconds, and the throughput and latency
+percentiles of each RPC are printed (or written to --output) as JSON.
+
+The RPCs, recipients, bodies, and think times each user draws are determined by the seed, so two runs with the same
+seed make the same requests in the same order (message IDs are random, so that a rerun against the same server does
+not collide with the messages of the last one). The IDs the user reads or deletes come from its last poll, which
+depends on the server, so they are drawn from a generator of their own that the rest of the sequence does not share.
+With --dry-run, the first --requests requests of every user are printed as JSON lines instead, without a server.
+
+Usage: python loadgen.py [--host localhost] [--port 8000] [--users 100] [--processes 2] [--duration 30] [--seed 0]
+                         [--think 0.1] [--mix SendMessage=30,GetMessages=40,...] [--output results.json]
+                         [--dry-run] [--requests 100]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+import uuid
+
+from google.protobuf import json_format
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from sessions import SessionTokens
+from transport import channel_options
+
+DEFAULT_MIX = {"Authenticate": 1,
+               "SendMessage": 30,
+               "GetMessages": 40,
+               "ReadMessages": 15,
+               "DeleteMessages": 5,
+               "ListUsers": 9}
+WORDS = ("hey are you around later, the meeting moved to noon so let me know if that works for you and "
+         "bring the slides, thanks! see you soon").split()
+
+# Messages per GetMessages page, message IDs per ReadMessages or DeleteMessages request, usernames per ListUsers page
+PAGE_SIZE = 100
+IDS_PER_REQUEST = 10
+LIST_LIMIT = 50
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        method, _, weight = item.partition("=")
+        if method not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown RPC in the mix: {method}")
+        mix[method] = float(weight)
+    return mix
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """The nearest-rank p-th percentile of sorted latencies."""
+    return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+
+
+class SimulatedUser:
+    """One chat user: its account, the copy of its inbox from its last poll, and the RPCs it makes."""
+
+    def __init__(self, index: int, args: argparse.Namespace, stub: ChatStub | None):
+        self.username = f"{args.prefix}{index}"
+        self.password = hashlib.sha256(self.username.encode()).hexdigest()
+        self.args = args
+        self.stub = stub
+        self.rng = random.Random(f"{args.seed}:{index}")
+        # The IDs to read or delete depend on the inbox, so drawing them must not shift the rest of the sequence
+        self.id_rng = random.Random(f"{args.seed}:{index}:ids")
+        self.methods, self.weights = list(args.mix), list(args.mix.values())
+
+        self.seq = 0
+        self.inbox: dict[bytes, bool] = {}  # message ID -> read
+
+    def call(self, rpc, request):
+        """Make a call, waiting out the rate limits of the server (used to set up, not measured)."""
+        while True:
+            try:
+                return rpc(request)
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                    raise
+                time.sleep(float(dict(e.trailing_metadata() or ()).get("retry-after", 1)))
+
+    def log_in(self):
+        """Create the user's account, or log in if it exists from an earlier run."""
+        for action in [AuthRequest.ActionType.CREATE_ACCOUNT, AuthRequest.ActionType.LOGIN]:
+            req = AuthRequest(action_type=action, username=self.username, password=self.password)
+            if self.call(self.stub.Authenticate, req).status == Status.SUCCESS:
+                return
+        raise RuntimeError(f"user {self.username} could not log in")
+
+    def next_method(self) -> str:
+        return self.rng.choices(self.methods, self.weights)[0]
+
+    def think_time(self) -> float:
+        return self.rng.expovariate(1 / self.args.think) if self.args.think else 0.0
+
+    def request(self, method: str):
+        """Build a request for an RPC (named as on the stub), with the callable that handles its response."""
+        rng = self.rng
+        match method:
+            case "Authenticate":
+                return AuthRequest(action_type=AuthRequest.ActionType.LOGIN,
+                                   username=self.username, password=self.password), None
+            case "SendMessage":
+                recipient = f"{self.args.prefix}{rng.randrange(self.args.users)}"
+                body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 40)))
+                message = Message(id=uuid.uuid4().bytes, sender=self.username, recipient=recipient, body=body,
+                                  timestamp=time.time())
+                return SendMessageRequest(username=self.username, message=message), None
+            case "GetMessages":
+                return GetMessagesRequest(username=self.username, since_seq=self.seq, limit=PAGE_SIZE), self.synced
+            case "ReadMessages":
+                unread = sorted(message_id for message_id, read in self.inbox.items() if not read)
+                count = self.id_rng.randint(1, IDS_PER_REQUEST)
+                ids = self.id_rng.sample(unread, min(len(unread), count))
+                for message_id in ids:
+                    self.inbox[message_id] = True
+                return ReadMessagesRequest(username=self.username, message_ids=ids), None
+            case "DeleteMessages":
+                count = self.id_rng.randint(1, IDS_PER_REQUEST)
+                ids = self.id_rng.sample(sorted(self.inbox), min(len(self.inbox), count))
+                for message_id in ids:
+                    del self.inbox[message_id]
+                return DeleteMessagesRequest(username=self.username, message_ids=ids), None
+            case "ListUsers":
+                pattern = f"{self.args.prefix}{rng.randrange(10)}*"
+                return ListUsersRequest(username=self.username, pattern=pattern, limit=LIST_LIMIT), None
+
+    def plan(self, count: int) -> list[dict]:
+        """
+        Draw the first count requests of the user and the think times after them, without a server (so without
+        responses to update the inbox from). Message IDs and timestamps are left out, as they are not seeded.
+        """
+        requests = []
+        for _ in range(count):
+            method = self.next_method()
+            req, _ = self.request(method)
+            if method == "SendMessage":
+                req.message.ClearField("id")
+                req.message.ClearField("timestamp")
+            requests.append({"method": method, "request": json_format.MessageToDict(req), "think": self.think_time()})
+        return requests
+
+    def synced(self, resp: GetMessagesResponse):
+        if resp.full_sync:
+            self.inbox.clear()
+        for message in resp.messages:
+            self.inbox[message.id] = message.read
+        for message_id in resp.deleted_ids:
+            self.inbox.pop(message_id, None)
+        self.seq = resp.seq
+
+    def run(self, deadline: float, results: "Results"):
+        while time.monotonic() < deadline:
+            method = self.next_method()
+            rpc = getattr(self.stub, method)
+            req, handle = self.request(method)
+
+            start = time.perf_counter()
+            try:
+                resp = rpc(req)
+                code = grpc.StatusCode.OK.name
+            except grpc.RpcError as e:
+                resp, code = None, e.code().name
+            results.record(method, time.perf_counter() - start, code,
+                           resp is not None and getattr(resp, "status", Status.SUCCESS) == Status.ERROR)
+            if resp is not None and handle is not None:
+                handle(resp)
+
+            if self.args.think:
+                time.sleep(self.think_time())
+
+
+class Results:
+    """Latencies and status codes of the calls of one process, by RPC."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.codes: dict[str, dict[str, int]] = {}
+        self.error_responses: dict[str, int] = {}
+
+    def record(self, method: str, latency: float, code: str, error_response: bool):
+        with self.lock:
+            self.latencies.setdefault(method, []).append(latency)
+            codes = self.codes.setdefault(method, {})
+            codes[code] = codes.get(code, 0) + 1
+            self.error_responses[method] = self.error_responses.get(method, 0) + error_response
+
+    def merge(self, other: dict):
+        for method, latencies in other["latencies"].items():
+            self.latencies.setdefault(method, []).extend(latencies)
+            codes = self.codes.setdefault(method, {})
+            for code, count in other["codes"][method].items():
+                codes[code] = codes.get(code, 0) + count
+            self.error_responses[method] = self.error_responses.get(method, 0) + other["error_responses"][method]
+
+    def export(self) -> dict:
+        return {"latencies": self.latencies, "codes": self.codes, "error_responses": self.error_responses}
+
+    def report(self, duration: float) -> dict:
+        rpcs = {}
+        for method in sorted(self.latencies):
+            latencies = sorted(self.latencies[method])
+            rpcs[method] = {
+                "requests": len(latencies),
+                "throughput": round(len(latencies) / duration, 2),
+                "codes": dict(sorted(self.codes[method].items())),
+                "error_responses": self.error_responses[method],
+                "latency_ms": {name: round(percentile(latencies, p) * 1000, 3)
+                               for name, p in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]},
+            }
+        requests = sum(rpc["requests"] for rpc in rpcs.values())
+        return {"requests": requests, "throughput": round(requests / duration, 2), "rpcs": rpcs}
+
+
+def run_process(worker: int, args: argparse.Namespace, started: multiprocessing.Barrier, queue: multiprocessing.Queue):
+    """Log in the users of one worker process (every processes-th user), run them, and put their results on queue."""
+    with grpc.insecure_channel(f"{args.host}:{args.port}", options=channel_options()) as channel:
+        stub = ChatStub(grpc.intercept_channel(channel, SessionTokens()))
+        users = [SimulatedUser(i, args, stub) for i in range(worker, args.users, args.processes)]
+
+        threads = [threading.Thread(target=user.log_in) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every process starts the measured run at once
+        started.wait()
+        results = Results()
+        deadline = time.monotonic() + args.duration
+        threads = [threading.Thread(target=user.run, args=(deadline, results)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    queue.put(results.export())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load on a running chat server with simulated users")
+    parser.add_argument("--host", default=LOCALHOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=2, help="worker processes the users are split across")
+    parser.add_argument("--duration", type=float, default=30, help="seconds the users run after they all logged in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--think", type=float, default=0.1, help="mean seconds between a user's requests")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weights of the RPCs the users make, as RPC=weight,... (default: %(default)s)")
+    parser.add_argument("--prefix", default="loaduser", help="prefix of the simulated usernames")
+    parser.add_argument("--output", help="file to write the JSON report to, instead of stdout")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the requests of every user as JSON lines instead, without a server")
+    parser.add_argument("--requests", type=int, default=100, help="requests per user to print with --dry-run")
+    args = parser.parse_args()
+    args.processes = max(1, min(args.processes, args.users))
+
+    if args.dry_run:
+        lines = [json.dumps({"user": user.username, **request})
+                 for user in (SimulatedUser(i, args, None) for i in range(args.users))
+                 for request in user.plan(args.requests)]
+        text = "\n".join(lines)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return
+
+    mp_context = multiprocessing.get_context("spawn")
+    started = mp_context.Barrier(args.processes)
+    queue = mp_context.Queue()
+    processes = [mp_context.Process(target=run_process, args=(worker, args, started, queue))
+                 for worker in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    results = Results()
+    for _ in processes:
+        results.merge(queue.get())
+    for process in processes:
+        process.join()
+
+    report = {"server": f"{args.host}:{args.port}",
+              "seed": args.seed,
+              "users": args.users,
+              "processes": args.processes,
+              "duration": args.duration,
+              "think": args.think,
+              "mix": args.mix,
+              **results.report(args.duration)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
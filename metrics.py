@@ -0,0 +1,373 @@
+import asyncio
+import bisect
+import threading
+import time
+
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+from protos.chat_pb2 import Status
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def message_size(message) -> int:
+    """Wire size of a message: its length if it is already serialized (as in the router), else its ByteSize()."""
+    return len(message) if isinstance(message, bytes) else message.ByteSize()
+
+
+def status_code_name(context, error: BaseException | None = None) -> str:
+    """
+    Name of the status code an RPC ended with: after its handler raised the given error,
+    or returned (OK unless the handler set another code on the context).
+    """
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return grpc.StatusCode.CANCELLED.name
+
+    # Handlers called directly (as in tests) have no context
+    code = context.code() if context is not None else None
+    if code is None:
+        return grpc.StatusCode.UNKNOWN.name if error is not None else grpc.StatusCode.OK.name
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    # grpc.aio reports the raw integer value
+    return next((status.name for status in grpc.StatusCode if status.value[0] == code), grpc.StatusCode.UNKNOWN.name)
+
+
+class MethodStats:
+    """Counters and latency histogram of one RPC method."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = 0
+        self.handled: dict[str, int] = {}  # status code name -> number of finished calls
+        self.error_responses = 0  # responses with status ERROR (failures reported in the response, not as a code)
+        self.requests = 0
+        self.request_bytes = 0
+        self.responses = 0
+        self.response_bytes = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def start(self, request=None) -> float:
+        """Count a call, and its request if it is a unary-request call (the requests of a stream go to receive())."""
+        size = message_size(request) if request is not None else 0
+        with self.lock:
+            self.started += 1
+            self.requests += request is not None
+            self.request_bytes += size
+        return time.perf_counter()
+
+    def receive(self, request):
+        size = message_size(request)
+        with self.lock:
+            self.requests += 1
+            self.request_bytes += size
+
+    def send(self, response):
+        size = message_size(response)
+        error = getattr(response, "status", None) == Status.ERROR
+        with self.lock:
+            self.responses += 1
+            self.response_bytes += size
+            self.error_responses += error
+
+    def copy(self) -> "MethodStats":
+        """Consistent copy of the stats, to be read without holding the lock."""
+        stats = MethodStats()
+        with self.lock:
+            for field, value in vars(self).items():
+                if field != "lock":
+                    setattr(stats, field, value.copy() if isinstance(value, (dict, list)) else value)
+        return stats
+
+    def finish(self, start: float, code: str):
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.handled[code] = self.handled.get(code, 0) + 1
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+
+
+class Metrics:
+    """Per-method RPC metrics of one server, and counters kept elsewhere, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods: dict[str, MethodStats] = {}
+        self.counters: list[tuple[str, str, Callable[[], int]]] = []  # (name, help text, function reading the value)
+
+    def counter(self, name: str, help_text: str, read: Callable[[], int]):
+        """Export a counter kept outside of the metrics, read when the metrics are rendered."""
+        self.counters.append((name, help_text, read))
+
+    def method(self, full_method: str) -> MethodStats:
+        """Return the stats of a method, given its full name (/package.Service/Method)."""
+        name = full_method.rsplit("/", 1)[-1]
+        stats = self.methods.get(name)
+        if stats is None:
+            with self.lock:
+                stats = self.methods.setdefault(name, MethodStats())
+        return stats
+
+    @property
+    def request_bytes(self) -> int:
+        return sum(stats.request_bytes for stats in list(self.methods.values()))
+
+    @property
+    def response_bytes(self) -> int:
+        return sum(stats.response_bytes for stats in list(self.methods.values()))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name: str, metric_type: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self.lock:
+            methods = sorted(self.methods.items())
+
+        snapshots = [(name, stats.copy()) for name, stats in methods]
+
+        counters = [("chat_rpc_started_total", "started", "RPCs started."),
+                    ("chat_rpc_error_responses_total", "error_responses", "Responses with status ERROR."),
+                    ("chat_rpc_requests_total", "requests", "Request messages received."),
+                    ("chat_rpc_request_bytes_total", "request_bytes", "Serialized size of the request messages."),
+                    ("chat_rpc_responses_total", "responses", "Response messages sent."),
+                    ("chat_rpc_response_bytes_total", "response_bytes", "Serialized size of the response messages.")]
+        for metric, field, help_text in counters:
+            family(metric, "counter", help_text)
+            for name, stats in snapshots:
+                lines.append(f'{metric}{{method="{name}"}} {getattr(stats, field)}')
+
+        family("chat_rpc_handled_total", "counter", "RPCs finished, by status code.")
+        for name, stats in snapshots:
+            for code, count in sorted(stats.handled.items()):
+                lines.append(f'chat_rpc_handled_total{{method="{name}",code="{code}"}} {count}')
+
+        family("chat_rpc_handling_seconds", "histogram", "Time from the start to the end of RPCs.")
+        for name, stats in snapshots:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), stats.latency_counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'chat_rpc_handling_seconds_bucket{{method="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'chat_rpc_handling_seconds_sum{{method="{name}"}} {stats.latency_sum}')
+            lines.append(f'chat_rpc_handling_seconds_count{{method="{name}"}} {cumulative}')
+
+        for name, help_text, read in self.counters:
+            family(name, "counter", help_text)
+            lines.append(f"{name} {read()}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records the metrics of every RPC handled by a thread pool server."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        stats = self.metrics.method(handler_call_details.method)
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+            wrapped = self.unary_unary(behavior, stats)
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+            wrapped = self.unary_stream(behavior, stats)
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+            wrapped = self.stream_unary(behavior, stats)
+        else:
+            return handler
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def unary_unary(behavior, stats: MethodStats):
+        def wrapped(request, context):
+            start, code = stats.start(request), grpc.StatusCode.OK.name
+            try:
+                response = behavior(request, context)
+                stats.send(response)
+                code = status_code_name(context)
+                return response
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+    @staticmethod
+    def unary_stream(behavior, stats: MethodStats):
+        def wrapped(request, context):
+            start, code = stats.start(request), grpc.StatusCode.OK.name
+            try:
+                for response in behavior(request, context):
+                    stats.send(response)
+                    yield response
+                # A stream that ends because the client went away was cancelled
+                if not context.is_active():
+                    code = grpc.StatusCode.CANCELLED.name
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+    @staticmethod
+    def stream_unary(behavior, stats: MethodStats):
+        def received(request_iterator):
+            for request in request_iterator:
+                stats.receive(request)
+                yield request
+
+        def wrapped(request_iterator, context):
+            start, code = stats.start(), grpc.StatusCode.OK.name
+            try:
+                response = behavior(received(request_iterator), context)
+                stats.send(response)
+                code = status_code_name(context)
+                return response
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+
+class AioMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Records the metrics of every RPC handled by a grpc.aio server."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        stats = self.metrics.method(handler_call_details.method)
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+            wrapped = self.unary_unary(behavior, stats)
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+            wrapped = self.unary_stream(behavior, stats)
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+            wrapped = self.stream_unary(behavior, stats)
+        else:
+            return handler
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def unary_unary(behavior, stats: MethodStats):
+        async def wrapped(request, context):
+            start, code = stats.start(request), grpc.StatusCode.OK.name
+            try:
+                response = await behavior(request, context)
+                stats.send(response)
+                code = status_code_name(context)
+                return response
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+    @staticmethod
+    def unary_stream(behavior, stats: MethodStats):
+        async def wrapped(request, context):
+            start, code = stats.start(request), grpc.StatusCode.OK.name
+            try:
+                async for response in behavior(request, context):
+                    stats.send(response)
+                    yield response
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+    @staticmethod
+    def stream_unary(behavior, stats: MethodStats):
+        async def received(request_iterator):
+            async for request in request_iterator:
+                stats.receive(request)
+                yield request
+
+        async def wrapped(request_iterator, context):
+            start, code = stats.start(), grpc.StatusCode.OK.name
+            try:
+                response = await behavior(received(request_iterator), context)
+                stats.send(response)
+                code = status_code_name(context)
+                return response
+            except BaseException as e:
+                code = status_code_name(context, e)
+                raise
+            finally:
+                stats.finish(start, code)
+
+        return wrapped
+
+
+def serve_metrics(metrics: Metrics, host: str, port: int) -> ThreadingHTTPServer | None:
+    """
+    Serve the metrics for Prometheus to scrape at http://host:port/metrics from a background thread.
+
+    Returns the HTTP server, or None if the port could not be bound (metrics are then only kept in memory).
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"Metrics: could not listen on {host}:{port} ({e})")
+        return None
+
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics served on http://{host}:{http_server.server_address[1]}/metrics")
+    return http_server
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: protos/chat.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'protos/chat.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11protos/chat.proto\x12\x04\x63hat\"<\n\x0b\x45\x63hoRequest\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x0f\n\x07message\x18\x02 \x01(\t\"=\n\x0c\x45\x63hoResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x91\x01\n\x0b\x41uthRequest\x12\x31\n\x0b\x61\x63tion_type\x18\x01 \x01(\x0e\x32\x1c.chat.AuthRequest.ActionType\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08password\x18\x03 \x01(\t\"+\n\nActionType\x12\x12\n\x0e\x43REATE_ACCOUNT\x10\x00\x12\t\n\x05LOGIN\x10\x01\"Z\n\x0c\x41uthResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x15\n\rsession_token\x18\x03 \x01(\t\"\xc4\x01\n\x12GetMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x11\n\tsince_seq\x18\x02 \x01(\x04\x12\r\n\x05limit\x18\x03 \x01(\r\x12\x12\n\npage_token\x18\x04 \x01(\x0c\x12\x35\n\tdirection\x18\x05 \x01(\x0e\x32\".chat.GetMessagesRequest.Direction\"/\n\tDirection\x12\x10\n\x0cOLDEST_FIRST\x10\x00\x12\x10\n\x0cNEWEST_FIRST\x10\x01\"\xb9\x01\n\x13GetMessagesResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x1f\n\x08messages\x18\x03 \x03(\x0b\x32\r.chat.Message\x12\x13\n\x0b\x64\x65leted_ids\x18\x04 \x03(\x0c\x12\x0b\n\x03seq\x18\x05 \x01(\x04\x12\x11\n\tfull_sync\x18\x06 \x01(\x08\x12\x17\n\x0fnext_page_token\x18\x07 \x01(\x0c\"*\n\x16GetInboxSummaryRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"\xfe\x01\n\x17GetInboxSummaryResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\r\n\x05total\x18\x03 \x01(\r\x12\x0e\n\x06unread\x18\x04 \x01(\r\x12K\n\x10unread_by_sender\x18\x05 \x03(\x0b\x32\x31.chat.GetInboxSummaryResponse.UnreadBySenderEntry\x12\x0b\n\x03seq\x18\x06 \x01(\x04\x1a\x35\n\x13UnreadBySenderEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\r:\x02\x38\x01\"X\n\x10ListUsersRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x0f\n\x07pattern\x18\x02 \x01(\t\x12\r\n\x05limit\x18\x03 \x01(\r\x12\x12\n\npage_token\x18\x04 \x01(\x0c\"t\n\x11ListUsersResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x11\n\tusernames\x18\x03 \x03(\t\x12\x17\n\x0fnext_page_token\x18\x04 \x01(\x0c\"F\n\x12SendMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x1e\n\x07message\x18\x02 \x01(\x0b\x32\r.chat.Message\"J\n\x13SendMessageResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\"H\n\x13SendMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x1f\n\x08messages\x18\x02 \x03(\x0b\x32\r.chat.Message\"w\n\x14SendMessagesResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12*\n\x07results\x18\x03 \x03(\x0b\x32\x19.chat.SendMessageResponse\"F\n\x12\x43reateGroupRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\r\n\x05group\x18\x02 \x01(\t\x12\x0f\n\x07members\x18\x03 \x03(\t\"c\n\x13\x43reateGroupResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x17\n\x0funknown_members\x18\x03 \x03(\t\"K\n\x17SendGroupMessageRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x1e\n\x07message\x18\x02 \x01(\x0b\x32\r.chat.Message\"O\n\x18SendGroupMessageResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\"<\n\x13ReadMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x13\n\x0bmessage_ids\x18\x02 \x03(\x0c\"K\n\x14ReadMessagesResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\"2\n\x0fReadNextRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\r\"h\n\x10ReadNextResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\x12\x1f\n\x08messages\x18\x03 \x03(\x0b\x32\r.chat.Message\">\n\x15\x44\x65leteMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x13\n\x0bmessage_ids\x18\x02 \x03(\x0c\"M\n\x16\x44\x65leteMessagesResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\"%\n\x11\x44\x65leteUserRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"I\n\x12\x44\x65leteUserResponse\x12\x1c\n\x06status\x18\x01 \x01(\x0e\x32\x0c.chat.Status\x12\x15\n\rerror_message\x18\x02 \x01(\t\";\n\x18SubscribeMessagesRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\r\"\xa6\x01\n\x0cMessageEvent\x12\x30\n\nevent_type\x18\x01 \x01(\x0e\x32\x1c.chat.MessageEvent.EventType\x12\x1e\n\x07message\x18\x02 \x01(\x0b\x32\r.chat.Message\x12\x0b\n\x03seq\x18\x03 \x01(\x04\"7\n\tEventType\x12\x07\n\x03NEW\x10\x00\x12\x08\n\x04READ\x10\x01\x12\x0b\n\x07\x44\x45LETED\x10\x02\x12\n\n\x06SYNCED\x10\x03\"v\n\x07Message\x12\n\n\x02id\x18\x01 \x01(\x0c\x12\x0e\n\x06sender\x18\x02 \x01(\t\x12\x11\n\trecipient\x18\x03 \x01(\t\x12\x0c\n\x04\x62ody\x18\x04 \x01(\t\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\x12\x0c\n\x04read\x18\x06 \x01(\x08\x12\r\n\x05group\x18\x07 \x01(\t* \n\x06Status\x12\x0b\n\x07SUCCESS\x10\x00\x12\t\n\x05\x45RROR\x10\x01\x32\xd9\x07\n\x04\x43hat\x12/\n\x04\x45\x63ho\x12\x11.chat.EchoRequest\x1a\x12.chat.EchoResponse\"\x00\x12\x37\n\x0c\x41uthenticate\x12\x11.chat.AuthRequest\x1a\x12.chat.AuthResponse\"\x00\x12\x44\n\x0bGetMessages\x12\x18.chat.GetMessagesRequest\x1a\x19.chat.GetMessagesResponse\"\x00\x12P\n\x0fGetInboxSummary\x12\x1c.chat.GetInboxSummaryRequest\x1a\x1d.chat.GetInboxSummaryResponse\"\x00\x12>\n\tListUsers\x12\x16.chat.ListUsersRequest\x1a\x17.chat.ListUsersResponse\"\x00\x12\x44\n\x0bSendMessage\x12\x18.chat.SendMessageRequest\x1a\x19.chat.SendMessageResponse\"\x00\x12I\n\x0cSendMessages\x12\x19.chat.SendMessagesRequest\x1a\x1a.chat.SendMessagesResponse\"\x00(\x01\x12\x44\n\x0b\x43reateGroup\x12\x18.chat.CreateGroupRequest\x1a\x19.chat.CreateGroupResponse\"\x00\x12S\n\x10SendGroupMessage\x12\x1d.chat.SendGroupMessageRequest\x1a\x1e.chat.SendGroupMessageResponse\"\x00\x12G\n\x0cReadMessages\x12\x19.chat.ReadMessagesRequest\x1a\x1a.chat.ReadMessagesResponse\"\x00\x12;\n\x08ReadNext\x12\x15.chat.ReadNextRequest\x1a\x16.chat.ReadNextResponse\"\x00\x12M\n\x0e\x44\x65leteMessages\x12\x1b.chat.DeleteMessagesRequest\x1a\x1c.chat.DeleteMessagesResponse\"\x00\x12\x41\n\nDeleteUser\x12\x17.chat.DeleteUserRequest\x1a\x18.chat.DeleteUserResponse\"\x00\x12K\n\x11SubscribeMessages\x12\x1e.chat.SubscribeMessagesRequest\x1a\x12.chat.MessageEvent\"\x00\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'protos.chat_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_GETINBOXSUMMARYRESPONSE_UNREADBYSENDERENTRY']._loaded_options = None
+  _globals['_GETINBOXSUMMARYRESPONSE_UNREADBYSENDERENTRY']._serialized_options = b'8\001'
+  _globals['_STATUS']._serialized_start=2866
+  _globals['_STATUS']._serialized_end=2898
+  _globals['_ECHOREQUEST']._serialized_start=27
+  _globals['_ECHOREQUEST']._serialized_end=87
+  _globals['_ECHORESPONSE']._serialized_start=89
+  _globals['_ECHORESPONSE']._serialized_end=150
+  _globals['_AUTHREQUEST']._serialized_start=153
+  _globals['_AUTHREQUEST']._serialized_end=298
+  _globals['_AUTHREQUEST_ACTIONTYPE']._serialized_start=255
+  _globals['_AUTHREQUEST_ACTIONTYPE']._serialized_end=298
+  _globals['_AUTHRESPONSE']._serialized_start=300
+  _globals['_AUTHRESPONSE']._serialized_end=390
+  _globals['_GETMESSAGESREQUEST']._serialized_start=393
+  _globals['_GETMESSAGESREQUEST']._serialized_end=589
+  _globals['_GETMESSAGESREQUEST_DIRECTION']._serialized_start=542
+  _globals['_GETMESSAGESREQUEST_DIRECTION']._serialized_end=589
+  _globals['_GETMESSAGESRESPONSE']._serialized_start=592
+  _globals['_GETMESSAGESRESPONSE']._serialized_end=777
+  _globals['_GETINBOXSUMMARYREQUEST']._serialized_start=779
+  _globals['_GETINBOXSUMMARYREQUEST']._serialized_end=821
+  _globals['_GETINBOXSUMMARYRESPONSE']._serialized_start=824
+  _globals['_GETINBOXSUMMARYRESPONSE']._serialized_end=1078
+  _globals['_GETINBOXSUMMARYRESPONSE_UNREADBYSENDERENTRY']._serialized_start=1025
+  _globals['_GETINBOXSUMMARYRESPONSE_UNREADBYSENDERENTRY']._serialized_end=1078
+  _globals['_LISTUSERSREQUEST']._serialized_start=1080
+  _globals['_LISTUSERSREQUEST']._serialized_end=1168
+  _globals['_LISTUSERSRESPONSE']._serialized_start=1170
+  _globals['_LISTUSERSRESPONSE']._serialized_end=1286
+  _globals['_SENDMESSAGEREQUEST']._serialized_start=1288
+  _globals['_SENDMESSAGEREQUEST']._serialized_end=1358
+  _globals['_SENDMESSAGERESPONSE']._serialized_start=1360
+  _globals['_SENDMESSAGERESPONSE']._serialized_end=1434
+  _globals['_SENDMESSAGESREQUEST']._serialized_start=1436
+  _globals['_SENDMESSAGESREQUEST']._serialized_end=1508
+  _globals['_SENDMESSAGESRESPONSE']._serialized_start=1510
+  _globals['_SENDMESSAGESRESPONSE']._serialized_end=1629
+  _globals['_CREATEGROUPREQUEST']._serialized_start=1631
+  _globals['_CREATEGROUPREQUEST']._serialized_end=1701
+  _globals['_CREATEGROUPRESPONSE']._serialized_start=1703
+  _globals['_CREATEGROUPRESPONSE']._serialized_end=1802
+  _globals['_SENDGROUPMESSAGEREQUEST']._serialized_start=1804
+  _globals['_SENDGROUPMESSAGEREQUEST']._serialized_end=1879
+  _globals['_SENDGROUPMESSAGERESPONSE']._serialized_start=1881
+  _globals['_SENDGROUPMESSAGERESPONSE']._serialized_end=1960
+  _globals['_READMESSAGESREQUEST']._serialized_start=1962
+  _globals['_READMESSAGESREQUEST']._serialized_end=2022
+  _globals['_READMESSAGESRESPONSE']._serialized_start=2024
+  _globals['_READMESSAGESRESPONSE']._serialized_end=2099
+  _globals['_READNEXTREQUEST']._serialized_start=2101
+  _globals['_READNEXTREQUEST']._serialized_end=2151
+  _globals['_READNEXTRESPONSE']._serialized_start=2153
+  _globals['_READNEXTRESPONSE']._serialized_end=2257
+  _globals['_DELETEMESSAGESREQUEST']._serialized_start=2259
+  _globals['_DELETEMESSAGESREQUEST']._serialized_end=2321
+  _globals['_DELETEMESSAGESRESPONSE']._serialized_start=2323
+  _globals['_DELETEMESSAGESRESPONSE']._serialized_end=2400
+  _globals['_DELETEUSERREQUEST']._serialized_start=2402
+  _globals['_DELETEUSERREQUEST']._serialized_end=2439
+  _globals['_DELETEUSERRESPONSE']._serialized_start=2441
+  _globals['_DELETEUSERRESPONSE']._serialized_end=2514
+  _globals['_SUBSCRIBEMESSAGESREQUEST']._serialized_start=2516
+  _globals['_SUBSCRIBEMESSAGESREQUEST']._serialized_end=2575
+  _globals['_MESSAGEEVENT']._serialized_start=2578
+  _globals['_MESSAGEEVENT']._serialized_end=2744
+  _globals['_MESSAGEEVENT_EVENTTYPE']._serialized_start=2689
+  _globals['_MESSAGEEVENT_EVENTTYPE']._serialized_end=2744
+  _globals['_MESSAGE']._serialized_start=2746
+  _globals['_MESSAGE']._serialized_end=2864
+  _globals['_CHAT']._serialized_start=2901
+  _globals['_CHAT']._serialized_end=3886
+# @@protoc_insertion_point(module_scope)
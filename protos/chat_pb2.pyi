@@ -0,0 +1,328 @@
+from google.protobuf.internal import containers as _containers
+from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
+
+DESCRIPTOR: _descriptor.FileDescriptor
+
+class Status(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = ()
+    SUCCESS: _ClassVar[Status]
+    ERROR: _ClassVar[Status]
+SUCCESS: Status
+ERROR: Status
+
+class EchoRequest(_message.Message):
+    __slots__ = ("status", "message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., message: _Optional[str] = ...) -> None: ...
+
+class EchoResponse(_message.Message):
+    __slots__ = ("status", "message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., message: _Optional[str] = ...) -> None: ...
+
+class AuthRequest(_message.Message):
+    __slots__ = ("action_type", "username", "password")
+    class ActionType(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+        __slots__ = ()
+        CREATE_ACCOUNT: _ClassVar[AuthRequest.ActionType]
+        LOGIN: _ClassVar[AuthRequest.ActionType]
+    CREATE_ACCOUNT: AuthRequest.ActionType
+    LOGIN: AuthRequest.ActionType
+    ACTION_TYPE_FIELD_NUMBER: _ClassVar[int]
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    PASSWORD_FIELD_NUMBER: _ClassVar[int]
+    action_type: AuthRequest.ActionType
+    username: str
+    password: str
+    def __init__(self, action_type: _Optional[_Union[AuthRequest.ActionType, str]] = ..., username: _Optional[str] = ..., password: _Optional[str] = ...) -> None: ...
+
+class AuthResponse(_message.Message):
+    __slots__ = ("status", "error_message", "session_token")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    SESSION_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    session_token: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., session_token: _Optional[str] = ...) -> None: ...
+
+class GetMessagesRequest(_message.Message):
+    __slots__ = ("username", "since_seq", "limit", "page_token", "direction")
+    class Direction(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+        __slots__ = ()
+        OLDEST_FIRST: _ClassVar[GetMessagesRequest.Direction]
+        NEWEST_FIRST: _ClassVar[GetMessagesRequest.Direction]
+    OLDEST_FIRST: GetMessagesRequest.Direction
+    NEWEST_FIRST: GetMessagesRequest.Direction
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    SINCE_SEQ_FIELD_NUMBER: _ClassVar[int]
+    LIMIT_FIELD_NUMBER: _ClassVar[int]
+    PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    DIRECTION_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    since_seq: int
+    limit: int
+    page_token: bytes
+    direction: GetMessagesRequest.Direction
+    def __init__(self, username: _Optional[str] = ..., since_seq: _Optional[int] = ..., limit: _Optional[int] = ..., page_token: _Optional[bytes] = ..., direction: _Optional[_Union[GetMessagesRequest.Direction, str]] = ...) -> None: ...
+
+class GetMessagesResponse(_message.Message):
+    __slots__ = ("status", "error_message", "messages", "deleted_ids", "seq", "full_sync", "next_page_token")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    MESSAGES_FIELD_NUMBER: _ClassVar[int]
+    DELETED_IDS_FIELD_NUMBER: _ClassVar[int]
+    SEQ_FIELD_NUMBER: _ClassVar[int]
+    FULL_SYNC_FIELD_NUMBER: _ClassVar[int]
+    NEXT_PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    messages: _containers.RepeatedCompositeFieldContainer[Message]
+    deleted_ids: _containers.RepeatedScalarFieldContainer[bytes]
+    seq: int
+    full_sync: bool
+    next_page_token: bytes
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., messages: _Optional[_Iterable[_Union[Message, _Mapping]]] = ..., deleted_ids: _Optional[_Iterable[bytes]] = ..., seq: _Optional[int] = ..., full_sync: _Optional[bool] = ..., next_page_token: _Optional[bytes] = ...) -> None: ...
+
+class GetInboxSummaryRequest(_message.Message):
+    __slots__ = ("username",)
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    def __init__(self, username: _Optional[str] = ...) -> None: ...
+
+class GetInboxSummaryResponse(_message.Message):
+    __slots__ = ("status", "error_message", "total", "unread", "unread_by_sender", "seq")
+    class UnreadBySenderEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: int
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[int] = ...) -> None: ...
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    TOTAL_FIELD_NUMBER: _ClassVar[int]
+    UNREAD_FIELD_NUMBER: _ClassVar[int]
+    UNREAD_BY_SENDER_FIELD_NUMBER: _ClassVar[int]
+    SEQ_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    total: int
+    unread: int
+    unread_by_sender: _containers.ScalarMap[str, int]
+    seq: int
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., total: _Optional[int] = ..., unread: _Optional[int] = ..., unread_by_sender: _Optional[_Mapping[str, int]] = ..., seq: _Optional[int] = ...) -> None: ...
+
+class ListUsersRequest(_message.Message):
+    __slots__ = ("username", "pattern", "limit", "page_token")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    PATTERN_FIELD_NUMBER: _ClassVar[int]
+    LIMIT_FIELD_NUMBER: _ClassVar[int]
+    PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    pattern: str
+    limit: int
+    page_token: bytes
+    def __init__(self, username: _Optional[str] = ..., pattern: _Optional[str] = ..., limit: _Optional[int] = ..., page_token: _Optional[bytes] = ...) -> None: ...
+
+class ListUsersResponse(_message.Message):
+    __slots__ = ("status", "error_message", "usernames", "next_page_token")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    USERNAMES_FIELD_NUMBER: _ClassVar[int]
+    NEXT_PAGE_TOKEN_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    usernames: _containers.RepeatedScalarFieldContainer[str]
+    next_page_token: bytes
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., usernames: _Optional[_Iterable[str]] = ..., next_page_token: _Optional[bytes] = ...) -> None: ...
+
+class SendMessageRequest(_message.Message):
+    __slots__ = ("username", "message")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    message: Message
+    def __init__(self, username: _Optional[str] = ..., message: _Optional[_Union[Message, _Mapping]] = ...) -> None: ...
+
+class SendMessageResponse(_message.Message):
+    __slots__ = ("status", "error_message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ...) -> None: ...
+
+class SendMessagesRequest(_message.Message):
+    __slots__ = ("username", "messages")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    MESSAGES_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    messages: _containers.RepeatedCompositeFieldContainer[Message]
+    def __init__(self, username: _Optional[str] = ..., messages: _Optional[_Iterable[_Union[Message, _Mapping]]] = ...) -> None: ...
+
+class SendMessagesResponse(_message.Message):
+    __slots__ = ("status", "error_message", "results")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    results: _containers.RepeatedCompositeFieldContainer[SendMessageResponse]
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., results: _Optional[_Iterable[_Union[SendMessageResponse, _Mapping]]] = ...) -> None: ...
+
+class CreateGroupRequest(_message.Message):
+    __slots__ = ("username", "group", "members")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    GROUP_FIELD_NUMBER: _ClassVar[int]
+    MEMBERS_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    group: str
+    members: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, username: _Optional[str] = ..., group: _Optional[str] = ..., members: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class CreateGroupResponse(_message.Message):
+    __slots__ = ("status", "error_message", "unknown_members")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    UNKNOWN_MEMBERS_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    unknown_members: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., unknown_members: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class SendGroupMessageRequest(_message.Message):
+    __slots__ = ("username", "message")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    message: Message
+    def __init__(self, username: _Optional[str] = ..., message: _Optional[_Union[Message, _Mapping]] = ...) -> None: ...
+
+class SendGroupMessageResponse(_message.Message):
+    __slots__ = ("status", "error_message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ...) -> None: ...
+
+class ReadMessagesRequest(_message.Message):
+    __slots__ = ("username", "message_ids")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_IDS_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    message_ids: _containers.RepeatedScalarFieldContainer[bytes]
+    def __init__(self, username: _Optional[str] = ..., message_ids: _Optional[_Iterable[bytes]] = ...) -> None: ...
+
+class ReadMessagesResponse(_message.Message):
+    __slots__ = ("status", "error_message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ...) -> None: ...
+
+class ReadNextRequest(_message.Message):
+    __slots__ = ("username", "count")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    COUNT_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    count: int
+    def __init__(self, username: _Optional[str] = ..., count: _Optional[int] = ...) -> None: ...
+
+class ReadNextResponse(_message.Message):
+    __slots__ = ("status", "error_message", "messages")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    MESSAGES_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    messages: _containers.RepeatedCompositeFieldContainer[Message]
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ..., messages: _Optional[_Iterable[_Union[Message, _Mapping]]] = ...) -> None: ...
+
+class DeleteMessagesRequest(_message.Message):
+    __slots__ = ("username", "message_ids")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_IDS_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    message_ids: _containers.RepeatedScalarFieldContainer[bytes]
+    def __init__(self, username: _Optional[str] = ..., message_ids: _Optional[_Iterable[bytes]] = ...) -> None: ...
+
+class DeleteMessagesResponse(_message.Message):
+    __slots__ = ("status", "error_message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ...) -> None: ...
+
+class DeleteUserRequest(_message.Message):
+    __slots__ = ("username",)
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    def __init__(self, username: _Optional[str] = ...) -> None: ...
+
+class DeleteUserResponse(_message.Message):
+    __slots__ = ("status", "error_message")
+    STATUS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    status: Status
+    error_message: str
+    def __init__(self, status: _Optional[_Union[Status, str]] = ..., error_message: _Optional[str] = ...) -> None: ...
+
+class SubscribeMessagesRequest(_message.Message):
+    __slots__ = ("username", "limit")
+    USERNAME_FIELD_NUMBER: _ClassVar[int]
+    LIMIT_FIELD_NUMBER: _ClassVar[int]
+    username: str
+    limit: int
+    def __init__(self, username: _Optional[str] = ..., limit: _Optional[int] = ...) -> None: ...
+
+class MessageEvent(_message.Message):
+    __slots__ = ("event_type", "message", "seq")
+    class EventType(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+        __slots__ = ()
+        NEW: _ClassVar[MessageEvent.EventType]
+        READ: _ClassVar[MessageEvent.EventType]
+        DELETED: _ClassVar[MessageEvent.EventType]
+        SYNCED: _ClassVar[MessageEvent.EventType]
+    NEW: MessageEvent.EventType
+    READ: MessageEvent.EventType
+    DELETED: MessageEvent.EventType
+    SYNCED: MessageEvent.EventType
+    EVENT_TYPE_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    SEQ_FIELD_NUMBER: _ClassVar[int]
+    event_type: MessageEvent.EventType
+    message: Message
+    seq: int
+    def __init__(self, event_type: _Optional[_Union[MessageEvent.EventType, str]] = ..., message: _Optional[_Union[Message, _Mapping]] = ..., seq: _Optional[int] = ...) -> None: ...
+
+class Message(_message.Message):
+    __slots__ = ("id", "sender", "recipient", "body", "timestamp", "read", "group")
+    ID_FIELD_NUMBER: _ClassVar[int]
+    SENDER_FIELD_NUMBER: _ClassVar[int]
+    RECIPIENT_FIELD_NUMBER: _ClassVar[int]
+    BODY_FIELD_NUMBER: _ClassVar[int]
+    TIMESTAMP_FIELD_NUMBER: _ClassVar[int]
+    READ_FIELD_NUMBER: _ClassVar[int]
+    GROUP_FIELD_NUMBER: _ClassVar[int]
+    id: bytes
+    sender: str
+    recipient: str
+    body: str
+    timestamp: float
+    read: bool
+    group: str
+    def __init__(self, id: _Optional[bytes] = ..., sender: _Optional[str] = ..., recipient: _Optional[str] = ..., body: _Optional[str] = ..., timestamp: _Optional[float] = ..., read: _Optional[bool] = ..., group: _Optional[str] = ...) -> None: ...
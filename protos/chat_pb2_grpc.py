@@ -0,0 +1,659 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+from protos import chat_pb2 as protos_dot_chat__pb2
+
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in protos/chat_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class ChatStub:
+    """Chat server interface 
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Echo = channel.unary_unary(
+                '/chat.Chat/Echo',
+                request_serializer=protos_dot_chat__pb2.EchoRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.EchoResponse.FromString,
+                _registered_method=True)
+        self.Authenticate = channel.unary_unary(
+                '/chat.Chat/Authenticate',
+                request_serializer=protos_dot_chat__pb2.AuthRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.AuthResponse.FromString,
+                _registered_method=True)
+        self.GetMessages = channel.unary_unary(
+                '/chat.Chat/GetMessages',
+                request_serializer=protos_dot_chat__pb2.GetMessagesRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.GetMessagesResponse.FromString,
+                _registered_method=True)
+        self.GetInboxSummary = channel.unary_unary(
+                '/chat.Chat/GetInboxSummary',
+                request_serializer=protos_dot_chat__pb2.GetInboxSummaryRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.GetInboxSummaryResponse.FromString,
+                _registered_method=True)
+        self.ListUsers = channel.unary_unary(
+                '/chat.Chat/ListUsers',
+                request_serializer=protos_dot_chat__pb2.ListUsersRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.ListUsersResponse.FromString,
+                _registered_method=True)
+        self.SendMessage = channel.unary_unary(
+                '/chat.Chat/SendMessage',
+                request_serializer=protos_dot_chat__pb2.SendMessageRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.SendMessageResponse.FromString,
+                _registered_method=True)
+        self.SendMessages = channel.stream_unary(
+                '/chat.Chat/SendMessages',
+                request_serializer=protos_dot_chat__pb2.SendMessagesRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.SendMessagesResponse.FromString,
+                _registered_method=True)
+        self.CreateGroup = channel.unary_unary(
+                '/chat.Chat/CreateGroup',
+                request_serializer=protos_dot_chat__pb2.CreateGroupRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.CreateGroupResponse.FromString,
+                _registered_method=True)
+        self.SendGroupMessage = channel.unary_unary(
+                '/chat.Chat/SendGroupMessage',
+                request_serializer=protos_dot_chat__pb2.SendGroupMessageRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.SendGroupMessageResponse.FromString,
+                _registered_method=True)
+        self.ReadMessages = channel.unary_unary(
+                '/chat.Chat/ReadMessages',
+                request_serializer=protos_dot_chat__pb2.ReadMessagesRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.ReadMessagesResponse.FromString,
+                _registered_method=True)
+        self.ReadNext = channel.unary_unary(
+                '/chat.Chat/ReadNext',
+                request_serializer=protos_dot_chat__pb2.ReadNextRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.ReadNextResponse.FromString,
+                _registered_method=True)
+        self.DeleteMessages = channel.unary_unary(
+                '/chat.Chat/DeleteMessages',
+                request_serializer=protos_dot_chat__pb2.DeleteMessagesRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.DeleteMessagesResponse.FromString,
+                _registered_method=True)
+        self.DeleteUser = channel.unary_unary(
+                '/chat.Chat/DeleteUser',
+                request_serializer=protos_dot_chat__pb2.DeleteUserRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.DeleteUserResponse.FromString,
+                _registered_method=True)
+        self.SubscribeMessages = channel.unary_stream(
+                '/chat.Chat/SubscribeMessages',
+                request_serializer=protos_dot_chat__pb2.SubscribeMessagesRequest.SerializeToString,
+                response_deserializer=protos_dot_chat__pb2.MessageEvent.FromString,
+                _registered_method=True)
+
+
+class ChatServicer:
+    """Chat server interface 
+    """
+
+    def Echo(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Authenticate(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetInboxSummary(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListUsers(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SendMessage(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SendMessages(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CreateGroup(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SendGroupMessage(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReadMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReadNext(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def DeleteMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def DeleteUser(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SubscribeMessages(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ChatServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Echo': grpc.unary_unary_rpc_method_handler(
+                    servicer.Echo,
+                    request_deserializer=protos_dot_chat__pb2.EchoRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.EchoResponse.SerializeToString,
+            ),
+            'Authenticate': grpc.unary_unary_rpc_method_handler(
+                    servicer.Authenticate,
+                    request_deserializer=protos_dot_chat__pb2.AuthRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.AuthResponse.SerializeToString,
+            ),
+            'GetMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetMessages,
+                    request_deserializer=protos_dot_chat__pb2.GetMessagesRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.GetMessagesResponse.SerializeToString,
+            ),
+            'GetInboxSummary': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetInboxSummary,
+                    request_deserializer=protos_dot_chat__pb2.GetInboxSummaryRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.GetInboxSummaryResponse.SerializeToString,
+            ),
+            'ListUsers': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListUsers,
+                    request_deserializer=protos_dot_chat__pb2.ListUsersRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.ListUsersResponse.SerializeToString,
+            ),
+            'SendMessage': grpc.unary_unary_rpc_method_handler(
+                    servicer.SendMessage,
+                    request_deserializer=protos_dot_chat__pb2.SendMessageRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.SendMessageResponse.SerializeToString,
+            ),
+            'SendMessages': grpc.stream_unary_rpc_method_handler(
+                    servicer.SendMessages,
+                    request_deserializer=protos_dot_chat__pb2.SendMessagesRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.SendMessagesResponse.SerializeToString,
+            ),
+            'CreateGroup': grpc.unary_unary_rpc_method_handler(
+                    servicer.CreateGroup,
+                    request_deserializer=protos_dot_chat__pb2.CreateGroupRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.CreateGroupResponse.SerializeToString,
+            ),
+            'SendGroupMessage': grpc.unary_unary_rpc_method_handler(
+                    servicer.SendGroupMessage,
+                    request_deserializer=protos_dot_chat__pb2.SendGroupMessageRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.SendGroupMessageResponse.SerializeToString,
+            ),
+            'ReadMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.ReadMessages,
+                    request_deserializer=protos_dot_chat__pb2.ReadMessagesRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.ReadMessagesResponse.SerializeToString,
+            ),
+            'ReadNext': grpc.unary_unary_rpc_method_handler(
+                    servicer.ReadNext,
+                    request_deserializer=protos_dot_chat__pb2.ReadNextRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.ReadNextResponse.SerializeToString,
+            ),
+            'DeleteMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteMessages,
+                    request_deserializer=protos_dot_chat__pb2.DeleteMessagesRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.DeleteMessagesResponse.SerializeToString,
+            ),
+            'DeleteUser': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteUser,
+                    request_deserializer=protos_dot_chat__pb2.DeleteUserRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.DeleteUserResponse.SerializeToString,
+            ),
+            'SubscribeMessages': grpc.unary_stream_rpc_method_handler(
+                    servicer.SubscribeMessages,
+                    request_deserializer=protos_dot_chat__pb2.SubscribeMessagesRequest.FromString,
+                    response_serializer=protos_dot_chat__pb2.MessageEvent.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'chat.Chat', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('chat.Chat', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class Chat:
+    """Chat server interface 
+    """
+
+    @staticmethod
+    def Echo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/Echo',
+            protos_dot_chat__pb2.EchoRequest.SerializeToString,
+            protos_dot_chat__pb2.EchoResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Authenticate(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/Authenticate',
+            protos_dot_chat__pb2.AuthRequest.SerializeToString,
+            protos_dot_chat__pb2.AuthResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/GetMessages',
+            protos_dot_chat__pb2.GetMessagesRequest.SerializeToString,
+            protos_dot_chat__pb2.GetMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetInboxSummary(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/GetInboxSummary',
+            protos_dot_chat__pb2.GetInboxSummaryRequest.SerializeToString,
+            protos_dot_chat__pb2.GetInboxSummaryResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListUsers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/ListUsers',
+            protos_dot_chat__pb2.ListUsersRequest.SerializeToString,
+            protos_dot_chat__pb2.ListUsersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SendMessage(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/SendMessage',
+            protos_dot_chat__pb2.SendMessageRequest.SerializeToString,
+            protos_dot_chat__pb2.SendMessageResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SendMessages(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/chat.Chat/SendMessages',
+            protos_dot_chat__pb2.SendMessagesRequest.SerializeToString,
+            protos_dot_chat__pb2.SendMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CreateGroup(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/CreateGroup',
+            protos_dot_chat__pb2.CreateGroupRequest.SerializeToString,
+            protos_dot_chat__pb2.CreateGroupResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SendGroupMessage(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/SendGroupMessage',
+            protos_dot_chat__pb2.SendGroupMessageRequest.SerializeToString,
+            protos_dot_chat__pb2.SendGroupMessageResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReadMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/ReadMessages',
+            protos_dot_chat__pb2.ReadMessagesRequest.SerializeToString,
+            protos_dot_chat__pb2.ReadMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReadNext(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/ReadNext',
+            protos_dot_chat__pb2.ReadNextRequest.SerializeToString,
+            protos_dot_chat__pb2.ReadNextResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def DeleteMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/DeleteMessages',
+            protos_dot_chat__pb2.DeleteMessagesRequest.SerializeToString,
+            protos_dot_chat__pb2.DeleteMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def DeleteUser(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.Chat/DeleteUser',
+            protos_dot_chat__pb2.DeleteUserRequest.SerializeToString,
+            protos_dot_chat__pb2.DeleteUserResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SubscribeMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/chat.Chat/SubscribeMessages',
+            protos_dot_chat__pb2.SubscribeMessagesRequest.SerializeToString,
+            protos_dot_chat__pb2.MessageEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,292 @@
+import threading
+import time
+
+import grpc
+
+from sessions import Sessions, token_of
+
+
+class TokenBucket:
+    """Holds up to burst tokens, refilled at rate tokens per second. Every request takes one."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token, returning 0, or the seconds until one is available if there is none."""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Rate limits of the RPCs a server handles: a token bucket per user and method, and a limit on the RPCs handled at
+    once across all users.
+
+    The user of a call is the one its session token was issued to, so the limits apply before the request is even
+    deserialized, and a client cannot spend another user's tokens. Calls without a valid token (Echo, Authenticate,
+    and the ones the session interceptor rejects) are admitted once handled instead: Authenticate calls take from a
+    bucket per account they log in to or create, and the others from a bucket per client connection (peer), so that a
+    flood of them from one client does not shed everyone else's logins. Each method is limited to the default
+    rate and burst unless the method has its own. Server-streaming calls (SubscribeMessages) are rate limited, but not
+    counted against max_concurrent, as they stay open for as long as the client is connected. A limit of 0 turns it off.
+
+    Buckets that have refilled are the same as new ones, so they are dropped whenever the number of buckets doubles.
+    """
+
+    def __init__(self, sessions: Sessions, rate: float, burst: float, method_limits: dict[str, dict],
+                 max_concurrent: int, retry_after: float):
+        self.sessions = sessions
+        self.default = (rate, burst)
+        self.method_limits = {method: (limits["rate"], limits["burst"]) for method, limits in method_limits.items()}
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self.buckets: dict[tuple[str, str], TokenBucket] = {}  # (username, method) -> bucket
+        self.sweep_at = 1024
+        self.running = 0
+
+        # Calls shed since the server started, exported as metrics
+        self.rate_limited = 0
+        self.overloaded = 0
+
+    def caller(self, method: str, metadata) -> str | None:
+        """
+        Return the owner of the bucket a call takes from: the user its session token was issued to, "" if the method
+        is not rate limited, or None if the call has no valid token, and its owner is only known once it is handled.
+        """
+        rate, _ = self.method_limits.get(method, self.default)
+        return self.sessions.verify(token_of(metadata)) if rate else ""
+
+    @staticmethod
+    def anonymous_caller(method: str, request, context: grpc.ServicerContext) -> str:
+        """Return the owner of the bucket a call without a valid token takes from, once it is handled."""
+        if method == "Authenticate":
+            return request.username
+        # Peers are "ipv4:<address>:<port>" and the like, so they cannot be confused with usernames
+        return context.peer()
+
+    def admit(self, method: str, username: str, concurrent: bool = True) -> tuple[str, float] | None:
+        """
+        Admit a call to a method from the bucket of username, counting it as running until done() if concurrent.
+
+        Returns None if the call is admitted, and otherwise why it is not and the seconds to wait before retrying.
+        """
+        shed = self.take(method, username)
+        if shed is None and concurrent:
+            shed = self.enter()
+        return shed
+
+    def take(self, method: str, username: str) -> tuple[str, float] | None:
+        """Take a token from the bucket of username for a call to a method, as admit() without counting the call."""
+        rate, burst = self.method_limits.get(method, self.default)
+        if not rate:
+            return None
+
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get((username, method))
+            if bucket is None:
+                bucket = self.buckets[(username, method)] = TokenBucket(rate, burst, now)
+                if len(self.buckets) >= self.sweep_at:
+                    self.sweep(now)
+            wait = bucket.take(now)
+            if wait:
+                self.rate_limited += 1
+                return f"Too many {method} requests, retry in {wait:.3f} s.", wait
+        return None
+
+    def enter(self) -> tuple[str, float] | None:
+        """Count a call as running until done(), unless max_concurrent calls already are."""
+        with self.lock:
+            if self.max_concurrent and self.running >= self.max_concurrent:
+                self.overloaded += 1
+                return f"The server is overloaded, retry in {self.retry_after:g} s.", self.retry_after
+            self.running += 1
+        return None
+
+    def done(self):
+        with self.lock:
+            self.running -= 1
+
+    def sweep(self, now: float):
+        """Drop the buckets that have refilled. Must be called holding the lock."""
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[key]
+        self.sweep_at = max(1024, 2 * len(self.buckets))
+
+
+def retry_after_metadata(wait: float) -> tuple[tuple[str, str]]:
+    """The retry-after trailing metadata entry, in seconds."""
+    return ("retry-after", f"{wait:.3f}"),
+
+
+def abort(context: grpc.ServicerContext, details: str, wait: float):
+    """End a shed call on a thread pool server with RESOURCE_EXHAUSTED and the retry-after trailing metadata."""
+    context.set_trailing_metadata(retry_after_metadata(wait))
+    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, details)
+
+
+class RateLimitInterceptor(grpc.ServerInterceptor):
+    """
+    Sheds the RPCs over the rate limits with RESOURCE_EXHAUSTED, before a thread pool server deserializes them (or
+    once they are handled, for calls without a valid session token).
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+        concurrent = handler.unary_stream is None
+        username = self.limiter.caller(method, handler_call_details.invocation_metadata)
+        if username is not None:
+            shed = self.limiter.take(method, username)
+            if shed is not None:
+                return self.shed(handler, *shed)
+            if not concurrent:
+                return handler
+
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+        else:
+            return handler
+
+        limiter = self.limiter
+
+        # The call is only counted as running once its handler starts, so that a call cancelled or past its deadline
+        # before then is never counted, and every call counted is done() in the finally
+        def wrapped(request, context):
+            if username is None:
+                shed = limiter.take(method, limiter.anonymous_caller(method, request, context))
+                if shed is not None:
+                    abort(context, *shed)
+            if not concurrent:
+                return behavior(request, context)
+
+            shed = limiter.enter()
+            if shed is not None:
+                abort(context, *shed)
+            try:
+                return behavior(request, context)
+            finally:
+                limiter.done()
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def shed(handler: grpc.RpcMethodHandler, details: str, wait: float) -> grpc.RpcMethodHandler:
+        """A handler of the same kind that fails the call, without deserializing its requests."""
+
+        def behavior(request, context):
+            abort(context, details, wait)
+
+        if handler.unary_unary is not None:
+            return grpc.unary_unary_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
+        if handler.unary_stream is not None:
+            return grpc.unary_stream_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
+        return grpc.stream_unary_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
+
+
+class AioRateLimitInterceptor(grpc.aio.ServerInterceptor):
+    """
+    Sheds the RPCs over the rate limits with RESOURCE_EXHAUSTED, before a grpc.aio server deserializes them (or once
+    they are handled, for calls without a valid session token).
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+        concurrent = handler.unary_stream is None
+        username = self.limiter.caller(method, handler_call_details.invocation_metadata)
+        if username is not None:
+            shed = self.limiter.take(method, username)
+            if shed is not None:
+                return self.shed(handler, *shed)
+            if not concurrent:
+                return handler
+
+        limiter = self.limiter
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+        elif handler.unary_stream is not None:
+            stream = handler.unary_stream
+
+            # Only calls without a valid token get here, and streams are not counted as running
+            async def wrapped_stream(request, context):
+                shed = limiter.take(method, limiter.anonymous_caller(method, request, context))
+                if shed is not None:
+                    await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, shed[0], retry_after_metadata(shed[1]))
+                async for response in stream(request, context):
+                    yield response
+
+            return grpc.unary_stream_rpc_method_handler(wrapped_stream,
+                                                        request_deserializer=handler.request_deserializer,
+                                                        response_serializer=handler.response_serializer)
+        else:
+            return handler
+
+        # The call is only counted as running once its handler starts, as on the thread pool server
+        async def wrapped(request, context):
+            if username is None:
+                shed = limiter.take(method, limiter.anonymous_caller(method, request, context))
+                if shed is not None:
+                    await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, shed[0], retry_after_metadata(shed[1]))
+
+            shed = limiter.enter()
+            if shed is not None:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, shed[0], retry_after_metadata(shed[1]))
+            try:
+                return await behavior(request, context)
+            finally:
+                limiter.done()
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def shed(handler: grpc.RpcMethodHandler, details: str, wait: float) -> grpc.RpcMethodHandler:
+        """A handler of the same kind that fails the call, without deserializing its requests."""
+
+        async def behavior(request, context):
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, details, retry_after_metadata(wait))
+
+        if handler.unary_unary is not None:
+            return grpc.unary_unary_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
+        if handler.unary_stream is not None:
+            return grpc.unary_stream_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
+        return grpc.stream_unary_rpc_method_handler(behavior, response_serializer=handler.response_serializer)
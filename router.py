@@ -0,0 +1,249 @@
+import asyncio
+import heapq
+import zlib
+
+import grpc
+
+from protos import chat_pb2
+from metrics import AioMetricsInterceptor, Metrics, serve_metrics
+from sessions import token_username
+from config import MAXIMUM_CONCURRENT_RPCS, RESPONSE_COMPRESSION
+from transport import AioCompressionInterceptor, channel_options, method_compression, server_options
+
+SERVICE = chat_pb2.DESCRIPTOR.services_by_name["Chat"]
+
+# Metadata keys set by the gRPC library itself, which must not be forwarded
+RESERVED_METADATA_PREFIXES = ("grpc-", "user-agent")
+
+
+def shard_for(username: str, num_shards: int) -> int:
+    """Return the index of the shard that owns a username (stable across processes, unlike hash())."""
+    return zlib.crc32(username.encode()) % num_shards
+
+
+def routing_key(method_name: str, request, metadata=()) -> str:
+    """Return the username whose shard a request must be handled by."""
+    match method_name:
+        case "SendMessage":
+            # Messages are stored in the recipient's inbox, so cross-shard sends are delivered into its shard
+            return request.message.recipient
+        case _:
+            # Requests may leave out the username of their session, which the shard checks the token of
+            return getattr(request, "username", "") or token_username(metadata)
+
+
+class ChatRouter:
+    """
+    Front router for a chat server split across worker processes.
+
+    Every worker process runs a regular chat server that owns a hash partition of the usernames.
+    The router parses just enough of each request to find the owning shard and forwards the raw request bytes to it.
+    Responses are passed back as raw bytes, except for ListUsers, which is fanned out to every shard and merged,
+    and SendMessages, whose stream of messages is split by recipient into one stream per shard.
+    Groups span shards, so CreateGroup and SendGroupMessage are fanned out to every shard, and each shard keeps its own
+    copy of every group and delivers its messages to the members it owns.
+    """
+
+    def __init__(self, shard_addrs: list[str]):
+        self.channels = [grpc.aio.insecure_channel(shard_addr, options=channel_options())
+                         for shard_addr in shard_addrs]
+
+    def generic_handler(self) -> grpc.GenericRpcHandler:
+        """Build a handler for every method of the Chat service that forwards raw bytes."""
+        handlers = {}
+        for method in SERVICE.methods:
+            request_class = getattr(chat_pb2, method.input_type.name)
+            path = f"/{SERVICE.full_name}/{method.name}"
+
+            if method.name == "ListUsers":
+                handlers[method.name] = grpc.unary_unary_rpc_method_handler(self.list_users)
+            elif method.name == "SendMessages":
+                handlers[method.name] = grpc.stream_unary_rpc_method_handler(self.send_messages)
+            elif method.name == "CreateGroup":
+                handlers[method.name] = grpc.unary_unary_rpc_method_handler(self.create_group)
+            elif method.name == "SendGroupMessage":
+                handlers[method.name] = grpc.unary_unary_rpc_method_handler(self.send_group_message)
+            elif method.server_streaming:
+                handlers[method.name] = grpc.unary_stream_rpc_method_handler(
+                    self.forward_stream(method.name, path, request_class))
+            else:
+                handlers[method.name] = grpc.unary_unary_rpc_method_handler(
+                    self.forward_unary(method.name, path, request_class))
+
+        return grpc.method_handlers_generic_handler(SERVICE.full_name, handlers)
+
+    def channel_for(self, method_name: str, request_class, raw_request: bytes,
+                    context: grpc.aio.ServicerContext) -> grpc.aio.Channel:
+        request = request_class.FromString(raw_request)
+        username = routing_key(method_name, request, context.invocation_metadata())
+        return self.channels[shard_for(username, len(self.channels))]
+
+    def forward_unary(self, method_name: str, path: str, request_class):
+        async def behavior(raw_request: bytes, context: grpc.aio.ServicerContext) -> bytes:
+            channel = self.channel_for(method_name, request_class, raw_request, context)
+            try:
+                return await channel.unary_unary(path)(raw_request, **call_options(context))
+            except grpc.aio.AioRpcError as e:
+                # Pass hints like retry-after on to the client
+                await context.abort(e.code(), e.details(), tuple(e.trailing_metadata()))
+
+        return behavior
+
+    def forward_stream(self, method_name: str, path: str, request_class):
+        async def behavior(raw_request: bytes, context: grpc.aio.ServicerContext):
+            channel = self.channel_for(method_name, request_class, raw_request, context)
+            call = channel.unary_stream(path)(raw_request, **call_options(context))
+            try:
+                async for raw_response in call:
+                    yield raw_response
+            except grpc.aio.AioRpcError as e:
+                await context.abort(e.code(), e.details(), tuple(e.trailing_metadata()))
+            finally:
+                call.cancel()
+
+        return behavior
+
+    async def fan_out(self, method_name: str, raw_request: bytes, context: grpc.aio.ServicerContext) -> list[bytes]:
+        """Forward a request to every shard at once, returning their raw responses in shard order."""
+        path = f"/{SERVICE.full_name}/{method_name}"
+        try:
+            return await asyncio.gather(*(channel.unary_unary(path)(raw_request, **call_options(context))
+                                          for channel in self.channels))
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details())
+
+    async def list_users(self, raw_request: bytes, context: grpc.aio.ServicerContext) -> bytes:
+        """Fan a ListUsers request out to every shard and merge the sorted pages of usernames."""
+        raw_responses = await self.fan_out("ListUsers", raw_request, context)
+
+        responses = [chat_pb2.ListUsersResponse.FromString(raw_response) for raw_response in raw_responses]
+        for resp in responses:
+            if resp.status == chat_pb2.Status.ERROR:
+                return resp.SerializeToString()
+
+        # Page tokens are usernames, so every shard continues from the same token, and the first limit usernames of
+        # the merged pages are the page across all shards
+        usernames = list(heapq.merge(*(resp.usernames for resp in responses)))
+        limit = chat_pb2.ListUsersRequest.FromString(raw_request).limit
+        next_page_token = b""
+        if limit and (len(usernames) > limit or any(resp.next_page_token for resp in responses)):
+            del usernames[limit:]
+            next_page_token = usernames[-1].encode()
+
+        return chat_pb2.ListUsersResponse(status=chat_pb2.Status.SUCCESS,
+                                          usernames=usernames,
+                                          next_page_token=next_page_token).SerializeToString()
+
+    async def create_group(self, raw_request: bytes, context: grpc.aio.ServicerContext) -> bytes:
+        """
+        Create a group on every shard. A member is unknown if no shard has an account for it, so the unknown members
+        are the ones every shard reports.
+        """
+        raw_responses = await self.fan_out("CreateGroup", raw_request, context)
+
+        responses = [chat_pb2.CreateGroupResponse.FromString(raw_response) for raw_response in raw_responses]
+        for resp in responses:
+            if resp.status == chat_pb2.Status.ERROR:
+                return resp.SerializeToString()
+
+        unknown = set.intersection(*(set(resp.unknown_members) for resp in responses))
+        return chat_pb2.CreateGroupResponse(status=chat_pb2.Status.SUCCESS,
+                                            unknown_members=[username for username in responses[0].unknown_members
+                                                             if username in unknown]).SerializeToString()
+
+    async def send_group_message(self, raw_request: bytes, context: grpc.aio.ServicerContext) -> bytes:
+        """Send a group message on every shard, each delivering it to the members it owns."""
+        raw_responses = await self.fan_out("SendGroupMessage", raw_request, context)
+
+        for raw_response in raw_responses:
+            if chat_pb2.SendGroupMessageResponse.FromString(raw_response).status == chat_pb2.Status.ERROR:
+                return raw_response
+        return raw_responses[0]
+
+    async def send_messages(self, request_iterator, context: grpc.aio.ServicerContext) -> bytes:
+        """
+        Split a SendMessages stream into one stream per shard by recipient, forwarding every request as it arrives,
+        and put the per-message results of the shards back in stream order.
+        """
+        path = f"/{SERVICE.full_name}/SendMessages"
+        queues, calls, shards = {}, {}, []
+        try:
+            async for raw_request in request_iterator:
+                request = chat_pb2.SendMessagesRequest.FromString(raw_request)
+                by_shard = {}
+                for message in request.messages:
+                    shard = shard_for(message.recipient, len(self.channels))
+                    by_shard.setdefault(shard, []).append(message)
+                    shards.append(shard)
+
+                for shard, messages in by_shard.items():
+                    if shard not in calls:
+                        queues[shard] = asyncio.Queue()
+                        calls[shard] = self.channels[shard].stream_unary(path)(drain(queues[shard]),
+                                                                               **call_options(context))
+                    queues[shard].put_nowait(chat_pb2.SendMessagesRequest(username=request.username,
+                                                                          messages=messages).SerializeToString())
+
+            for requests in queues.values():
+                requests.put_nowait(None)
+            raw_responses = await asyncio.gather(*calls.values())
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details())
+        finally:
+            for call in calls.values():
+                call.cancel()
+
+        shard_results = {shard: iter(chat_pb2.SendMessagesResponse.FromString(raw_response).results)
+                         for shard, raw_response in zip(calls, raw_responses)}
+        results = [next(shard_results[shard]) for shard in shards]
+
+        failed = sum(result.status == chat_pb2.Status.ERROR for result in results)
+        if failed:
+            return chat_pb2.SendMessagesResponse(status=chat_pb2.Status.ERROR,
+                                                 error_message=f"Send messages failed: {failed} of {len(results)} "
+                                                               f"messages were not sent.",
+                                                 results=results).SerializeToString()
+        return chat_pb2.SendMessagesResponse(status=chat_pb2.Status.SUCCESS,
+                                             results=results).SerializeToString()
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+
+
+async def drain(requests: asyncio.Queue):
+    """Yield the items put on a queue until None is put."""
+    while (item := await requests.get()) is not None:
+        yield item
+
+
+def call_options(context: grpc.aio.ServicerContext) -> dict:
+    """Carry the client's metadata and remaining deadline over to the forwarded call."""
+    metadata = [(key, value) for key, value in context.invocation_metadata()
+                if not key.startswith(RESERVED_METADATA_PREFIXES)]
+    return {"metadata": metadata,
+            "timeout": context.time_remaining(),
+            "wait_for_ready": True}
+
+
+async def serve_router(server_addr: str, shard_addrs: list[str], metrics_port: int = 0):
+    # Initialize the router: forwarded calls and streams run as coroutines on this event loop
+    router = ChatRouter(shard_addrs)
+    metrics = Metrics()
+    server = grpc.aio.server(interceptors=[AioMetricsInterceptor(metrics),
+                                           AioCompressionInterceptor(method_compression(RESPONSE_COMPRESSION))],
+                             options=server_options(),
+                             maximum_concurrent_rpcs=MAXIMUM_CONCURRENT_RPCS or None)
+    server.add_generic_rpc_handlers((router.generic_handler(),))
+
+    # Bind the router to host:port
+    server.add_insecure_port(server_addr)
+    await server.start()
+    if metrics_port:
+        serve_metrics(metrics, server_addr.rsplit(":", 1)[0], metrics_port)
+
+    print(f"Router listening on {server_addr}, forwarding to {len(shard_addrs)} shards")
+    try:
+        await server.wait_for_termination()
+    finally:
+        await router.close()
@@ -1,24 +1,94 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import struct
+import threading
 import uuid
 
 from concurrent import futures
-from fnmatch import fnmatch
 
+from admission import Admission
+from credentials import Credentials
+from dedupe import DedupeCache
 from protos.chat_pb2 import *
 from protos.chat_pb2_grpc import *
-from config import DEBUG, LOCALHOST, PUBLIC_STATUS, SERVER_PORT
-from entity import User
+from config import DEBUG, LOCALHOST, MAX_STREAMS, MAX_WORKERS, PUBLIC_STATUS, SERVER_MODE, SERVER_PORT, STATE_SHARDS
+from config import LOG_PATH, LOG_SAMPLE_RATE, LOG_SUMMARY_INTERVAL
+from config import INBOX_QUOTA, MEMORY_BUDGET, MEMORY_HIGH_WATERMARK, RETRY_AFTER
+from config import CREDENTIAL_CACHE_MAX_ENTRIES, CREDENTIAL_CACHE_TTL, HASH_WORKERS, SCRYPT_N, SCRYPT_P, SCRYPT_R
+from config import MAX_CONCURRENT_RPCS, OVERLOAD_RETRY_AFTER, RATE_LIMIT, RATE_LIMIT_BURST, RATE_LIMIT_METHODS
+from config import SESSION_SECRET, SESSION_TTL
+from config import MAXIMUM_CONCURRENT_RPCS, RESPONSE_COMPRESSION
+from config import DEDUPE_MAX_ENTRIES, DEDUPE_WINDOW, GROUP_FANOUT_LIMIT, METRICS_PORT, SERVER_PROCESSES, SHARD_BASE_PORT, STORAGE_BACKEND
+from config import RETENTION_INTERVAL, RETENTION_MAX_AGE, RETENTION_MAX_MESSAGES, RETENTION_READ_TTL
+from config import PERSISTENCE_ENABLED, PERSISTENCE_PATH, WAL_FSYNC, WAL_GROUP_COMMIT_DELAY, WAL_SNAPSHOT_EVERY
+from metrics import AioMetricsInterceptor, Metrics, MetricsInterceptor, serve_metrics
+from router import serve_router
+from ratelimit import AioRateLimitInterceptor, RateLimiter, RateLimitInterceptor, retry_after_metadata
+from server_log import ServerLog
+from sessions import AioSessionInterceptor, SessionInterceptor, Sessions
+from storage import MemoryStorage, RetentionPolicy, SendResult, SqliteStorage, Storage, WriteAheadLog
+from transport import AioCompressionInterceptor, CompressionInterceptor, method_compression, server_options
 from utils import get_ipaddr
 
+# Messages of a SendMessages stream stored with one storage update
+SEND_BATCH_SIZE = 1000
+
 
 class ChatServer(ChatServicer):
     """Main server class that manages users and message state for all clients."""
 
-    def __init__(self):
-        # Initialize storage for users and messages
-        self.users: dict[str, User] = {}
-        self.messages: dict[uuid.UUID, Message] = {}
-        self.inbound_volume: int = 0
-        self.outbound_volume: int = 0
+    def __init__(self, storage: Storage | None = None, sessions: Sessions | None = None):
+        # Initialize storage for users and messages, and the RPC metrics recorded by the server's interceptor
+        self.storage = storage if storage is not None else MemoryStorage(STATE_SHARDS)
+        self.metrics = Metrics()
+        self.metrics.counter("chat_messages_expired_total", "Messages deleted by the retention policy.",
+                             lambda: self.storage.retention.expired)
+        self.metrics.counter("chat_expired_bytes_total", "Message body bytes reclaimed by the retention policy.",
+                             lambda: self.storage.retention.reclaimed_bytes)
+
+        # Sends are turned away once an inbox is full or the server is out of space for messages
+        self.admission = Admission(self.storage, INBOX_QUOTA, MEMORY_BUDGET, MEMORY_HIGH_WATERMARK, RETRY_AFTER)
+        self.metrics.counter("chat_admission_rejected_total", "Messages turned away by admission control.",
+                             lambda: self.admission.rejected)
+
+        # Passwords are stored hashed with scrypt, which runs on a process pool so that it does not hold up other requests
+        self.credentials = Credentials(SCRYPT_N, SCRYPT_R, SCRYPT_P, HASH_WORKERS,
+                                       CREDENTIAL_CACHE_TTL, CREDENTIAL_CACHE_MAX_ENTRIES)
+        self.metrics.counter("chat_login_cache_hits_total", "Logins verified from the cache without hashing.",
+                             lambda: self.credentials.cache_hits)
+
+        # Logging in issues a signed session token, which the session interceptor checks on every other call
+        self.sessions = sessions if sessions is not None else Sessions.from_secret(SESSION_SECRET, SESSION_TTL)
+
+        # Calls over the rate limits are shed by the rate limit interceptor before they reach the handlers
+        self.rate_limiter = RateLimiter(self.sessions, RATE_LIMIT, RATE_LIMIT_BURST, RATE_LIMIT_METHODS,
+                                        MAX_CONCURRENT_RPCS, OVERLOAD_RETRY_AFTER)
+        self.metrics.counter("chat_rate_limited_total", "Calls shed over the per-user rate limits.",
+                             lambda: self.rate_limiter.rate_limited)
+        self.metrics.counter("chat_overload_shed_total", "Calls shed over the limit of calls handled at once.",
+                             lambda: self.rate_limiter.overloaded)
+
+        # Every open message stream of a thread pool server holds a worker thread, so only so many are served at once
+        # (the other clients poll), and the rest of the pool is left for the other calls
+        self.stream_slots = threading.Semaphore(MAX_STREAMS)
+
+        # Responses to recent sends by sender and message ID, so that a retried send does not store its message again
+        self.sent = DedupeCache(DEDUPE_MAX_ENTRIES, DEDUPE_WINDOW)
+
+        # Requests are only logged in debug mode, and then sampled
+        self.log = ServerLog(self.storage,
+                             self.metrics,
+                             sample_rate=LOG_SAMPLE_RATE if DEBUG else 0.0,
+                             summary_interval=LOG_SUMMARY_INTERVAL,
+                             path=LOG_PATH)
+
+    def close(self):
+        """Stop the log, and shut down the credentials' process pool and the storage."""
+        self.log.close()
+        self.credentials.close()
+        self.storage.close()
 
     def Echo(self, request: EchoRequest, context: grpc.ServicerContext) -> EchoResponse:
         return EchoResponse(status=Status.SUCCESS,
@@ -34,40 +104,37 @@ class ChatServer(ChatServicer):
         3. Attempting to log into an account with the wrong password.
 
         If there was an error, the server sends an ErrorResponse() object with a description to the client.
-        On success, the server sends a blank AuthResponse() object to the client.
+        On success, the server sends an AuthResponse() object with a session token for the user's other requests.
 
         :param request: The AuthRequest object.
         :param context: The servicer context.
         :rtype: AuthResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
-
         username, password = request.username, request.password
         match request.action_type:
             case AuthRequest.ActionType.CREATE_ACCOUNT:
-                if username in self.users:
+                # Check first, so that creating an account that exists does not cost a hash
+                if (self.storage.get_password(username) is not None
+                        or not self.storage.create_user(username, self.credentials.hash(password))):
                     resp = AuthResponse(status=Status.ERROR,
                                         error_message=f"Create account failed: user \"{username}\" already exists.")
                 else:
-                    self.users[username] = User(username=username, password=password)
-                    resp = AuthResponse(status=Status.SUCCESS)
+                    resp = AuthResponse(status=Status.SUCCESS, session_token=self.sessions.issue(username))
             case AuthRequest.ActionType.LOGIN:
-                if username not in self.users:
+                stored_password = self.storage.get_password(username)
+                if stored_password is None:
                     resp = AuthResponse(status=Status.ERROR,
                                         error_message=f"Login failed: user \"{username}\" does not exist.")
-                elif password != self.users[username].password:
+                elif not self.credentials.verify(username, password, stored_password):
                     resp = AuthResponse(status=Status.ERROR,
                                         error_message=f"Login failed: incorrect password.")
                 else:
-                    resp = AuthResponse(status=Status.SUCCESS)
+                    resp = AuthResponse(status=Status.SUCCESS, session_token=self.sessions.issue(username))
             case _:
                 print("Unknown AuthRequest action type.")
                 exit(1)
 
-        self.outbound_volume += len(resp.SerializeToString())
-
-        if DEBUG:
-            self.log()
+        self.log.request("Authenticate", username, resp)
 
         return resp
 
@@ -75,27 +142,66 @@ class ChatServer(ChatServicer):
         """
         This function handles all get messages requests.
 
-        It responds with a list of non-deleted messages that were sent to the requester.
+        If the request carries the inbox sequence number the client is synced to,
+        it responds with only the messages added, changed, or deleted after that sequence number.
+        Otherwise, or if the delta can no longer be computed, it responds with the list of non-deleted messages
+        that were sent to the requester and sets the full sync flag.
+        That list is in timestamp order and can be paged through with a limit, page token, and direction.
+        Either way, the response carries the new inbox sequence number.
 
         :param request: The GetMessagesRequest object.
         :param context: The servicer context.
         :rtype: GetMessagesResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
+        try:
+            after = decode_page_token(request.page_token)
+        except ValueError:
+            resp = GetMessagesResponse(status=Status.ERROR,
+                                       error_message="Get messages failed: invalid page token.")
+            self.log.request("GetMessages", request.username, resp)
+            return resp
 
-        username = request.username
-        assert username in self.users
-
-        # Grab all messages associated with the user
-        message_ids = self.users[username].message_ids
-        messages = [self.messages[message_id] for message_id in message_ids]
+        newest_first = request.direction == GetMessagesRequest.Direction.NEWEST_FIRST
+        sync = self.storage.get_messages(request.username, request.since_seq, request.limit, after, newest_first)
 
         resp = GetMessagesResponse(status=Status.SUCCESS,
-                                   messages=messages)
-        self.outbound_volume += len(resp.SerializeToString())
+                                   messages=sync.messages,
+                                   deleted_ids=[message_id.bytes for message_id in sync.deleted_ids],
+                                   seq=sync.seq,
+                                   full_sync=sync.full_sync,
+                                   next_page_token=encode_page_token(sync.next_key))
 
-        if DEBUG:
-            self.log()
+        self.log.request("GetMessages", request.username, resp)
+
+        return resp
+
+    def GetInboxSummary(self, request: GetInboxSummaryRequest,
+                        context: grpc.ServicerContext) -> GetInboxSummaryResponse:
+        """
+        This function handles all get inbox summary requests.
+
+        It responds with the number of messages and unread messages in the requester's inbox, the unread messages per
+        sender, and the inbox sequence number, without any message. The storage keeps these counts up to date as the
+        inbox changes, so the cost does not grow with the size of the inbox.
+
+        :param request: The GetInboxSummaryRequest object.
+        :param context: The servicer context.
+        :rtype: GetInboxSummaryResponse
+        """
+        summary = self.storage.inbox_summary(request.username)
+
+        if summary is None:
+            resp = GetInboxSummaryResponse(status=Status.ERROR,
+                                           error_message=f"Get inbox summary failed: user \"{request.username}\" "
+                                                         f"does not exist.")
+        else:
+            resp = GetInboxSummaryResponse(status=Status.SUCCESS,
+                                           total=summary.total,
+                                           unread=summary.unread,
+                                           unread_by_sender=summary.unread_by_sender,
+                                           seq=summary.seq)
+
+        self.log.request("GetInboxSummary", request.username, resp)
 
         return resp
 
@@ -103,23 +209,28 @@ class ChatServer(ChatServicer):
         """
         This function handles all list users requests.
 
-        It responds with a list of all current users whose usernames match the provided wildcard pattern.
+        It responds with a sorted list of all current users whose usernames match the provided wildcard pattern.
+        That list can be paged through with a limit and page token.
 
         :param request: The ListUsersRequest object.
         :param context: The servicer context.
-        :rtype: GetMessagesResponse
+        :rtype: ListUsersResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
+        try:
+            after = request.page_token.decode() if request.page_token else None
+        except UnicodeDecodeError:
+            resp = ListUsersResponse(status=Status.ERROR,
+                                     error_message="List users failed: invalid page token.")
+            self.log.request("ListUsers", request.username, resp)
+            return resp
 
-        username, pattern = request.username, request.pattern
-        matches = [username for username in self.users if fnmatch(username, pattern)]
+        matches, next_username = self.storage.list_users(request.pattern, request.limit, after)
 
         resp = ListUsersResponse(status=Status.SUCCESS,
-                                 usernames=matches)
-        self.outbound_volume += len(resp.SerializeToString())
+                                 usernames=matches,
+                                 next_page_token=next_username.encode() if next_username is not None else b"")
 
-        if DEBUG:
-            self.log()
+        self.log.request("ListUsers", request.username, resp)
 
         return resp
 
@@ -131,35 +242,125 @@ class ChatServer(ChatServicer):
         Then it inserts the message ID into the recipient's message inbox.
         On success, it responds with a blank SendMessageResponse() object.
 
+        Sends are idempotent: a request with the sender and ID of a message sent within the last DEDUPE_WINDOW seconds
+        gets the response of the first send, so clients can safely retry a send that timed out. A send that failed
+        stored nothing, so it is not remembered and its retry runs again.
+
+        A send to a full inbox, or while the server is out of space for messages, fails with RESOURCE_EXHAUSTED and a
+        retry-after hint in the trailing metadata.
+
         :param request: The SendMessageRequest object.
         :param context: The servicer context.
         :rtype: SendMessageResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
-
         username, message = request.username, request.message
 
-        # Assert that the message does not already exist and the request user matches the sender
-        assert message.id not in self.messages
+        # Assert that the request user matches the sender
         assert username == message.sender
 
-        if message.recipient not in self.users:
-            return SendMessageResponse(status=Status.ERROR,
-                                       error_message=f"Send message failed: recipient \"{message.recipient}\" does not exist.")
+        def send() -> SendMessageResponse:
+            reason = self.admission.check(message.recipient, len(message.body.encode()))
+            if reason is not None:
+                self.admission.abort(context, f"Send message failed: {reason}")
+                return SendMessageResponse(status=Status.ERROR, error_message=f"Send message failed: {reason}")
+            if not self.storage.send_message(message):
+                return SendMessageResponse(status=Status.ERROR,
+                                           error_message=f"Send message failed: recipient \"{message.recipient}\" does not exist.")
+            return SendMessageResponse(status=Status.SUCCESS)
+
+        # Keyed by sender too, so that another user reusing a message ID does not get the first sender's response
+        resp = self.sent.run((message.sender, message.id), send, keep=lambda resp: resp.status == Status.SUCCESS)
+
+        self.log.request("SendMessage", username, resp)
+
+        return resp
+
+    def SendMessages(self, request_iterator, context: grpc.ServicerContext) -> SendMessagesResponse:
+        """
+        This function handles all bulk send messages requests: a stream of requests that each carry many messages.
 
-        # Store the message
-        message_id = uuid.UUID(bytes=message.id)
-        self.messages[message_id] = message
+        Each message is validated as it arrives, and the valid messages are stored in batches of SEND_BATCH_SIZE,
+        each with a single storage update.
+        Once the stream ends, it responds with one result per message, in stream order.
+        Messages turned away by admission control fail on their own, so the client can retry just those.
 
-        # Add the message to the recipient's inbox
-        recipient = self.users[message.recipient]
-        recipient.add_message(message_id)
+        :param request_iterator: The stream of SendMessagesRequest objects.
+        :param context: The servicer context.
+        :rtype: SendMessagesResponse
+        """
+        batch = SendBatch(self.admission)
+        for request in request_iterator:
+            if batch.add(request) >= SEND_BATCH_SIZE:
+                batch.store(self.storage)
+        batch.store(self.storage)
 
-        resp = SendMessageResponse(status=Status.SUCCESS)
-        self.outbound_volume += len(resp.SerializeToString())
+        resp = batch.response()
 
-        if DEBUG:
-            self.log()
+        self.log.request("SendMessages", batch.username, resp)
+
+        return resp
+
+    def CreateGroup(self, request: CreateGroupRequest, context: grpc.ServicerContext) -> CreateGroupResponse:
+        """
+        This function handles all create group requests.
+
+        It creates a group of the requester and the listed members, each of whom then gets every message sent to it.
+        Members without an account stay in the group but get no messages, and are listed in the response.
+
+        :param request: The CreateGroupRequest object.
+        :param context: The servicer context.
+        :rtype: CreateGroupResponse
+        """
+        if not request.group:
+            resp = CreateGroupResponse(status=Status.ERROR,
+                                       error_message="Create group failed: group name cannot be empty.")
+            self.log.request("CreateGroup", request.username, resp)
+            return resp
+
+        unknown = self.storage.create_group(request.group, [request.username, *request.members])
+
+        if unknown is None:
+            resp = CreateGroupResponse(status=Status.ERROR,
+                                       error_message=f"Create group failed: group \"{request.group}\" already exists.")
+        else:
+            resp = CreateGroupResponse(status=Status.SUCCESS, unknown_members=unknown)
+
+        self.log.request("CreateGroup", request.username, resp)
+
+        return resp
+
+    def SendGroupMessage(self, request: SendGroupMessageRequest,
+                         context: grpc.ServicerContext) -> SendGroupMessageResponse:
+        """
+        This function handles all send group message requests.
+
+        It stores the message once, in the group named by the message, and delivers it to the inbox of every member
+        (the sender included) with the member as its recipient.
+        Small groups get it right away, and members of larger groups when they next sync their inbox (or right away if
+        they have an open stream), so the cost of the send does not grow with the size of the group.
+        Like SendMessage, it fails with RESOURCE_EXHAUSTED while the server is running out of space for messages.
+
+        :param request: The SendGroupMessageRequest object.
+        :param context: The servicer context.
+        :rtype: SendGroupMessageResponse
+        """
+        username, message = request.username, request.message
+
+        # Assert that the request user matches the sender
+        assert username == message.sender
+
+        reason = self.admission.check(None, len(message.body.encode()), bulk=True)
+        if reason is not None:
+            resp = SendGroupMessageResponse(status=Status.ERROR, error_message=f"Send group message failed: {reason}")
+            self.admission.abort(context, resp.error_message)
+        elif not self.storage.send_group_message(message):
+            resp = SendGroupMessageResponse(status=Status.ERROR,
+                                            error_message=f"Send group message failed: group \"{message.group}\" "
+                                                          f"does not exist or \"{username}\" is not a member.")
+        else:
+            resp = SendGroupMessageResponse(status=Status.SUCCESS)
+
+        self.log.request("SendGroupMessage", username, resp)
 
         return resp
 
@@ -176,30 +377,39 @@ class ChatServer(ChatServicer):
         :param context: The servicer context.
         :rtype: ReadMessagesResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
+        self.storage.read_messages(request.username, request.message_ids)
+
+        resp = ReadMessagesResponse(status=Status.SUCCESS)
 
-        username, message_ids = request.username, request.message_ids
+        self.log.request("ReadMessages", request.username, resp)
 
-        # Set the read flag for each message in the request
-        for message_id in message_ids:
-            # Convert to UUID
-            message_id = uuid.UUID(bytes=message_id)
-            assert message_id in self.messages
+        return resp
 
-            message = self.messages[message_id]
+    def ReadNext(self, request: ReadNextRequest, context: grpc.ServicerContext) -> ReadNextResponse:
+        """
+        This function handles all read next requests.
 
-            # Assert that the recipient matches the request username
-            assert message.recipient == username
+        It takes up to the requested number of the oldest unread messages from the requester's inbox, in the order
+        they arrived, and sets their read flag. The storage keeps the unread messages in arrival order, so the
+        client does not need to list its inbox to choose which messages to read.
+        On success, it responds with the messages that were read (none if there were no unread messages).
 
-            # Mark the message as read
-            assert not message.read
-            message.read = True
+        :param request: The ReadNextRequest object.
+        :param context: The servicer context.
+        :rtype: ReadNextResponse
+        """
+        messages = self.storage.read_next(request.username, request.count) if request.count > 0 else None
 
-        resp = ReadMessagesResponse(status=Status.SUCCESS)
-        self.outbound_volume += len(resp.SerializeToString())
+        if request.count == 0:
+            resp = ReadNextResponse(status=Status.ERROR,
+                                    error_message="Read next failed: count must be at least 1.")
+        elif messages is None:
+            resp = ReadNextResponse(status=Status.ERROR,
+                                    error_message=f"Read next failed: user \"{request.username}\" does not exist.")
+        else:
+            resp = ReadNextResponse(status=Status.SUCCESS, messages=messages)
 
-        if DEBUG:
-            self.log()
+        self.log.request("ReadNext", request.username, resp)
 
         return resp
 
@@ -216,36 +426,11 @@ class ChatServer(ChatServicer):
         :param context: The servicer context.
         :rtype: DeleteMessagesResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
-
-        username, message_ids = request.username, request.message_ids
-
-        # Get the recipient
-        recipient = self.users[username]
-
-        # Delete the messages one by one
-        for message_id in message_ids:
-            # Convert to UUID
-            message_id = uuid.UUID(bytes=message_id)
-            assert message_id in self.messages
-
-            # Get the message to delete
-            message = self.messages[message_id]
-
-            # Assert that the recipient matches the request username
-            assert message.recipient == username
-
-            # Delete the message from the recipient
-            recipient.delete_message(message_id)
-
-            # Delete the message
-            del self.messages[message_id]
+        self.storage.delete_messages(request.username, request.message_ids)
 
         resp = DeleteMessagesResponse(status=Status.SUCCESS)
-        self.outbound_volume += len(resp.SerializeToString())
 
-        if DEBUG:
-            self.log()
+        self.log.request("DeleteMessages", request.username, resp)
 
         return resp
 
@@ -262,45 +447,253 @@ class ChatServer(ChatServicer):
         :param context: The servicer context.
         :rtype: DeleteUserResponse
         """
-        self.inbound_volume += len(request.SerializeToString())
-
-        username = request.username
+        self.storage.delete_user(request.username)
 
-        # Get the user
-        assert username in self.users
-        user = self.users[username]
+        resp = DeleteUserResponse(status=Status.SUCCESS)
 
-        # Delete all messages sent to that user
-        for message_id in user.message_ids:
-            assert message_id in self.messages
-            del self.messages[message_id]
+        self.log.request("DeleteUser", request.username, resp)
 
-        # Delete the user
-        del self.users[username]
+        return resp
 
-        resp = DeleteUserResponse(status=Status.SUCCESS)
-        self.outbound_volume += len(resp.SerializeToString())
+    def SubscribeMessages(self, request: SubscribeMessagesRequest, context: grpc.ServicerContext):
+        """
+        This function handles all subscribe messages requests.
 
-        if DEBUG:
-            self.log()
+        It registers a stream for the requester and first replays their current inbox (or its newest messages up to the
+        requested limit) as NEW events, followed by SYNCED.
+        After that, every committed send, read, or delete that touches the requester's inbox is pushed onto the stream.
+        The stream ends when the client cancels it or the user is deleted.
+        Past the limit of open streams, the call fails with RESOURCE_EXHAUSTED and the client polls instead.
 
+        :param request: The SubscribeMessagesRequest object.
+        :param context: The servicer context.
+        :rtype: Iterator[MessageEvent]
+        """
+        username = request.username
+        events = queue.SimpleQueue()
+
+        if not self.stream_slots.acquire(blocking=False):
+            context.set_trailing_metadata(retry_after_metadata(OVERLOAD_RETRY_AFTER))
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          f"Subscribe failed: the server is at its limit of message streams, "
+                          f"retry in {OVERLOAD_RETRY_AFTER} s.")
+
+        try:
+            if not self.storage.subscribe(username, events, request.limit):
+                context.abort(grpc.StatusCode.NOT_FOUND, f"Subscribe failed: user \"{username}\" does not exist.")
+
+            # Wake the stream up if the client goes away
+            context.add_callback(lambda: events.put(None))
+
+            try:
+                while True:
+                    event = events.get()
+                    if event is None:
+                        return
+                    yield event
+            finally:
+                self.storage.unsubscribe(username, events)
+        finally:
+            self.stream_slots.release()
+
+
+class AsyncChatServer(ChatServer):
+    """
+    Variant of the server that runs on an asyncio event loop with grpc.aio.
+
+    Every handler is an async def version of the ChatServer handler and shares the same storage.
+    Open streams are parked coroutines rather than parked threads, so the number of connections is not bounded
+    by the size of a thread pool.
+    """
+
+    async def run_blocking(self, fn, *args):
+        """Run a mutating handler or storage call in a worker thread if the storage blocks on disk I/O, else inline."""
+        if self.storage.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def Echo(self, request: EchoRequest, context: grpc.aio.ServicerContext) -> EchoResponse:
+        return super().Echo(request, context)
+
+    async def Authenticate(self, request: AuthRequest, context: grpc.aio.ServicerContext) -> AuthResponse:
+        # Always in a worker thread, which waits for the password hash while the event loop goes on
+        return await asyncio.to_thread(super().Authenticate, request, context)
+
+    async def GetMessages(self, request: GetMessagesRequest,
+                          context: grpc.aio.ServicerContext) -> GetMessagesResponse:
+        # Syncing delivers pending group messages, which is a mutation
+        return await self.run_blocking(super().GetMessages, request, context)
+
+    async def GetInboxSummary(self, request: GetInboxSummaryRequest,
+                              context: grpc.aio.ServicerContext) -> GetInboxSummaryResponse:
+        return await self.run_blocking(super().GetInboxSummary, request, context)
+
+    async def ListUsers(self, request: ListUsersRequest, context: grpc.aio.ServicerContext) -> ListUsersResponse:
+        return super().ListUsers(request, context)
+
+    async def SendMessage(self, request: SendMessageRequest,
+                          context: grpc.aio.ServicerContext) -> SendMessageResponse:
+        return await self.run_blocking(super().SendMessage, request, context)
+
+    async def SendMessages(self, request_iterator, context: grpc.aio.ServicerContext) -> SendMessagesResponse:
+        """See ChatServer.SendMessages. The stream is read on the event loop, and each batch is stored like a send."""
+        batch = SendBatch(self.admission)
+        async for request in request_iterator:
+            if batch.add(request) >= SEND_BATCH_SIZE:
+                await self.run_blocking(batch.store, self.storage)
+        await self.run_blocking(batch.store, self.storage)
+
+        resp = batch.response()
+        self.log.request("SendMessages", batch.username, resp)
         return resp
 
-    def log(self):
-        """Utility function that logs the state of the server."""
-        print("\n-------------------------------- SERVER STATE --------------------------------")
-        print(f"USERS: {self.users}")
-        print(f"MESSAGES: {self.messages}")
-        print(f"TOTAL TRAFFIC (INBOUND): {self.inbound_volume} bytes")
-        print(f"TOTAL TRAFFIC (OUTBOUND): {self.outbound_volume} bytes")
-        print("------------------------------------------------------------------------------\n")
+    async def CreateGroup(self, request: CreateGroupRequest, context: grpc.aio.ServicerContext) -> CreateGroupResponse:
+        return await self.run_blocking(super().CreateGroup, request, context)
 
+    async def SendGroupMessage(self, request: SendGroupMessageRequest,
+                               context: grpc.aio.ServicerContext) -> SendGroupMessageResponse:
+        return await self.run_blocking(super().SendGroupMessage, request, context)
 
-def main():
-    # Initialize the server
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
-    add_ChatServicer_to_server(ChatServer(), server)
+    async def ReadMessages(self, request: ReadMessagesRequest,
+                           context: grpc.aio.ServicerContext) -> ReadMessagesResponse:
+        return await self.run_blocking(super().ReadMessages, request, context)
+
+    async def ReadNext(self, request: ReadNextRequest, context: grpc.aio.ServicerContext) -> ReadNextResponse:
+        return await self.run_blocking(super().ReadNext, request, context)
+
+    async def DeleteMessages(self, request: DeleteMessagesRequest,
+                             context: grpc.aio.ServicerContext) -> DeleteMessagesResponse:
+        return await self.run_blocking(super().DeleteMessages, request, context)
+
+    async def DeleteUser(self, request: DeleteUserRequest, context: grpc.aio.ServicerContext) -> DeleteUserResponse:
+        return await self.run_blocking(super().DeleteUser, request, context)
+
+    async def SubscribeMessages(self, request: SubscribeMessagesRequest, context: grpc.aio.ServicerContext):
+        """
+        This function handles all subscribe messages requests on the event loop.
 
+        See ChatServer.SubscribeMessages. Events are handed from the storage to the stream's coroutine
+        through an asyncio queue, and the stream's cleanup runs when the coroutine is cancelled.
+        """
+        username = request.username
+        events = LoopQueue(asyncio.get_running_loop())
+
+        if not await self.run_blocking(self.storage.subscribe, username, events, request.limit):
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"Subscribe failed: user \"{username}\" does not exist.")
+
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.storage.unsubscribe(username, events)
+
+
+class LoopQueue:
+    """Asyncio queue whose put() can be called from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class SendBatch:
+    """Results of a SendMessages stream, and its validated messages waiting to be stored."""
+
+    def __init__(self, admission: Admission):
+        self.admission = admission
+        self.username = ""
+        self.results: list[SendMessageResponse] = []
+        self.messages: list[Message] = []
+        self.positions: list[int] = []  # index in results of each waiting message
+        self.pending: dict[str, int] = {}  # number of waiting messages per recipient, for the inbox quota
+
+    def add(self, request: SendMessagesRequest) -> int:
+        """Validate the messages of a request and queue them, returning the number of messages waiting to be stored."""
+        self.username = username = request.username
+        success, error = Status.SUCCESS, Status.ERROR
+
+        for message in request.messages:
+            if message.sender != username:
+                error_message = "Send message failed: sender does not match the requesting user."
+            elif len(message.id) != 16:
+                error_message = "Send message failed: message ID must be 16 bytes."
+            elif (reason := self.admission.check(message.recipient, len(message.body.encode()), bulk=True,
+                                                 pending=self.pending.get(message.recipient, 0))) is not None:
+                error_message = f"Send message failed: {reason}"
+            else:
+                self.pending[message.recipient] = self.pending.get(message.recipient, 0) + 1
+                self.positions.append(len(self.results))
+                self.messages.append(message)
+                self.results.append(SendMessageResponse(status=success))
+                continue
+
+            self.results.append(SendMessageResponse(status=error, error_message=error_message))
+        return len(self.messages)
+
+    def store(self, storage: Storage):
+        """
+        Store the waiting messages with one storage update, and fail the ones whose recipient does not exist or whose
+        ID was already sent (e.g. by a replayed stream), without failing the others.
+        """
+        if not self.messages:
+            return
+
+        for i, message, result in zip(self.positions, self.messages, storage.send_messages(self.messages)):
+            match result:
+                case SendResult.NO_RECIPIENT:
+                    self.results[i].status = Status.ERROR
+                    self.results[i].error_message = \
+                        f"Send message failed: recipient \"{message.recipient}\" does not exist."
+                case SendResult.DUPLICATE_ID:
+                    self.results[i].status = Status.ERROR
+                    self.results[i].error_message = "Send message failed: a message with this ID was already sent."
+        self.messages.clear()
+        self.positions.clear()
+        self.pending.clear()
+
+    def response(self) -> SendMessagesResponse:
+        error = Status.ERROR
+        failed = sum(result.status == error for result in self.results)
+        if failed:
+            return SendMessagesResponse(status=Status.ERROR,
+                                        error_message=f"Send messages failed: {failed} of {len(self.results)} "
+                                                      f"messages were not sent.",
+                                        results=self.results)
+        return SendMessagesResponse(status=Status.SUCCESS,
+                                    results=self.results)
+
+
+def encode_page_token(key: tuple[float, uuid.UUID] | None) -> bytes:
+    """Encode an inbox index key as an opaque page token (empty if there is no next page)."""
+    if key is None:
+        return b""
+
+    timestamp, message_id = key
+    return struct.pack("!d", timestamp) + message_id.bytes
+
+
+def decode_page_token(token: bytes) -> tuple[float, uuid.UUID] | None:
+    """Decode a page token back into an inbox index key, raising ValueError if the token is malformed."""
+    if not token:
+        return None
+    if len(token) != 24:
+        raise ValueError("page token must be 24 bytes")
+
+    (timestamp,) = struct.unpack("!d", token[:8])
+    return timestamp, uuid.UUID(bytes=token[8:])
+
+
+def get_server_addr() -> str:
+    """Utility function that returns the host:port the server should bind to."""
     # Check for public visibility
     if not PUBLIC_STATUS:
         host = LOCALHOST
@@ -310,14 +703,117 @@ def main():
             print("Error: server IP address could not be found.")
             exit(1)
 
+    return f"{host}:{SERVER_PORT}"
+
+
+def create_storage(data_dir: str | None = None) -> Storage:
+    """Create the configured storage backend, persisting it to data_dir if given."""
+    retention = RetentionPolicy(max_age=RETENTION_MAX_AGE,
+                                max_messages=RETENTION_MAX_MESSAGES,
+                                read_ttl=RETENTION_READ_TTL,
+                                interval=RETENTION_INTERVAL)
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStorage(os.path.join(data_dir or PERSISTENCE_PATH, "chat.db"),
+                             fsync=WAL_FSYNC,
+                             group_fanout_limit=GROUP_FANOUT_LIMIT,
+                             retention=retention)
+
+    wal = None
+    if data_dir is not None:
+        wal = WriteAheadLog(data_dir,
+                            fsync=WAL_FSYNC,
+                            group_commit_delay=WAL_GROUP_COMMIT_DELAY,
+                            snapshot_every=WAL_SNAPSHOT_EVERY)
+    return MemoryStorage(STATE_SHARDS, wal, group_fanout_limit=GROUP_FANOUT_LIMIT, retention=retention)
+
+
+def serve(server_addr: str, data_dir: str | None = None, metrics_port: int = 0, session_key: bytes | None = None):
+    # Initialize the server: every open SubscribeMessages stream holds on to a worker thread, up to MAX_STREAMS of them
+    chat_server = ChatServer(create_storage(data_dir), Sessions(session_key, SESSION_TTL) if session_key else None)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS),
+                         interceptors=[MetricsInterceptor(chat_server.metrics),
+                                       RateLimitInterceptor(chat_server.rate_limiter),
+                                       SessionInterceptor(chat_server.sessions),
+                                       CompressionInterceptor(method_compression(RESPONSE_COMPRESSION))],
+                         options=server_options(),
+                         maximum_concurrent_rpcs=MAXIMUM_CONCURRENT_RPCS or None)
+    add_ChatServicer_to_server(chat_server, server)
+
     # Bind the server to host:port
-    server_addr = f"{host}:{SERVER_PORT}"
     server.add_insecure_port(server_addr)
     server.start()
+    if metrics_port:
+        serve_metrics(chat_server.metrics, LOCALHOST, metrics_port)
+    chat_server.log.dump_on_signal()
+
+    print(f"Server listening on {server_addr} (kill -USR1 {os.getpid()} logs a dump of its state)")
+    try:
+        server.wait_for_termination()
+    finally:
+        server.stop(None)
+        chat_server.close()
+
+
+async def serve_aio(server_addr: str, data_dir: str | None = None, metrics_port: int = 0,
+                    session_key: bytes | None = None):
+    # Initialize the server: handlers and streams run as coroutines on this event loop
+    chat_server = AsyncChatServer(create_storage(data_dir),
+                                  Sessions(session_key, SESSION_TTL) if session_key else None)
+    server = grpc.aio.server(interceptors=[AioMetricsInterceptor(chat_server.metrics),
+                                           AioRateLimitInterceptor(chat_server.rate_limiter),
+                                           AioSessionInterceptor(chat_server.sessions),
+                                           AioCompressionInterceptor(method_compression(RESPONSE_COMPRESSION))],
+                             options=server_options(),
+                             maximum_concurrent_rpcs=MAXIMUM_CONCURRENT_RPCS or None)
+    add_ChatServicer_to_server(chat_server, server)
 
-    print(f"Server listening on {server_addr}")
-    server.wait_for_termination()
-    server.log()
+    # Bind the server to host:port
+    server.add_insecure_port(server_addr)
+    await server.start()
+    if metrics_port:
+        serve_metrics(chat_server.metrics, LOCALHOST, metrics_port)
+    chat_server.log.dump_on_signal()
+
+    print(f"Server (asyncio) listening on {server_addr} (kill -USR1 {os.getpid()} logs a dump of its state)")
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(None)
+        chat_server.close()
+
+
+def run_server(server_addr: str, data_dir: str | None = None, metrics_port: int = 0, session_key: bytes | None = None):
+    """
+    Serve the chat service on host:port in the configured mode, persisting its state to data_dir if given,
+    and its metrics on metrics_port if not 0. Session tokens are signed with session_key if given, else as configured.
+    """
+    if SERVER_MODE == "aio":
+        asyncio.run(serve_aio(server_addr, data_dir, metrics_port, session_key))
+    else:
+        serve(server_addr, data_dir, metrics_port, session_key)
+
+
+def main():
+    server_addr = get_server_addr()
+    data_dir = PERSISTENCE_PATH if PERSISTENCE_ENABLED or STORAGE_BACKEND == "sqlite" else None
+
+    if SERVER_PROCESSES == 1:
+        run_server(server_addr, data_dir, METRICS_PORT)
+        return
+
+    # Start one worker process per shard, each owning a hash partition of the usernames (and its own log and metrics),
+    # all signing session tokens with the same key so that a token issued by one shard is accepted by the others
+    session_key = SESSION_SECRET.encode() or os.urandom(32)
+    shard_addrs = [f"{LOCALHOST}:{SHARD_BASE_PORT + i}" for i in range(SERVER_PROCESSES)]
+    mp_context = multiprocessing.get_context("spawn")
+    for i, shard_addr in enumerate(shard_addrs):
+        shard_data_dir = os.path.join(data_dir, f"shard-{i}") if data_dir is not None else None
+        shard_metrics_port = METRICS_PORT + 1 + i if METRICS_PORT else 0
+        mp_context.Process(target=run_server, args=(shard_addr, shard_data_dir, shard_metrics_port, session_key),
+                           daemon=True).start()
+
+    # Route every request to the shard that owns it
+    asyncio.run(serve_router(server_addr, shard_addrs, METRICS_PORT))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import json
+import logging
+import queue
+import random
+import signal
+import sys
+import threading
+
+from logging.handlers import QueueHandler, QueueListener
+
+from protos.chat_pb2 import Status
+from metrics import Metrics
+from storage import Storage
+
+# Records waiting to be written: once the writer falls this far behind, new records are dropped instead of queued
+LOG_QUEUE_SIZE = 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one line of JSON: its time, process, event name, and fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": round(record.created, 6), "pid": record.process, "event": record.msg}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller: records that do not fit in the queue are counted and dropped."""
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class formats the record here, in the caller's thread; the listener thread formats it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ServerLog:
+    """
+    Structured log of a server: sampled request events, periodic state summaries, and full state dumps on demand.
+
+    Logging a request only builds a small record and puts it on a bounded queue. A listener thread formats the records
+    as JSON lines and writes them out, so the request handlers never wait on the output, and the cost per request does
+    not grow with the state. Only dump() walks the whole state.
+    """
+
+    def __init__(self, storage: Storage, metrics: Metrics, sample_rate: float = 0.0, summary_interval: float = 0.0,
+                 path: str = ""):
+        """
+        :param sample_rate: Fraction of successful requests to log. Failed requests are logged unless it is 0.
+        :param summary_interval: Seconds between state summaries, 0 for none.
+        :param path: File to append the log to, or empty for stdout.
+        """
+        self.storage = storage
+        self.metrics = metrics
+        self.sample_rate = sample_rate
+        self.closed = threading.Event()
+
+        self.handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        self.logger = logging.Logger("chat.server")
+        self.logger.addHandler(self.handler)
+
+        output = logging.FileHandler(path, delay=True) if path else logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.handler.queue, output)
+        self.listener.start()
+
+        if summary_interval:
+            threading.Thread(target=self.summary_loop, args=(summary_interval,), name="log-summaries",
+                             daemon=True).start()
+
+    def event(self, event: str, **fields):
+        """Log an event with the given fields, which must be JSON-serializable (or be logged as their str())."""
+        self.logger.info(event, extra={"fields": fields})
+
+    def request(self, method: str, username: str, resp):
+        """Log a handled request: always if it failed, and with probability sample_rate otherwise."""
+        if not self.sample_rate:
+            return
+
+        failed = resp.status == Status.ERROR
+        if not failed and random.random() >= self.sample_rate:
+            return
+
+        fields = {"method": method, "username": username, "status": Status.Name(resp.status)}
+        if failed:
+            fields["error"] = resp.error_message
+        self.event("request", **fields)
+
+    def summary(self):
+        """Log the size of the state and the traffic so far."""
+        self.event("state_summary",
+                   **self.storage.stats()._asdict(),
+                   request_bytes=self.metrics.request_bytes,
+                   response_bytes=self.metrics.response_bytes,
+                   dropped_records=self.handler.dropped)
+
+    def summary_loop(self, interval: float):
+        while not self.closed.wait(interval):
+            self.summary()
+
+    def dump(self):
+        """Log the full state: every user and every message. This takes time and memory in proportion to the state."""
+        users = {username: {"seq": user.seq, "message_ids": [str(message_id) for message_id in user.message_ids]}
+                 for username, user in self.storage.users.items()}
+        messages = {str(message_id): {"sender": message.sender,
+                                      "recipient": message.recipient,
+                                      "body": message.body,
+                                      "timestamp": message.timestamp,
+                                      "read": message.read}
+                    for message_id, message in self.storage.messages.items()}
+        self.event("state_dump", users=users, messages=messages)
+
+    def dump_on_signal(self):
+        """Dump the state whenever the process receives SIGUSR1 (kill -USR1 <pid>), on platforms that have it."""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=self.dump, name="state-dump",
+                                                                                 daemon=True).start())
+
+    def close(self):
+        """Stop the summaries, and write out every queued record."""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.listener.stop()
@@ -0,0 +1,276 @@
+import base64
+import collections
+import hashlib
+import hmac
+import os
+import time
+
+import grpc
+
+# Metadata entry that carries the session token of a call, as "Bearer <token>"
+METADATA_KEY = "authorization"
+BEARER = "Bearer "
+
+# Methods that can be called without a session
+PUBLIC_METHODS = frozenset({"Echo", "Authenticate"})
+
+UNAUTHENTICATED = "Missing, invalid, or expired session token, please log in again."
+
+
+def encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class Sessions:
+    """
+    Stateless session tokens: "<username>.<expiry>.<signature>", with the username in base64url, the expiry in whole
+    seconds since the epoch, and the HMAC-SHA256 of the first two parts under the server's key.
+
+    A token is checked by recomputing its signature, so the check takes no lock and no storage lookup, and any server
+    process with the same key accepts it. The flip side is that a token cannot be revoked: it stays valid until it
+    expires, also after its user is deleted.
+    """
+
+    def __init__(self, key: bytes, ttl: float):
+        self.key = key
+        self.ttl = ttl
+
+    @classmethod
+    def from_secret(cls, secret: str, ttl: float) -> "Sessions":
+        """Sign with the configured secret, or with a random key (tokens then only last until the server restarts)."""
+        return cls(secret.encode() if secret else os.urandom(32), ttl)
+
+    def sign(self, payload: str) -> str:
+        return encode(hmac.new(self.key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, username: str) -> str:
+        payload = f"{encode(username.encode())}.{int(time.time() + self.ttl)}"
+        return f"{payload}.{self.sign(payload)}"
+
+    def verify(self, token: str | None) -> str | None:
+        """Return the username of a valid, unexpired token, else None."""
+        if not token:
+            return None
+
+        payload, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(signature.encode(), self.sign(payload).encode()):
+            return None
+
+        username, _, expiry = payload.partition(".")
+        if int(expiry) < time.time():
+            return None
+        return decode(username).decode()
+
+
+def token_of(metadata) -> str | None:
+    """Return the session token in the metadata of a call, if any."""
+    for key, value in metadata or ():
+        if key == METADATA_KEY and value.startswith(BEARER):
+            return value[len(BEARER):]
+    return None
+
+
+def token_username(metadata) -> str:
+    """Return the username a call's token claims, without checking it (for routing only), or "" if it has none."""
+    token = token_of(metadata)
+    try:
+        return decode(token.partition(".")[0]).decode() if token else ""
+    except ValueError:
+        return ""
+
+
+def authorize(request, username: str | None) -> tuple[grpc.StatusCode, str] | None:
+    """
+    Check that a request is made by the user of the session, filling in its username if the client left it out.
+
+    Returns None if the request is authorized, and otherwise the status code and details to end the call with.
+    """
+    if username is None:
+        return grpc.StatusCode.UNAUTHENTICATED, UNAUTHENTICATED
+    if not request.username:
+        request.username = username
+    elif request.username != username:
+        return grpc.StatusCode.PERMISSION_DENIED, f"The session of \"{username}\" cannot act as \"{request.username}\"."
+    return None
+
+
+class SessionInterceptor(grpc.ServerInterceptor):
+    """Checks the session token of every RPC before it is handled by a thread pool server."""
+
+    def __init__(self, sessions: Sessions):
+        self.sessions = sessions
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler_call_details.method.rsplit("/", 1)[-1] in PUBLIC_METHODS:
+            return handler
+
+        username = self.sessions.verify(token_of(handler_call_details.invocation_metadata))
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+            wrapped = self.unary(behavior, username)
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+            wrapped = self.unary(behavior, username)
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+            wrapped = self.stream_unary(behavior, username)
+        else:
+            return handler
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def unary(behavior, username: str | None):
+        def wrapped(request, context):
+            if (error := authorize(request, username)) is not None:
+                context.abort(*error)
+            return behavior(request, context)
+
+        return wrapped
+
+    @staticmethod
+    def stream_unary(behavior, username: str | None):
+        def wrapped(request_iterator, context):
+            if username is None:
+                context.abort(grpc.StatusCode.UNAUTHENTICATED, UNAUTHENTICATED)
+
+            def authorized():
+                for request in request_iterator:
+                    if (error := authorize(request, username)) is not None:
+                        context.abort(*error)
+                    yield request
+
+            return behavior(authorized(), context)
+
+        return wrapped
+
+
+class AioSessionInterceptor(grpc.aio.ServerInterceptor):
+    """Checks the session token of every RPC before it is handled by a grpc.aio server."""
+
+    def __init__(self, sessions: Sessions):
+        self.sessions = sessions
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler_call_details.method.rsplit("/", 1)[-1] in PUBLIC_METHODS:
+            return handler
+
+        username = self.sessions.verify(token_of(handler_call_details.invocation_metadata))
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+            wrapped = self.unary_unary(behavior, username)
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+            wrapped = self.unary_stream(behavior, username)
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+            wrapped = self.stream_unary(behavior, username)
+        else:
+            return handler
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def unary_unary(behavior, username: str | None):
+        async def wrapped(request, context):
+            if (error := authorize(request, username)) is not None:
+                await context.abort(*error)
+            return await behavior(request, context)
+
+        return wrapped
+
+    @staticmethod
+    def unary_stream(behavior, username: str | None):
+        async def wrapped(request, context):
+            if (error := authorize(request, username)) is not None:
+                await context.abort(*error)
+            async for response in behavior(request, context):
+                yield response
+
+        return wrapped
+
+    @staticmethod
+    def stream_unary(behavior, username: str | None):
+        async def wrapped(request_iterator, context):
+            if username is None:
+                await context.abort(grpc.StatusCode.UNAUTHENTICATED, UNAUTHENTICATED)
+
+            async def authorized():
+                async for request in request_iterator:
+                    if (error := authorize(request, username)) is not None:
+                        await context.abort(*error)
+                    yield request
+
+            return await behavior(authorized(), context)
+
+        return wrapped
+
+
+class SessionTokens(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor,
+                    grpc.StreamUnaryClientInterceptor):
+    """
+    Client side of the sessions: remembers the token of every successful Authenticate on the channel, and sends the
+    token of the request's user (or of the last user to log in, if the request has no username) with every call.
+
+    One instance can be shared by several channels, e.g. grpc.intercept_channel(channel, tokens).
+    """
+
+    def __init__(self):
+        self.tokens: dict[str, str] = {}
+        self.last = ""
+
+    def attach(self, client_call_details, username: str):
+        token = self.tokens.get(username) if username else self.last
+        if not token:
+            return client_call_details
+        metadata = [(key, value) for key, value in client_call_details.metadata or () if key != METADATA_KEY]
+        metadata.append((METADATA_KEY, BEARER + token))
+        return CallDetails.of(client_call_details)._replace(metadata=metadata)
+
+    def clear(self):
+        """Forget every token, when the user signs out."""
+        self.tokens.clear()
+        self.last = ""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        call = continuation(self.attach(client_call_details, getattr(request, "username", "")), request)
+        if client_call_details.method.endswith("/Authenticate"):
+            resp = call.result()
+            if resp.session_token:
+                self.tokens[request.username] = self.last = resp.session_token
+        return call
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return continuation(self.attach(client_call_details, getattr(request, "username", "")), request)
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        # The token is picked by the first request of the stream
+        first = next(request_iterator, None)
+        requests = iter(()) if first is None else prepend(first, request_iterator)
+        return continuation(self.attach(client_call_details, getattr(first, "username", "")), requests)
+
+
+def prepend(first, rest):
+    yield first
+    yield from rest
+
+
+class CallDetails(collections.namedtuple("CallDetails", ("method", "timeout", "metadata", "credentials",
+                                                         "wait_for_ready", "compression")),
+                  grpc.ClientCallDetails):
+    """Client call details that interceptors can change with _replace()."""
+
+    @classmethod
+    def of(cls, details: grpc.ClientCallDetails) -> "CallDetails":
+        return cls(details.method, details.timeout, details.metadata, details.credentials, details.wait_for_ready,
+                   details.compression)
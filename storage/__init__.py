@@ -0,0 +1,6 @@
+from .base import InboxSummary, InboxSync, RetentionPolicy, SendResult, Storage, StorageStats
+from .memory import MemoryStorage
+from .sqlite import SqliteStorage
+from .wal import RecordType, WriteAheadLog
+
+__all__ = ["InboxSummary", "InboxSync", "RetentionPolicy", "SendResult", "Storage", "StorageStats", "MemoryStorage", "SqliteStorage", "RecordType", "WriteAheadLog"]
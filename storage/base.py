@@ -0,0 +1,225 @@
+import enum
+import functools
+import re
+import uuid
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from fnmatch import translate
+from typing import NamedTuple
+
+from protos.chat_pb2 import Message
+from entity import User
+
+
+class InboxSync(NamedTuple):
+    """Result of syncing a user's inbox: either a page of the full inbox or the changes since a sequence number."""
+    messages: list[Message]
+    deleted_ids: list[uuid.UUID]
+    seq: int
+    full_sync: bool
+    next_key: tuple[float, uuid.UUID] | None
+
+
+class InboxSummary(NamedTuple):
+    """Counts of a user's inbox, kept up to date as it changes, so that reading them does not walk the inbox."""
+    total: int
+    unread: int
+    unread_by_sender: dict[str, int]  # only senders with unread messages
+    seq: int
+
+
+class SendResult(enum.Enum):
+    """What became of one message of a batch send."""
+    SENT = enum.auto()
+    NO_RECIPIENT = enum.auto()  # the recipient does not exist
+    DUPLICATE_ID = enum.auto()  # a message with the same ID is already stored, e.g. a replayed stream
+
+
+class StorageStats(NamedTuple):
+    """Sizes of the server state, cheap enough to report periodically."""
+    users: int
+    groups: int
+    messages: int  # including group messages, counted once
+    message_bytes: int  # total UTF-8 size of the message bodies
+    subscribers: int  # open SubscribeMessages streams
+
+
+class RetentionPolicy(NamedTuple):
+    """How long inbox messages are kept. Every limit defaults to 0, which keeps messages forever."""
+    max_age: float = 0.0  # seconds after its timestamp a message is deleted
+    max_messages: int = 0  # messages kept per inbox, the oldest are deleted beyond it
+    read_ttl: float = 0.0  # seconds after it is read a message is deleted
+    interval: float = 1.0  # seconds between expiry passes
+
+
+class UsernamePattern(NamedTuple):
+    """A compiled ListUsers wildcard pattern."""
+    prefix: str  # literal prefix every match starts with, so matches are one range of the sorted usernames
+    match: Callable[[str], re.Match | None]
+
+
+# Groups with at most this many members have their messages delivered to every member's inbox as they are sent
+# (fan-out on write). Messages to larger groups are delivered to each member's inbox when the member next syncs it
+# (fan-out on read), so sending one does not cost a write per member.
+GROUP_FANOUT_LIMIT = 100
+
+# Number of compiled patterns kept around: clients re-send the same searches, often one keystroke apart
+PATTERN_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern: str) -> UsernamePattern:
+    """Compile a wildcard pattern (with the same matching rules as fnmatch) and find its literal prefix."""
+    wildcard = re.search(r"[*?\[]", pattern)
+    prefix = pattern[:wildcard.start()] if wildcard is not None else pattern
+    return UsernamePattern(prefix, re.compile(translate(pattern)).match)
+
+
+class Storage(ABC):
+    """
+    Interface of the server state that the request handlers call: users, inboxes, messages, and read flags.
+
+    Implementations must be safe to call from any number of threads. Mutations are committed by the time they return,
+    and their inbox events are pushed to the user's open streams in commit order.
+    """
+
+    @property
+    @abstractmethod
+    def blocking(self) -> bool:
+        """Whether operations block on disk I/O (and should be kept off an event loop)."""
+
+    @abstractmethod
+    def create_user(self, username: str, password: str) -> bool:
+        """Create an account, returning False if the username is taken."""
+
+    @abstractmethod
+    def get_password(self, username: str) -> str | None:
+        """Return the stored password of a user, or None if the user does not exist."""
+
+    @abstractmethod
+    def list_users(self, pattern: str, limit: int = 0, after: str | None = None) -> tuple[list[str], str | None]:
+        """
+        Collect one page of the sorted usernames matching a wildcard pattern.
+
+        The page starts right after the given username and holds at most limit usernames (0 for no limit).
+        Returns the usernames and the username to continue from, or None if this is the last page.
+        """
+
+    @abstractmethod
+    def get_messages(self, username: str, since_seq: int, limit: int, after: tuple[float, uuid.UUID] | None,
+                     newest_first: bool) -> InboxSync:
+        """
+        Sync a user's inbox.
+
+        Returns the changes after since_seq if a delta can be computed from it,
+        and otherwise one page of the inbox in timestamp order.
+        """
+
+    @abstractmethod
+    def inbox_summary(self, username: str) -> InboxSummary | None:
+        """Count the messages and unread messages in a user's inbox, or return None if the user does not exist."""
+
+    @abstractmethod
+    def inbox_size(self, username: str) -> int | None:
+        """Count the messages in a user's inbox, or return None if the user does not exist."""
+
+    @abstractmethod
+    def send_message(self, message: Message) -> bool:
+        """
+        Store a message and add it to the recipient's inbox.
+
+        Returns False if the recipient does not exist.
+        """
+
+    @abstractmethod
+    def send_messages(self, messages: list[Message]) -> list[SendResult]:
+        """
+        Store a batch of messages and add them to their recipients' inboxes, in order.
+
+        A message whose recipient does not exist, or whose ID is already stored, is skipped without failing the rest
+        of the batch. Returns the result of each message.
+        """
+
+    @abstractmethod
+    def create_group(self, name: str, members: list[str]) -> list[str] | None:
+        """
+        Create a group, returning None if the name is taken.
+
+        Members are kept as given, but only the ones with an account in this storage get the group's messages:
+        returns the members without one.
+        """
+
+    @abstractmethod
+    def send_group_message(self, message: Message) -> bool:
+        """
+        Store a message to the group named by message.group once, and deliver it to the inbox of every member.
+
+        In each member's inbox, the message keeps its ID and has the member as its recipient, and its read flag
+        is the member's own. Returns False if the group does not exist or the sender is not a member.
+        """
+
+    @abstractmethod
+    def read_messages(self, username: str, message_ids: list[bytes]):
+        """Set the read flag of messages in a user's inbox."""
+
+    @abstractmethod
+    def read_next(self, username: str, count: int) -> list[Message] | None:
+        """
+        Set the read flag of the oldest unread messages in a user's inbox, up to count of them.
+
+        Returns the messages in the order they arrived, or None if the user does not exist.
+        """
+
+    @abstractmethod
+    def delete_messages(self, username: str, message_ids: list[bytes]):
+        """Delete messages from a user's inbox."""
+
+    @abstractmethod
+    def delete_user(self, username: str):
+        """Delete a user along with every message in their inbox."""
+
+    @abstractmethod
+    def expire(self, now: float):
+        """
+        Delete the inbox messages that are due by now under the retention policy, and the oldest messages of inboxes
+        over its size limit, like delete_messages() does.
+        """
+
+    @abstractmethod
+    def subscribe(self, username: str, events, limit: int) -> bool:
+        """
+        Register a stream for a user's inbox events.
+
+        The newest messages (up to limit, 0 for all) are replayed onto the stream as NEW events, followed by SYNCED.
+        Registration and replay happen atomically, so no update can fall in between.
+        Returns False if the user does not exist.
+
+        :param events: Queue-like object whose put() method receives MessageEvent objects, or None when the stream ends.
+        """
+
+    @abstractmethod
+    def unsubscribe(self, username: str, events):
+        """Unregister a stream registered with subscribe()."""
+
+    @abstractmethod
+    def stats(self) -> StorageStats:
+        """Count the users, messages, and open streams, without copying any of them."""
+
+    @property
+    @abstractmethod
+    def message_bytes(self) -> int:
+        """UTF-8 size of the stored message bodies, cheap enough to read on every send (but maybe slightly stale)."""
+
+    @property
+    @abstractmethod
+    def users(self) -> dict[str, User]:
+        """Snapshot of all users, for debugging."""
+
+    @property
+    @abstractmethod
+    def messages(self) -> dict[uuid.UUID, Message]:
+        """Snapshot of all messages, for debugging."""
+
+    def close(self):
+        """Release the resources held by the storage."""
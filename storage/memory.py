@@ -0,0 +1,987 @@
+import bisect
+import heapq
+import threading
+import uuid
+
+from collections import defaultdict
+
+from protos.chat_pb2 import Message, MessageEvent
+from entity import User
+from .base import (GROUP_FANOUT_LIMIT, InboxSummary, InboxSync, RetentionPolicy, SendResult, Storage, StorageStats,
+                   UsernamePattern, compile_pattern)
+from .message_store import MessageStore
+from .retention import Retention
+from .wal import (SEQ, RecordType, WriteAheadLog, pack_ids, pack_str, pack_strs, unpack_ids, unpack_str,
+                  unpack_strs)
+
+
+class Shard:
+    """One lock-striped slice of the server state."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users: dict[str, User] = {}
+        self.messages = MessageStore()
+
+        # Sorted usernames, so that ListUsers patterns with a literal prefix are a range scan
+        self.usernames: list[str] = []
+
+        # Open SubscribeMessages streams, keyed by the subscribed username
+        self.subscribers: dict[str, list] = defaultdict(list)
+
+        # Username -> group name -> the user's state in the group
+        self.memberships: dict[str, dict[str, "Membership"]] = defaultdict(dict)
+
+
+class Group:
+    """
+    A group and every message sent to it, each stored once.
+
+    Its members and messages are guarded by its own lock, which may be taken while holding a shard lock (never the
+    other way around).
+
+    A message is held by every local member until the member deletes it (or leaves), whether it was delivered yet or
+    not, and its body is reclaimed once no member holds it. Positions in the group stay fixed, so a reclaimed message
+    leaves a gap behind, and the gaps before the oldest stored message are trimmed.
+    """
+
+    def __init__(self, name: str, members: list[str]):
+        self.lock = threading.Lock()
+        self.name = name
+        self.members = set(members)
+        self.messages = MessageStore()
+
+        # Message IDs in send order from position base on, None for reclaimed messages: a member's cursor counts how
+        # many of them were delivered to the member's inbox
+        self.message_ids: list[uuid.UUID | None] = []
+        self.base = 0
+        self.head = 0  # index of message_ids before which every entry is None
+
+        # Message ID -> position, and the number of members that hold the message
+        self.positions: dict[uuid.UUID, int] = {}
+        self.holders: dict[uuid.UUID, int] = {}
+
+        # Members with an account in this storage (with their state in the group), and those of them with open streams
+        self.local: dict[str, Membership] = {}
+        self.online: set[str] = set()
+
+    @property
+    def end(self) -> int:
+        """The position after the newest message."""
+        return self.base + len(self.message_ids)
+
+    def ids(self, start: int, end: int) -> list[uuid.UUID]:
+        """The IDs of the messages from position start to end that are still stored. Must be called holding the lock."""
+        return [message_id for message_id in self.message_ids[max(start - self.base, 0):max(end - self.base, 0)]
+                if message_id is not None]
+
+    def release(self, message_id: uuid.UUID):
+        """Drop a member's hold on a message, and reclaim it if it was the last one. Must be called holding the lock."""
+        self.holders[message_id] -= 1
+        if self.holders[message_id]:
+            return
+
+        del self.holders[message_id]
+        self.messages.remove(message_id)
+        self.message_ids[self.positions.pop(message_id) - self.base] = None
+        for membership in self.local.values():
+            membership.deleted.discard(message_id)
+
+        # Trim the leading gap once it is half the list, so trimming is amortized O(1) per message
+        while self.head < len(self.message_ids) and self.message_ids[self.head] is None:
+            self.head += 1
+        if 2 * self.head >= len(self.message_ids):
+            del self.message_ids[:self.head]
+            self.base += self.head
+            self.head = 0
+
+
+class Membership:
+    """One user's state in a group: how far its messages were delivered, and which of them were read or deleted."""
+
+    __slots__ = ("group", "cursor", "read", "deleted")
+
+    def __init__(self, group: Group):
+        self.group = group
+        self.cursor = 0
+        self.read: set[uuid.UUID] = set()
+        self.deleted: set[uuid.UUID] = set()
+
+
+class MemoryStorage(Storage):
+    """
+    Thread-safe in-memory server state, split into shards by username.
+
+    Everything that belongs to one user lives in the same shard: the account, the inbox, the messages in it,
+    and the user's open message streams. Each operation only takes the lock of the one shard it touches,
+    so requests for users in different shards never wait on each other.
+
+    Group messages are stored once, in their group. Each member's inbox only gets the message ID, when the message is
+    delivered to it: as it is sent for groups of up to group_fanout_limit members (and for members with open streams),
+    and otherwise when the member next syncs the inbox. Locks are taken in the order groups lock, shard lock, group lock.
+
+    If a write-ahead log is given, the state is recovered from it, and every mutation is appended to it while holding
+    the shard lock (so the log order matches the commit order) and made durable before the mutation returns.
+
+    Messages expired under the retention policy are deleted by a background thread, and logged like any other delete.
+    """
+
+    def __init__(self, num_shards: int, wal: WriteAheadLog | None = None, group_fanout_limit: int = GROUP_FANOUT_LIMIT,
+                 retention: RetentionPolicy = RetentionPolicy()):
+        self.shards = [Shard() for _ in range(num_shards)]
+        self.groups: dict[str, Group] = {}
+        self.groups_lock = threading.Lock()
+        self.group_fanout_limit = group_fanout_limit
+        self.retention = Retention(retention)
+        self.wal = None
+
+        if wal is not None:
+            self.recover(wal)
+            self.wal = wal
+            self.wal.open()
+            threading.Thread(target=self.snapshot_loop, name="wal-snapshots", daemon=True).start()
+
+        if self.retention.enabled:
+            self.retention.start(self.expire)
+
+    @property
+    def blocking(self) -> bool:
+        """Whether mutations block on disk I/O."""
+        return self.wal is not None
+
+    def shard(self, username: str) -> Shard:
+        return self.shards[hash(username) % len(self.shards)]
+
+    def create_user(self, username: str, password: str) -> bool:
+        """Create an account, returning False if the username is taken."""
+        shard = self.shard(username)
+        with shard.lock:
+            if username in shard.users:
+                return False
+
+            shard.users[username] = User(username=username, password=password)
+            bisect.insort(shard.usernames, username)
+            lsn = self.log(RecordType.CREATE_USER, pack_str(username) + pack_str(password))
+
+        self.commit(lsn)
+        return True
+
+    def get_password(self, username: str) -> str | None:
+        """Return the stored password of a user, or None if the user does not exist."""
+        shard = self.shard(username)
+        with shard.lock:
+            user = shard.users.get(username)
+            return user.password if user is not None else None
+
+    def list_users(self, pattern: str, limit: int = 0, after: str | None = None) -> tuple[list[str], str | None]:
+        """
+        Collect one page of the sorted usernames matching a wildcard pattern.
+
+        The page starts right after the given username and holds at most limit usernames (0 for no limit).
+        Returns the usernames and the username to continue from, or None if this is the last page.
+        """
+        compiled = compile_pattern(pattern)
+        pages = []
+        for shard in self.shards:
+            with shard.lock:
+                pages.append(self.scan_usernames(shard, compiled, limit, after))
+
+        # One more than the limit tells whether there is a next page
+        matches = list(heapq.merge(*pages))
+        if limit and len(matches) > limit:
+            del matches[limit:]
+            return matches, matches[-1]
+        return matches, None
+
+    @staticmethod
+    def scan_usernames(shard: Shard, pattern: UsernamePattern, limit: int, after: str | None) -> list[str]:
+        """Collect up to limit + 1 matches in a shard, scanning only the usernames that start with the literal prefix."""
+        usernames = shard.usernames
+        start = bisect.bisect_left(usernames, pattern.prefix)
+        if after is not None:
+            start = max(start, bisect.bisect_right(usernames, after))
+
+        matches = []
+        for i in range(start, len(usernames)):
+            username = usernames[i]
+            if not username.startswith(pattern.prefix):
+                break
+            if pattern.match(username):
+                matches.append(username)
+                if limit and len(matches) > limit:
+                    break
+        return matches
+
+    def get_messages(self, username: str, since_seq: int, limit: int, after: tuple[float, uuid.UUID] | None,
+                     newest_first: bool) -> InboxSync:
+        """
+        Sync a user's inbox.
+
+        Returns the changes after since_seq if a delta can be computed from it,
+        and otherwise one page of the inbox in timestamp order.
+        """
+        shard = self.shard(username)
+        with shard.lock:
+            assert username in shard.users
+            user = shard.users[username]
+            lsn = self.deliver_all(shard, username)
+
+            delta = user.changes_since(since_seq)
+            if delta is None:
+                message_ids, next_key = user.page(limit, after, newest_first)
+                messages = [self.lookup(shard, username, message_id) for message_id in message_ids]
+                sync = InboxSync(messages, [], user.seq, True, next_key)
+            else:
+                changed_ids, deleted_ids = delta
+                messages = [self.lookup(shard, username, message_id) for message_id in changed_ids]
+                sync = InboxSync(messages, deleted_ids, user.seq, False, None)
+
+        self.commit(lsn)
+        return sync
+
+    def inbox_summary(self, username: str) -> InboxSummary | None:
+        """Count the messages and unread messages in a user's inbox, or return None if the user does not exist."""
+        shard = self.shard(username)
+        with shard.lock:
+            user = shard.users.get(username)
+            if user is None:
+                return None
+
+            lsn = self.deliver_all(shard, username)
+            summary = InboxSummary(len(user.message_ids), user.unread, user.unread_senders.copy(), user.seq)
+
+        self.commit(lsn)
+        return summary
+
+    def inbox_size(self, username: str) -> int | None:
+        """Count the messages in a user's inbox, or return None if the user does not exist."""
+        shard = self.shard(username)
+        with shard.lock:
+            user = shard.users.get(username)
+            return len(user.message_ids) if user is not None else None
+
+    def send_message(self, message: Message) -> bool:
+        """
+        Store a message and add it to the recipient's inbox.
+
+        Returns False if the recipient does not exist.
+        """
+        shard = self.shard(message.recipient)
+        with shard.lock:
+            if message.recipient not in shard.users:
+                return False
+            lsn = self.add_message(shard, message)
+
+        self.commit(lsn)
+        return True
+
+    def send_messages(self, messages: list[Message]) -> list[SendResult]:
+        """
+        Store a batch of messages and add them to their recipients' inboxes, in order.
+
+        The messages are grouped by the shard of their recipient, so each shard's lock is taken once per batch,
+        and the whole batch waits for a single log flush.
+        A message whose recipient does not exist, or whose ID is already stored in the recipient's shard, is skipped
+        before anything is stored for it. Returns the result of each message.
+        """
+        by_shard: dict[Shard, list[int]] = defaultdict(list)
+        for i, message in enumerate(messages):
+            by_shard[self.shard(message.recipient)].append(i)
+
+        results, lsn = [SendResult.NO_RECIPIENT] * len(messages), 0
+        for shard, positions in by_shard.items():
+            with shard.lock:
+                for i in positions:
+                    if messages[i].recipient not in shard.users:
+                        continue
+                    if uuid.UUID(bytes=messages[i].id) in shard.messages:
+                        results[i] = SendResult.DUPLICATE_ID
+                        continue
+                    lsn = max(lsn, self.add_message(shard, messages[i]))
+                    results[i] = SendResult.SENT
+
+        self.commit(lsn)
+        return results
+
+    def add_message(self, shard: Shard, message: Message) -> int:
+        """Store a message for an existing recipient and log it. Must be called while holding the shard lock."""
+        # Store the message (asserting that it does not already exist)
+        message_id = uuid.UUID(bytes=message.id)
+        shard.messages.add(message_id, message)
+
+        # Add the message to the recipient's inbox
+        recipient = shard.users[message.recipient]
+        seq = recipient.add_message(message_id, message.timestamp)
+        if not message.read:
+            recipient.add_unread(message_id, message.sender)
+        self.retention.added(message.recipient, message.id, message.timestamp, message.read)
+
+        # Push the new message to the recipient's open streams
+        if message.recipient in shard.subscribers:
+            self.publish(shard, message.recipient, MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                                                message=message,
+                                                                seq=seq))
+        return self.log(RecordType.SEND_MESSAGE, message.SerializeToString()) if self.wal is not None else 0
+
+    def create_group(self, name: str, members: list[str]) -> list[str] | None:
+        """
+        Create a group, returning None if the name is taken.
+
+        Returns the members without an account in this storage, which do not get the group's messages.
+        """
+        members = list(dict.fromkeys(members))
+        with self.groups_lock:
+            if name in self.groups:
+                return None
+
+            group = self.build_group(name, members)
+            unknown = [username for username in members if username not in group.local]
+            lsn = self.log(RecordType.CREATE_GROUP, pack_str(name) + pack_strs(members) + pack_strs(unknown))
+
+            # Messages can only be sent to the group once its creation is logged
+            self.groups[name] = group
+
+        self.commit(lsn)
+        return unknown
+
+    def build_group(self, name: str, members: list[str], unknown: list[str] = ()) -> Group:
+        """
+        Build a group, and join it the members that have an account (except the ones listed as unknown, so that
+        replaying the log joins exactly the members that were joined). Must be called while holding the groups lock.
+        """
+        group = Group(name, members)
+        unknown = set(unknown)
+        for username in members:
+            shard = self.shard(username)
+            with shard.lock:
+                if username in unknown or username not in shard.users:
+                    continue
+
+                membership = shard.memberships[username][name] = Membership(group)
+                with group.lock:
+                    group.local[username] = membership
+                    if username in shard.subscribers:
+                        group.online.add(username)
+
+        return group
+
+    def send_group_message(self, message: Message) -> bool:
+        """
+        Store a message to a group once, and deliver it to its members' inboxes.
+
+        It is delivered right away to every member of a group of up to group_fanout_limit members, and only to the
+        members with open streams for larger groups (the others get it when they next sync their inbox).
+        Returns False if the group does not exist or the sender is not a member.
+        """
+        group = self.groups.get(message.group)
+        if group is None:
+            return False
+
+        with group.lock:
+            if message.sender not in group.members:
+                return False
+
+            self.store_group_message(group, message)
+            lsn = self.log(RecordType.SEND_GROUP_MESSAGE, message.SerializeToString())
+            recipients = list(group.local if len(group.members) <= self.group_fanout_limit else group.online)
+
+        for username in recipients:
+            shard = self.shard(username)
+            with shard.lock:
+                membership = shard.memberships.get(username, {}).get(group.name)
+                if membership is not None:
+                    lsn = max(lsn, self.deliver(shard, username, membership))
+
+        self.commit(lsn)
+        return True
+
+    @staticmethod
+    def store_group_message(group: Group, message: Message):
+        """
+        Store a message in its group, after the group's earlier messages, held by every local member. A group without
+        local members only takes up the position. Must be called holding the group lock.
+        """
+        if not group.local:
+            group.message_ids.append(None)
+            return
+
+        message_id = uuid.UUID(bytes=message.id)
+        group.messages.add(message_id, message)
+        group.positions[message_id] = group.end
+        group.holders[message_id] = len(group.local)
+        group.message_ids.append(message_id)
+
+    def deliver(self, shard: Shard, username: str, membership: Membership, cursor: int | None = None) -> int:
+        """
+        Add the group messages after the member's cursor (up to the given cursor, or all of them) to the member's inbox,
+        and log the new cursor. Must be called while holding the member's shard lock.
+        """
+        group = membership.group
+        with group.lock:
+            end = group.end if cursor is None else cursor
+            if end <= membership.cursor:
+                return 0
+
+            user = shard.users[username]
+            for message_id in group.ids(membership.cursor, end):
+                handle = group.messages.get(message_id)
+                seq = user.add_message(message_id, group.messages.timestamp(handle))
+                user.add_unread(message_id, group.messages.sender(handle))
+                self.retention.added(username, message_id.bytes, group.messages.timestamp(handle))
+                if username in shard.subscribers:
+                    self.publish(shard, username, MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                                               message=self.group_message(username, membership, handle),
+                                                               seq=seq))
+
+            membership.cursor = end
+            return self.log(RecordType.DELIVER_GROUP_MESSAGES, pack_str(username) + pack_str(group.name) + SEQ.pack(end))
+
+    def deliver_all(self, shard: Shard, username: str) -> int:
+        """Deliver the pending messages of every group of a user. Must be called while holding the shard lock."""
+        lsn = 0
+        for membership in shard.memberships.get(username, {}).values():
+            lsn = max(lsn, self.deliver(shard, username, membership))
+        return lsn
+
+    @staticmethod
+    def group_message(username: str, membership: Membership, handle: int) -> Message:
+        """Build a group message as it appears in a member's inbox. Must be called while holding the group lock."""
+        message = membership.group.messages.message(handle)
+        message.recipient = username
+        message.group = membership.group.name
+        message.read = membership.group.messages.ids[handle] in membership.read
+        return message
+
+    def lookup(self, shard: Shard, username: str, message_id: uuid.UUID) -> Message:
+        """Build a message in a user's inbox, stored in the shard or in a group. Must be called holding the shard lock."""
+        handle = shard.messages.get(message_id)
+        if handle is not None:
+            return shard.messages.message(handle)
+
+        membership = self.membership_of(shard, username, message_id)
+        with membership.group.lock:
+            return self.group_message(username, membership, membership.group.messages.get(message_id))
+
+    @staticmethod
+    def group_sender(membership: Membership, message_id: uuid.UUID) -> str:
+        with membership.group.lock:
+            return membership.group.messages.sender(membership.group.messages.get(message_id))
+
+    @staticmethod
+    def membership_of(shard: Shard, username: str, message_id: uuid.UUID) -> Membership | None:
+        """Find the user's membership in the group a message was sent to. Must be called holding the shard lock."""
+        for membership in shard.memberships.get(username, {}).values():
+            if message_id in membership.group.messages:
+                return membership
+        return None
+
+    def check_inbox(self, shard: Shard, username: str, message_ids: list[bytes], unread: bool):
+        """
+        Assert that every message is in the user's inbox, is listed once, and is unread if unread is set.
+        Must be called holding the shard lock.
+
+        Requests check all their IDs before changing anything, so that one with an unknown ID fails without side
+        effects, like a rolled back transaction of the SQLite backend, and never leaves a state its log record would
+        not replay to.
+        """
+        user = shard.users[username]
+        seen = set()
+        for message_id in message_ids:
+            message_id = uuid.UUID(bytes=message_id)
+            assert message_id not in seen
+            seen.add(message_id)
+
+            handle = shard.messages.get(message_id)
+            if handle is not None:
+                # Assert that the recipient matches the request username
+                assert shard.messages.recipient(handle) == username
+                assert not (unread and shard.messages.is_read(handle))
+            else:
+                membership = self.membership_of(shard, username, message_id)
+                assert membership is not None and message_id in user.message_ids
+                assert not (unread and message_id in membership.read)
+
+    def read_messages(self, username: str, message_ids: list[bytes]):
+        """Set the read flag of messages in a user's inbox."""
+        shard = self.shard(username)
+        with shard.lock:
+            lsn = self.mark_read(shard, username, message_ids)
+
+        self.commit(lsn)
+
+    def read_next(self, username: str, count: int) -> list[Message] | None:
+        """
+        Set the read flag of the oldest unread messages in a user's inbox, up to count of them.
+
+        Returns the messages in the order they arrived, or None if the user does not exist.
+        """
+        shard = self.shard(username)
+        with shard.lock:
+            user = shard.users.get(username)
+            if user is None:
+                return None
+
+            lsn = self.deliver_all(shard, username)
+            message_ids = user.oldest_unread(count)
+            if message_ids:
+                lsn = max(lsn, self.mark_read(shard, username, [message_id.bytes for message_id in message_ids]))
+            messages = [self.lookup(shard, username, message_id) for message_id in message_ids]
+
+        self.commit(lsn)
+        return messages
+
+    def mark_read(self, shard: Shard, username: str, message_ids: list[bytes]) -> int:
+        """Set the read flag of messages in a user's inbox and log it. Must be called while holding the shard lock."""
+        self.check_inbox(shard, username, message_ids, unread=True)
+        user = shard.users[username]
+
+        for message_id in message_ids:
+            # Convert to UUID
+            message_id = uuid.UUID(bytes=message_id)
+            handle = shard.messages.get(message_id)
+
+            if handle is not None:
+                # Mark the message as read
+                shard.messages.set_read(handle)
+                user.remove_unread(message_id, shard.messages.sender(handle))
+            else:
+                # A group message is only marked as read for this member
+                membership = self.membership_of(shard, username, message_id)
+                membership.read.add(message_id)
+                user.remove_unread(message_id, self.group_sender(membership, message_id))
+
+            seq = user.touch_message(message_id)
+            self.retention.read(username, message_id.bytes)
+
+            if username in shard.subscribers:
+                self.publish(shard, username, MessageEvent(event_type=MessageEvent.EventType.READ,
+                                                           message=self.lookup(shard, username, message_id),
+                                                           seq=seq))
+
+        return self.log(RecordType.READ_MESSAGES, pack_ids(username, message_ids))
+
+    def delete_messages(self, username: str, message_ids: list[bytes]):
+        """Delete messages from a user's inbox."""
+        shard = self.shard(username)
+        with shard.lock:
+            lsn = self.remove_messages(shard, username, message_ids)
+
+        self.commit(lsn)
+
+    def remove_messages(self, shard: Shard, username: str, message_ids: list[bytes]) -> int:
+        """Delete messages from a user's inbox and log it. Must be called while holding the shard lock."""
+        self.check_inbox(shard, username, message_ids, unread=False)
+
+        # Get the recipient
+        recipient = shard.users[username]
+
+        # Delete the messages one by one
+        for message_id in message_ids:
+            # Convert to UUID
+            message_id = uuid.UUID(bytes=message_id)
+            handle = shard.messages.get(message_id)
+
+            if handle is not None:
+                # Delete the message
+                if not shard.messages.is_read(handle):
+                    recipient.remove_unread(message_id, shard.messages.sender(handle))
+                shard.messages.remove(message_id)
+            else:
+                # A group message is only deleted for this member, and stays in the group until no member holds it
+                membership = self.membership_of(shard, username, message_id)
+                if message_id not in membership.read:
+                    recipient.remove_unread(message_id, self.group_sender(membership, message_id))
+                with membership.group.lock:
+                    membership.read.discard(message_id)
+                    membership.deleted.add(message_id)
+                    membership.group.release(message_id)
+
+            # Delete the message from the recipient
+            seq = recipient.delete_message(message_id)
+
+            # Only the ID is needed to drop the message on the subscriber's side
+            self.publish(shard, username, MessageEvent(event_type=MessageEvent.EventType.DELETED,
+                                                       message=Message(id=message_id.bytes),
+                                                       seq=seq))
+
+        return self.log(RecordType.DELETE_MESSAGES, pack_ids(username, message_ids))
+
+    def expire(self, now: float):
+        """
+        Delete the inbox messages that are due by now under the retention policy, and the oldest messages of inboxes
+        over its size limit, like delete_messages() does.
+
+        Group messages older than max_age are first delivered to the members that never synced them, so that they
+        expire from every inbox, and the group reclaims them once the last copy is deleted.
+        """
+        if self.retention.policy.max_age:
+            self.deliver_expired(now - self.retention.policy.max_age)
+
+        max_messages = self.retention.policy.max_messages
+        for username, due_ids in self.retention.due(now).items():
+            shard = self.shard(username)
+            with shard.lock:
+                user = shard.users.get(username)
+                if user is None:
+                    continue
+
+                # Skip the messages deleted since they were scheduled
+                message_ids = [message_id for message_id in dict.fromkeys(uuid.UUID(bytes=b) for b in due_ids)
+                               if message_id in user.message_ids]
+                excess = len(user.message_ids) - len(message_ids) - max_messages if max_messages else 0
+                if excess > 0:
+                    expiring = set(message_ids)
+                    oldest, _ = user.page(excess + len(message_ids), None, False)
+                    message_ids += [message_id for message_id in oldest if message_id not in expiring][:excess]
+                if not message_ids:
+                    continue
+
+                reclaimed = sum(shard.messages.size(handle) for handle in map(shard.messages.get, message_ids)
+                                if handle is not None)
+                lsn = self.remove_messages(shard, username, [message_id.bytes for message_id in message_ids])
+
+            self.commit(lsn)
+            self.retention.count(len(message_ids), reclaimed)
+
+    def deliver_expired(self, horizon: float):
+        """Deliver the pending group messages of every member whose oldest pending message is older than horizon."""
+        for group in list(self.groups.values()):
+            with group.lock:
+                lagging = []
+                for username, membership in group.local.items():
+                    pending = group.ids(membership.cursor, membership.cursor + 1)
+                    if pending and group.messages.timestamp(group.messages.get(pending[0])) <= horizon:
+                        lagging.append(username)
+
+            for username in lagging:
+                shard = self.shard(username)
+                with shard.lock:
+                    membership = shard.memberships.get(username, {}).get(group.name)
+                    lsn = self.deliver(shard, username, membership) if membership is not None else 0
+                self.commit(lsn)
+
+    def delete_user(self, username: str):
+        """Delete a user along with every message in their inbox."""
+        shard = self.shard(username)
+        with shard.lock:
+            # Get the user
+            assert username in shard.users
+            user = shard.users[username]
+
+            # Delete all messages sent to that user (group messages stay in their groups)
+            for message_id in user.message_ids:
+                if message_id in shard.messages:
+                    shard.messages.remove(message_id)
+
+            # Leave every group, giving up the group messages the user held
+            for membership in shard.memberships.pop(username, {}).values():
+                group = membership.group
+                with group.lock:
+                    group.members.discard(username)
+                    del group.local[username]
+                    group.online.discard(username)
+                    for message_id in group.ids(group.base, group.end):
+                        if message_id not in membership.deleted:
+                            group.release(message_id)
+
+            # Delete the user
+            del shard.users[username]
+            del shard.usernames[bisect.bisect_left(shard.usernames, username)]
+
+            # End any streams the deleted user still has open
+            self.publish(shard, username, None)
+            lsn = self.log(RecordType.DELETE_USER, pack_str(username))
+
+        self.commit(lsn)
+
+    def subscribe(self, username: str, events, limit: int) -> bool:
+        """
+        Register a stream for a user's inbox events.
+
+        The newest messages (up to limit, 0 for all) are replayed onto the stream as NEW events, followed by SYNCED.
+        Registration and replay happen atomically, so no update can fall in between.
+        Returns False if the user does not exist.
+
+        :param events: Queue-like object whose put() method receives MessageEvent objects, or None when the stream ends.
+        """
+        shard = self.shard(username)
+        with shard.lock:
+            if username not in shard.users:
+                return False
+
+            # Catch up on the group messages before the replay, and get the next ones as they are sent
+            lsn = self.deliver_all(shard, username)
+            for membership in shard.memberships.get(username, {}).values():
+                with membership.group.lock:
+                    membership.group.online.add(username)
+
+            shard.subscribers[username].append(events)
+
+            # Replay the newest messages, oldest first
+            user = shard.users[username]
+            message_ids, _ = user.page(limit, newest_first=True)
+            for message_id in reversed(message_ids):
+                events.put(MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                        message=self.lookup(shard, username, message_id)))
+            events.put(MessageEvent(event_type=MessageEvent.EventType.SYNCED,
+                                    seq=user.seq))
+
+        self.commit(lsn)
+        return True
+
+    def unsubscribe(self, username: str, events):
+        shard = self.shard(username)
+        with shard.lock:
+            shard.subscribers[username].remove(events)
+            if not shard.subscribers[username]:
+                del shard.subscribers[username]
+                for membership in shard.memberships.get(username, {}).values():
+                    with membership.group.lock:
+                        membership.group.online.discard(username)
+
+    def log(self, record_type: RecordType, payload: bytes) -> int:
+        """Append a mutation to the write-ahead log, if any. Must be called while holding the shard lock."""
+        return self.wal.append(record_type, payload) if self.wal is not None else 0
+
+    def commit(self, lsn: int):
+        """Wait until a logged mutation is durable. Must be called after releasing the shard lock."""
+        if self.wal is not None:
+            self.wal.wait(lsn)
+
+    def recover(self, wal: WriteAheadLog):
+        """Rebuild the state from the newest snapshot and the log records after it."""
+        restored_seqs = {}
+        for record_type, payload in wal.recover():
+            match record_type:
+                case RecordType.USER:
+                    username, offset = unpack_str(payload)
+                    password, offset = unpack_str(payload, offset)
+                    (restored_seqs[username],) = SEQ.unpack_from(payload, offset)
+                    self.create_user(username, password)
+                case RecordType.MESSAGE:
+                    message = Message.FromString(payload)
+                    shard = self.shard(message.recipient)
+                    message_id = uuid.UUID(bytes=message.id)
+                    shard.messages.add(message_id, message)
+                    user = shard.users[message.recipient]
+                    user.add_message(message_id, message.timestamp)
+                    if not message.read:
+                        user.add_unread(message_id, message.sender)
+                    self.retention.added(message.recipient, message.id, message.timestamp, message.read)
+                case RecordType.GROUP:
+                    name, offset = unpack_str(payload)
+                    members, offset = unpack_strs(payload, offset)
+                    unknown, _ = unpack_strs(payload, offset)
+                    self.groups[name] = self.build_group(name, members, unknown)
+                case RecordType.GROUP_MESSAGE:
+                    message = Message.FromString(payload)
+                    self.store_group_message(self.groups[message.group], message)
+                case RecordType.GROUP_GAP:
+                    name, offset = unpack_str(payload)
+                    (count,) = SEQ.unpack_from(payload, offset)
+                    group = self.groups[name]
+                    if group.message_ids:
+                        group.message_ids += [None] * count
+                    else:
+                        group.base += count
+                case RecordType.MEMBERSHIP:
+                    self.restore_membership(payload)
+                case _:
+                    # The snapshot is complete: continue each inbox from the sequence number it was taken at
+                    self.reset_changes(restored_seqs)
+                    restored_seqs = {}
+                    self.apply(record_type, payload)
+
+        self.reset_changes(restored_seqs)
+
+    def restore_membership(self, payload: bytes):
+        """Restore a member's state in a group from its snapshot record, with the delivered messages in the inbox."""
+        username, offset = unpack_str(payload)
+        name, offset = unpack_str(payload, offset)
+        (cursor,) = SEQ.unpack_from(payload, offset)
+        (num_read,) = SEQ.unpack_from(payload, offset + SEQ.size)
+        offset += 2 * SEQ.size
+        ids = [uuid.UUID(bytes=payload[i:i + 16]) for i in range(offset, len(payload), 16)]
+
+        shard = self.shard(username)
+        membership = shard.memberships[username][name]
+        membership.cursor = cursor
+        membership.read = set(ids[:num_read])
+        membership.deleted = set(ids[num_read:])
+
+        user, group = shard.users[username], membership.group
+        for message_id in membership.deleted:
+            group.holders[message_id] -= 1
+        for message_id in group.ids(group.base, cursor):
+            if message_id not in membership.deleted:
+                handle = group.messages.get(message_id)
+                user.add_message(message_id, group.messages.timestamp(handle))
+                if message_id not in membership.read:
+                    user.add_unread(message_id, group.messages.sender(handle))
+                self.retention.added(username, message_id.bytes, group.messages.timestamp(handle),
+                                     message_id in membership.read)
+
+    def reset_changes(self, seqs: dict[str, int]):
+        for username, seq in seqs.items():
+            self.shard(username).users[username].reset_changes(seq)
+
+    def apply(self, record_type: RecordType, payload: bytes):
+        """Redo one log record."""
+        match record_type:
+            case RecordType.CREATE_USER:
+                username, offset = unpack_str(payload)
+                password, _ = unpack_str(payload, offset)
+                self.create_user(username, password)
+            case RecordType.SEND_MESSAGE:
+                self.send_message(Message.FromString(payload))
+            case RecordType.READ_MESSAGES:
+                self.read_messages(*unpack_ids(payload))
+            case RecordType.DELETE_MESSAGES:
+                self.delete_messages(*unpack_ids(payload))
+            case RecordType.DELETE_USER:
+                username, _ = unpack_str(payload)
+                self.delete_user(username)
+            case RecordType.CREATE_GROUP:
+                name, offset = unpack_str(payload)
+                members, offset = unpack_strs(payload, offset)
+                unknown, _ = unpack_strs(payload, offset)
+                with self.groups_lock:
+                    self.groups[name] = self.build_group(name, members, unknown)
+            case RecordType.SEND_GROUP_MESSAGE:
+                # The deliveries were logged as records of their own
+                message = Message.FromString(payload)
+                self.store_group_message(self.groups[message.group], message)
+            case RecordType.DELIVER_GROUP_MESSAGES:
+                username, offset = unpack_str(payload)
+                name, offset = unpack_str(payload, offset)
+                (cursor,) = SEQ.unpack_from(payload, offset)
+                shard = self.shard(username)
+                self.deliver(shard, username, shard.memberships[username][name], cursor)
+
+    def snapshot(self):
+        """
+        Write a snapshot of the state to the write-ahead log directory.
+
+        All shards and groups are locked just long enough to start a new log segment, collect the users and group
+        memberships, and copy the message stores (which are flat buffers), so the collected state is exactly the state
+        as of the start of that segment. The snapshot itself is serialized after the locks are released.
+        """
+        self.groups_lock.acquire()
+        for shard in self.shards:
+            shard.lock.acquire()
+        groups = list(self.groups.values())
+        for group in groups:
+            group.lock.acquire()
+        try:
+            segment = self.wal.rotate()
+            users = [(user.username, user.password, user.seq)
+                     for shard in self.shards for user in shard.users.values()]
+            stores = [shard.messages.copy() for shard in self.shards]
+            group_states = [(group.name, list(group.members), [m for m in group.members if m not in group.local],
+                             group.messages.copy(), group.base, list(group.message_ids)) for group in groups]
+            memberships = [(username, name, membership.cursor, list(membership.read), list(membership.deleted))
+                           for shard in self.shards
+                           for username, user_memberships in shard.memberships.items()
+                           for name, membership in user_memberships.items()]
+        finally:
+            for group in reversed(groups):
+                group.lock.release()
+            for shard in reversed(self.shards):
+                shard.lock.release()
+            self.groups_lock.release()
+
+        def records():
+            for username, password, seq in users:
+                yield RecordType.USER, pack_str(username) + pack_str(password) + SEQ.pack(seq)
+            for store in stores:
+                for message in store.messages():
+                    yield RecordType.MESSAGE, message.SerializeToString()
+            for name, members, unknown, store, base, message_ids in group_states:
+                yield RecordType.GROUP, pack_str(name) + pack_strs(members) + pack_strs(unknown)
+
+                # Runs of reclaimed messages are written as gaps, so that the positions of the others stay the same
+                gap = base
+                for message_id in message_ids:
+                    if message_id is None:
+                        gap += 1
+                        continue
+                    if gap:
+                        yield RecordType.GROUP_GAP, pack_str(name) + SEQ.pack(gap)
+                        gap = 0
+                    message = store.lookup(message_id)
+                    message.group = name
+                    yield RecordType.GROUP_MESSAGE, message.SerializeToString()
+                if gap:
+                    yield RecordType.GROUP_GAP, pack_str(name) + SEQ.pack(gap)
+            for username, name, cursor, read, deleted in memberships:
+                yield RecordType.MEMBERSHIP, (pack_str(username) + pack_str(name) + SEQ.pack(cursor)
+                                              + SEQ.pack(len(read)) + b"".join(m.bytes for m in read + deleted))
+
+        self.wal.write_snapshot(segment, records())
+
+    def snapshot_loop(self):
+        while True:
+            self.wal.snapshot_needed.wait()
+            self.snapshot()
+
+    def close(self):
+        self.retention.stop()
+        if self.wal is not None:
+            self.wal.close()
+
+    @staticmethod
+    def publish(shard: Shard, username: str, event: MessageEvent | None):
+        """
+        Push an event onto every open stream of a user.
+
+        Must be called while holding the shard lock so that events are delivered in commit order.
+        A None event ends the streams.
+        """
+        for events in shard.subscribers.get(username, []):
+            events.put(event)
+
+    def stats(self) -> StorageStats:
+        """Count the users, messages, and open streams of every shard, and the groups and their messages."""
+        users = messages = message_bytes = subscribers = 0
+        for shard in self.shards:
+            with shard.lock:
+                users += len(shard.users)
+                messages += len(shard.messages)
+                message_bytes += len(shard.messages.arena) - shard.messages.garbage
+                subscribers += sum(map(len, shard.subscribers.values()))
+
+        groups = list(self.groups.values())
+        for group in groups:
+            with group.lock:
+                messages += len(group.messages)
+                message_bytes += len(group.messages.arena) - group.messages.garbage
+        return StorageStats(users, len(groups), messages, message_bytes, subscribers)
+
+    @property
+    def message_bytes(self) -> int:
+        """UTF-8 size of the message bodies in every shard and group, read without taking their locks."""
+        stores = [shard.messages for shard in self.shards] + [group.messages for group in list(self.groups.values())]
+        return sum(len(store.arena) - store.garbage for store in stores)
+
+    @property
+    def users(self) -> dict[str, User]:
+        """Snapshot of all users across the shards."""
+        users = {}
+        for shard in self.shards:
+            with shard.lock:
+                users.update(shard.users)
+        return users
+
+    @property
+    def messages(self) -> dict[uuid.UUID, Message]:
+        """Snapshot of all messages across the shards and groups (group messages have no recipient)."""
+        messages = {}
+        for shard in self.shards:
+            with shard.lock:
+                messages.update((uuid.UUID(bytes=message.id), message) for message in shard.messages.messages())
+        for group in list(self.groups.values()):
+            with group.lock:
+                for message in group.messages.messages():
+                    message.group = group.name
+                    messages[uuid.UUID(bytes=message.id)] = message
+        return messages
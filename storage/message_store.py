@@ -0,0 +1,184 @@
+import uuid
+
+from array import array
+from collections.abc import Iterator
+
+from protos.chat_pb2 import Message
+
+# The body arena is compacted once it holds more garbage than this and more garbage than live bytes
+MIN_COMPACT_BYTES = 1 << 20
+
+
+class Interner:
+    """Maps strings to small integer IDs and back, so that repeated names are stored once."""
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def copy(self) -> "Interner":
+        interner = Interner()
+        interner.names = self.names.copy()
+        interner.ids = self.ids.copy()
+        return interner
+
+
+class MessageStore:
+    """
+    Column-oriented store of messages, addressed by integer handles.
+
+    Instead of one protobuf Message object per message, every field lives in a flat column indexed by the handle:
+    sender and recipient as interned name IDs, timestamps in an array of doubles, read flags in a bitmap, and the
+    UTF-8 bodies back to back in a shared byte arena. Message objects are only built when a response needs them.
+    Handles of deleted messages are reused, and the arena is compacted once most of it is garbage.
+
+    Not thread-safe: every store belongs to one shard and is guarded by the shard lock.
+    """
+
+    def __init__(self):
+        # Message ID -> handle, and handle -> message ID (None for a free handle)
+        self.handles: dict[uuid.UUID, int] = {}
+        self.ids: list[uuid.UUID | None] = []
+        self.free: list[int] = []
+
+        self.names = Interner()
+        self.senders = array("I")
+        self.recipients = array("I")
+        self.timestamps = array("d")
+        self.read_flags = bytearray()
+
+        self.arena = bytearray()
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.garbage = 0
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def __contains__(self, message_id: uuid.UUID) -> bool:
+        return message_id in self.handles
+
+    def add(self, message_id: uuid.UUID, message: Message) -> int:
+        """Store a message under its (not yet stored) ID and return its handle."""
+        assert message_id not in self.handles
+
+        body = message.body.encode()
+        sender = self.names.intern(message.sender)
+        recipient = self.names.intern(message.recipient)
+
+        if self.free:
+            handle = self.free.pop()
+            self.ids[handle] = message_id
+            self.senders[handle] = sender
+            self.recipients[handle] = recipient
+            self.timestamps[handle] = message.timestamp
+            self.offsets[handle] = len(self.arena)
+            self.lengths[handle] = len(body)
+        else:
+            handle = len(self.ids)
+            self.ids.append(message_id)
+            self.senders.append(sender)
+            self.recipients.append(recipient)
+            self.timestamps.append(message.timestamp)
+            self.offsets.append(len(self.arena))
+            self.lengths.append(len(body))
+            if handle % 8 == 0:
+                self.read_flags.append(0)
+
+        self.set_read(handle, message.read)
+        self.arena += body
+        self.handles[message_id] = handle
+        return handle
+
+    def remove(self, message_id: uuid.UUID):
+        handle = self.handles.pop(message_id)
+        self.ids[handle] = None
+        self.free.append(handle)
+
+        self.garbage += self.lengths[handle]
+        if self.garbage > MIN_COMPACT_BYTES and 2 * self.garbage > len(self.arena):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the arena with only the bodies of stored messages."""
+        arena = bytearray()
+        for handle in self.handles.values():
+            offset, length = self.offsets[handle], self.lengths[handle]
+            self.offsets[handle] = len(arena)
+            arena += self.arena[offset:offset + length]
+
+        self.arena = arena
+        self.garbage = 0
+
+    def get(self, message_id: uuid.UUID) -> int | None:
+        return self.handles.get(message_id)
+
+    def sender(self, handle: int) -> str:
+        return self.names.names[self.senders[handle]]
+
+    def recipient(self, handle: int) -> str:
+        return self.names.names[self.recipients[handle]]
+
+    def timestamp(self, handle: int) -> float:
+        return self.timestamps[handle]
+
+    def size(self, handle: int) -> int:
+        """UTF-8 size of the body."""
+        return self.lengths[handle]
+
+    def is_read(self, handle: int) -> bool:
+        return bool(self.read_flags[handle >> 3] & (1 << (handle & 7)))
+
+    def set_read(self, handle: int, read: bool = True):
+        if read:
+            self.read_flags[handle >> 3] |= 1 << (handle & 7)
+        else:
+            self.read_flags[handle >> 3] &= ~(1 << (handle & 7)) & 0xFF
+
+    def message(self, handle: int) -> Message:
+        """Build the Message object of a stored message."""
+        offset = self.offsets[handle]
+        return Message(id=self.ids[handle].bytes,
+                       sender=self.names.names[self.senders[handle]],
+                       recipient=self.names.names[self.recipients[handle]],
+                       body=self.arena[offset:offset + self.lengths[handle]].decode(),
+                       timestamp=self.timestamps[handle],
+                       read=self.is_read(handle))
+
+    def lookup(self, message_id: uuid.UUID) -> Message:
+        return self.message(self.handles[message_id])
+
+    def messages(self) -> Iterator[Message]:
+        """Build the Message objects of every stored message, in handle order."""
+        for handle, message_id in enumerate(self.ids):
+            if message_id is not None:
+                yield self.message(handle)
+
+    def copy(self) -> "MessageStore":
+        """
+        Copy the store.
+
+        The columns are flat buffers, so this is mostly a handful of memcpys: a consistent copy can be taken while
+        holding a lock and read after releasing it.
+        """
+        store = MessageStore.__new__(MessageStore)
+        store.handles = self.handles.copy()
+        store.ids = self.ids.copy()
+        store.free = self.free.copy()
+        store.names = self.names.copy()
+        store.senders = self.senders[:]
+        store.recipients = self.recipients[:]
+        store.timestamps = self.timestamps[:]
+        store.read_flags = self.read_flags.copy()
+        store.arena = self.arena.copy()
+        store.offsets = self.offsets[:]
+        store.lengths = self.lengths[:]
+        store.garbage = self.garbage
+        return store
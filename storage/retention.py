@@ -0,0 +1,86 @@
+import heapq
+import threading
+import time
+
+from collections.abc import Callable
+
+from .base import RetentionPolicy
+
+
+class Retention:
+    """
+    Schedule of the inbox messages to expire under a retention policy.
+
+    Messages are pushed onto a min-heap by the time they expire: their timestamp plus max_age, and the time they were
+    read plus read_ttl. Each expiry pass pops the entries that are due, so it costs O(log n) per expired message and
+    nothing for the others. Entries of messages deleted in the meantime are not removed from the heap; the storage
+    skips them when they come due. Inboxes that received messages since the last pass are checked against max_messages.
+
+    The storage calls added() and read() as its inboxes change (while holding its lock for the inbox), and expires the
+    due messages of each inbox through its regular delete path, so indexes, counts, streams, and logs all see an
+    ordinary delete.
+    """
+
+    def __init__(self, policy: RetentionPolicy):
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.heap: list[tuple[float, str, bytes]] = []  # (expiry time, username, message ID)
+        self.grown: set[str] = set()  # inboxes that may be over max_messages
+
+        # Totals since the server started, exported as metrics
+        self.expired = 0
+        self.reclaimed_bytes = 0
+
+        self.stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.policy.max_age or self.policy.max_messages or self.policy.read_ttl)
+
+    def added(self, username: str, message_id: bytes, timestamp: float, read: bool = False):
+        """Schedule a message added to an inbox."""
+        if not self.enabled:
+            return
+
+        with self.lock:
+            if self.policy.max_age:
+                heapq.heappush(self.heap, (timestamp + self.policy.max_age, username, message_id))
+            if read and self.policy.read_ttl:
+                heapq.heappush(self.heap, (time.time() + self.policy.read_ttl, username, message_id))
+            if self.policy.max_messages:
+                self.grown.add(username)
+
+    def read(self, username: str, message_id: bytes):
+        """Schedule a message that was just read."""
+        if self.policy.read_ttl:
+            with self.lock:
+                heapq.heappush(self.heap, (time.time() + self.policy.read_ttl, username, message_id))
+
+    def due(self, now: float) -> dict[str, list[bytes]]:
+        """Pop the messages due by now, by inbox. Inboxes to check against max_messages are included, maybe empty."""
+        due: dict[str, list[bytes]] = {}
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, username, message_id = heapq.heappop(self.heap)
+                due.setdefault(username, []).append(message_id)
+            for username in self.grown:
+                due.setdefault(username, [])
+            self.grown = set()
+        return due
+
+    def count(self, expired: int, reclaimed_bytes: int):
+        with self.lock:
+            self.expired += expired
+            self.reclaimed_bytes += reclaimed_bytes
+
+    def start(self, expire: Callable[[float], None]):
+        """Run expire every policy.interval seconds from a background thread, until stop() is called."""
+
+        def loop():
+            while not self.stopped.wait(self.policy.interval):
+                expire(time.time())
+
+        threading.Thread(target=loop, name="retention", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
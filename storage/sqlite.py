@@ -0,0 +1,818 @@
+import os
+import sqlite3
+import threading
+import uuid
+
+from contextlib import contextmanager
+
+from protos.chat_pb2 import Message, MessageEvent
+from entity import User
+from entity.user import MAX_TOMBSTONES
+from .base import (GROUP_FANOUT_LIMIT, InboxSummary, InboxSync, RetentionPolicy, SendResult, Storage, StorageStats,
+                   compile_pattern)
+from .retention import Retention
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0,
+    floor_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id BLOB PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    body TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    read INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_time ON messages (recipient, timestamp, id);
+CREATE INDEX IF NOT EXISTS messages_by_seq ON messages (recipient, seq);
+CREATE INDEX IF NOT EXISTS unread_messages ON messages (recipient, seq) WHERE read = 0;
+CREATE TABLE IF NOT EXISTS tombstones (
+    recipient TEXT NOT NULL,
+    id BLOB NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (recipient, id)
+);
+CREATE INDEX IF NOT EXISTS tombstones_by_seq ON tombstones (recipient, seq);
+CREATE TABLE IF NOT EXISTS groups (
+    name TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_name TEXT NOT NULL,
+    username TEXT NOT NULL,
+    local INTEGER NOT NULL,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (group_name, username)
+);
+CREATE INDEX IF NOT EXISTS group_members_by_user ON group_members (username);
+CREATE TABLE IF NOT EXISTS group_messages (
+    id BLOB PRIMARY KEY,
+    group_name TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    body TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS group_messages_by_seq ON group_messages (group_name, seq);
+CREATE TABLE IF NOT EXISTS group_inbox (
+    recipient TEXT NOT NULL,
+    id BLOB NOT NULL,
+    timestamp REAL NOT NULL,
+    read INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (recipient, id)
+);
+CREATE INDEX IF NOT EXISTS group_inbox_by_time ON group_inbox (recipient, timestamp, id);
+CREATE INDEX IF NOT EXISTS group_inbox_by_seq ON group_inbox (recipient, seq);
+CREATE INDEX IF NOT EXISTS unread_group_inbox ON group_inbox (recipient, seq) WHERE read = 0;
+CREATE INDEX IF NOT EXISTS group_inbox_by_id ON group_inbox (id);
+CREATE TABLE IF NOT EXISTS inbox_counts (
+    recipient TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    unread INTEGER NOT NULL,
+    PRIMARY KEY (recipient, sender)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS count_message AFTER INSERT ON messages BEGIN
+    INSERT INTO inbox_counts VALUES (NEW.recipient, NEW.sender, 1, NOT NEW.read)
+    ON CONFLICT DO UPDATE SET total = total + 1, unread = unread + NOT NEW.read;
+END;
+CREATE TRIGGER IF NOT EXISTS count_read_message AFTER UPDATE OF read ON messages WHEN NEW.read AND NOT OLD.read BEGIN
+    UPDATE inbox_counts SET unread = unread - 1 WHERE recipient = NEW.recipient AND sender = NEW.sender;
+END;
+CREATE TRIGGER IF NOT EXISTS uncount_message AFTER DELETE ON messages BEGIN
+    UPDATE inbox_counts SET total = total - 1, unread = unread - NOT OLD.read
+    WHERE recipient = OLD.recipient AND sender = OLD.sender;
+    DELETE FROM inbox_counts WHERE recipient = OLD.recipient AND sender = OLD.sender AND total = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS count_group_message AFTER INSERT ON group_inbox BEGIN
+    INSERT INTO inbox_counts
+    SELECT NEW.recipient, sender, 1, NOT NEW.read FROM group_messages WHERE id = NEW.id
+    ON CONFLICT DO UPDATE SET total = total + 1, unread = unread + NOT NEW.read;
+END;
+CREATE TRIGGER IF NOT EXISTS count_read_group_message AFTER UPDATE OF read ON group_inbox
+WHEN NEW.read AND NOT OLD.read BEGIN
+    UPDATE inbox_counts SET unread = unread - 1
+    WHERE recipient = NEW.recipient AND sender = (SELECT sender FROM group_messages WHERE id = NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS uncount_group_message AFTER DELETE ON group_inbox BEGIN
+    UPDATE inbox_counts SET total = total - 1, unread = unread - NOT OLD.read
+    WHERE recipient = OLD.recipient AND sender = (SELECT sender FROM group_messages WHERE id = OLD.id);
+    DELETE FROM inbox_counts WHERE recipient = OLD.recipient AND total = 0;
+END;
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    message_bytes INTEGER NOT NULL
+);
+INSERT INTO totals SELECT 0, (SELECT COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) FROM messages)
+                             + (SELECT COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) FROM group_messages)
+WHERE NOT EXISTS (SELECT 1 FROM totals);
+CREATE TRIGGER IF NOT EXISTS add_message_bytes AFTER INSERT ON messages BEGIN
+    UPDATE totals SET message_bytes = message_bytes + LENGTH(CAST(NEW.body AS BLOB));
+END;
+CREATE TRIGGER IF NOT EXISTS remove_message_bytes AFTER DELETE ON messages BEGIN
+    UPDATE totals SET message_bytes = message_bytes - LENGTH(CAST(OLD.body AS BLOB));
+END;
+CREATE TRIGGER IF NOT EXISTS add_group_message_bytes AFTER INSERT ON group_messages BEGIN
+    UPDATE totals SET message_bytes = message_bytes + LENGTH(CAST(NEW.body AS BLOB));
+END;
+CREATE TRIGGER IF NOT EXISTS remove_group_message_bytes AFTER DELETE ON group_messages BEGIN
+    UPDATE totals SET message_bytes = message_bytes - LENGTH(CAST(OLD.body AS BLOB));
+END;
+CREATE VIEW IF NOT EXISTS inbox AS
+    SELECT id, sender, recipient, body, timestamp, read, seq, '' AS group_name FROM messages
+    UNION ALL
+    SELECT i.id, g.sender, i.recipient, g.body, i.timestamp, i.read, i.seq, g.group_name
+    FROM group_inbox i JOIN group_messages g ON g.id = i.id;
+"""
+
+# Statements are kept as constants so every connection's statement cache prepares each of them once
+MESSAGE_COLUMNS = "id, sender, recipient, body, timestamp, read, group_name"
+SELECT_USER = "SELECT password, seq, floor_seq FROM users WHERE username = ?"
+SELECT_SEQ = "SELECT seq FROM users WHERE username = ?"
+SELECT_MESSAGE_ID = "SELECT 1 FROM messages WHERE id = ?"
+# The GLOB on the literal prefix of a pattern turns into a range scan of the primary key
+SELECT_USERNAMES = "SELECT username FROM users WHERE username GLOB ? AND fnmatch(username, ?) ORDER BY username LIMIT ?"
+SELECT_USERNAMES_AFTER = """SELECT username FROM users WHERE username GLOB ? AND username > ? AND fnmatch(username, ?)
+                            ORDER BY username LIMIT ?"""
+# Inbox queries go through the inbox view, which adds each member's rows of the group messages to the messages table
+SELECT_MESSAGE = f"SELECT {MESSAGE_COLUMNS} FROM inbox WHERE id = ? AND recipient = ?"
+SELECT_CHANGED = f"SELECT {MESSAGE_COLUMNS} FROM inbox WHERE recipient = ? AND seq > ? ORDER BY seq"
+SELECT_COUNTS = "SELECT sender, total, unread FROM inbox_counts WHERE recipient = ?"
+SELECT_INBOX_SIZE = "SELECT SUM(total) FROM inbox_counts WHERE recipient = ?"
+# Bytes reclaimed by deleting a message from an inbox: a group message stays in its group for the other members
+SELECT_RECLAIMED = "SELECT IIF(group_name = '', length(CAST(body AS BLOB)), 0) FROM inbox WHERE id = ? AND recipient = ?"
+SELECT_DELETED = "SELECT id FROM tombstones WHERE recipient = ? AND seq > ? ORDER BY seq"
+# A page is taken from each table along its index and the two are merged, instead of sorting the whole inbox view
+INBOX_PAGE = """SELECT * FROM (SELECT id, sender, recipient, body, timestamp, read, '' FROM messages
+                               WHERE recipient = ?1 AND (timestamp, id) {op} (?2, ?3)
+                               ORDER BY timestamp {order}, id {order} LIMIT ?4)
+                UNION ALL
+                SELECT * FROM (SELECT i.id, g.sender, i.recipient, g.body, i.timestamp, i.read, g.group_name
+                               FROM group_inbox i JOIN group_messages g ON g.id = i.id
+                               WHERE i.recipient = ?1 AND (i.timestamp, i.id) {op} (?2, ?3)
+                               ORDER BY i.timestamp {order}, i.id {order} LIMIT ?4)
+                ORDER BY 5 {order}, 1 {order} LIMIT ?4"""
+SELECT_PAGE = INBOX_PAGE.format(op=">", order="ASC")
+SELECT_PAGE_DESC = INBOX_PAGE.format(op="<", order="DESC")
+# Unread rows keep the sequence number they arrived with, so the partial indexes on it are the unread queues
+SELECT_OLDEST_UNREAD = """SELECT id, seq FROM (SELECT id, seq FROM messages WHERE recipient = ?1 AND read = 0
+                                              ORDER BY seq LIMIT ?2)
+                          UNION ALL
+                          SELECT id, seq FROM (SELECT id, seq FROM group_inbox WHERE recipient = ?1 AND read = 0
+                                              ORDER BY seq LIMIT ?2)
+                          ORDER BY seq LIMIT ?2"""
+INSERT_USER = "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)"
+INSERT_MESSAGE = """INSERT INTO messages (id, sender, recipient, body, timestamp, read, seq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+INSERT_TOMBSTONE = "INSERT OR REPLACE INTO tombstones (recipient, id, seq) VALUES (?, ?, ?)"
+UPDATE_SEQ = "UPDATE users SET seq = ? WHERE username = ?"
+UPDATE_READ = "UPDATE messages SET read = 1, seq = ? WHERE id = ? AND recipient = ? AND read = 0"
+UPDATE_GROUP_READ = "UPDATE group_inbox SET read = 1, seq = ? WHERE id = ? AND recipient = ? AND read = 0"
+DELETE_MESSAGE = "DELETE FROM messages WHERE id = ? AND recipient = ?"
+DELETE_GROUP_INBOX = "DELETE FROM group_inbox WHERE id = ? AND recipient = ?"
+DELETE_TOMBSTONE = "DELETE FROM tombstones WHERE recipient = ? AND id = ?"
+SELECT_STATS = """SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM groups),
+                         (SELECT COUNT(*) FROM messages) + (SELECT COUNT(*) FROM group_messages),
+                         (SELECT message_bytes FROM totals)"""
+# The size of the bodies is kept in totals by triggers on every insert and delete of a message
+SELECT_MESSAGE_BYTES = "SELECT message_bytes FROM totals"
+
+INSERT_GROUP = "INSERT OR IGNORE INTO groups (name, size) VALUES (?, ?)"
+INSERT_GROUP_MEMBER = """INSERT INTO group_members (group_name, username, local)
+                         VALUES (?, ?, EXISTS (SELECT 1 FROM users WHERE username = ?))"""
+SELECT_UNKNOWN_MEMBERS = "SELECT username FROM group_members WHERE group_name = ? AND NOT local"
+SELECT_GROUP_OF_SENDER = """SELECT g.seq, g.size FROM groups g JOIN group_members m ON m.group_name = g.name
+                            WHERE g.name = ? AND m.username = ?"""
+SELECT_LOCAL_MEMBERS = "SELECT username FROM group_members WHERE group_name = ? AND local"
+SELECT_LOCAL_MEMBER = "SELECT 1 FROM group_members WHERE group_name = ? AND username = ? AND local"
+INSERT_GROUP_MESSAGE = """INSERT INTO group_messages (id, group_name, seq, sender, body, timestamp)
+                          VALUES (?, ?, ?, ?, ?, ?)"""
+UPDATE_GROUP_SEQ = "UPDATE groups SET seq = ? WHERE name = ?"
+SELECT_HAS_PENDING = """SELECT 1 FROM group_members m JOIN groups g ON g.name = m.group_name
+                        WHERE m.username = ? AND m.local AND m.cursor < g.seq LIMIT 1"""
+SELECT_PENDING = """SELECT g.id, g.sender, m.username, g.body, g.timestamp, 0, g.group_name
+                    FROM group_members m JOIN group_messages g ON g.group_name = m.group_name AND g.seq > m.cursor
+                    WHERE m.username = ? AND m.local ORDER BY g.group_name, g.seq"""
+INSERT_GROUP_INBOX = "INSERT INTO group_inbox (recipient, id, timestamp, seq) VALUES (?, ?, ?, ?)"
+UPDATE_CURSORS = """UPDATE group_members SET cursor = (SELECT seq FROM groups WHERE name = group_name)
+                    WHERE username = ? AND local"""
+# A group message is held by every member's inbox copy, and by every local member it was not delivered to yet
+HELD = """(EXISTS (SELECT 1 FROM group_inbox i WHERE i.id = group_messages.id)
+           OR EXISTS (SELECT 1 FROM group_members m WHERE m.group_name = group_messages.group_name AND m.local
+                      AND m.cursor < group_messages.seq))"""
+RECLAIM_GROUP_MESSAGE = f"DELETE FROM group_messages WHERE id = ? AND NOT {HELD}"
+RECLAIM_GROUP = f"DELETE FROM group_messages WHERE group_name = ? AND NOT {HELD}"
+SELECT_LAGGING = """SELECT DISTINCT m.username FROM group_members m
+                    JOIN group_messages g ON g.group_name = m.group_name AND g.seq = m.cursor + 1
+                    WHERE m.local AND g.timestamp <= ?"""
+
+# Keys below and above every (timestamp, message ID) key, to start a page without a page token
+FIRST_KEY = (float("-inf"), b"")
+LAST_KEY = (float("inf"), b"\xff" * 17)
+
+
+def username_matches(username: str, pattern: str) -> bool:
+    return compile_pattern(pattern).match(username) is not None
+
+
+def to_message(row: tuple) -> Message:
+    message_id, sender, recipient, body, timestamp, read, group = row
+    return Message(id=message_id, sender=sender, recipient=recipient, body=body, timestamp=timestamp, read=bool(read),
+                   group=group)
+
+
+class SqliteStorage(Storage):
+    """
+    Server state in an SQLite database file, so that it survives restarts and can grow larger than memory.
+
+    The database runs in WAL journal mode: readers work on their own snapshot while the writer appends to the log,
+    so GetMessages and ListUsers never wait on mutations. Every thread has its own connection. SQLite allows a single
+    writer at a time, so mutations are serialized by a lock, and each request is one transaction (batched with
+    executemany for multi-ID reads and deletes). Inbox events are pushed to open streams after the transaction
+    commits, while still holding the lock, so they are delivered in commit order.
+
+    Group messages are stored once, in group_messages. A member's inbox only gets a group_inbox row (the message ID,
+    timestamp, read flag, and sequence number), when the message is delivered to it: as it is sent for groups of up to
+    group_fanout_limit members (and for members with open streams), and otherwise when the member next syncs the inbox.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, group_fanout_limit: int = GROUP_FANOUT_LIMIT,
+                 retention: RetentionPolicy = RetentionPolicy()):
+        """
+        :param path: Database file, created along with its directory if missing.
+        :param fsync: Whether to sync on every commit (turning it off only survives process crashes).
+        :param group_fanout_limit: Largest group whose messages are delivered to every member as they are sent.
+        :param retention: How long inbox messages are kept, enforced by a background thread.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fsync = fsync
+        self.group_fanout_limit = group_fanout_limit
+
+        self.local = threading.local()
+        self.connections: list[sqlite3.Connection] = []
+        self.connections_lock = threading.Lock()
+
+        # The write lock serializes transactions and guards the open streams
+        self.write_lock = threading.RLock()
+        self.subscribers: dict[str, list] = {}
+
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+
+        # The expiry schedule is kept in memory, so it starts from every message already in the inboxes
+        self.retention = Retention(retention)
+        if self.retention.enabled:
+            for recipient, message_id, timestamp, read in conn.execute("SELECT recipient, id, timestamp, read FROM inbox"):
+                self.retention.added(recipient, message_id, timestamp, read)
+            self.retention.start(self.expire)
+
+    @property
+    def blocking(self) -> bool:
+        """Whether mutations block on disk I/O."""
+        return True
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            # Autocommit mode: transactions are begun and committed explicitly
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA synchronous = {'FULL' if self.fsync else 'NORMAL'}")
+            conn.create_function("fnmatch", 2, username_matches, deterministic=True)
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a write transaction, rolling it back if anything in it fails. Must be called holding the write lock."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def snapshot(self):
+        """Run a read transaction, so that several queries see the same state."""
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def create_user(self, username: str, password: str) -> bool:
+        """Create an account, returning False if the username is taken."""
+        with self.write_lock:
+            with self.transaction() as conn:
+                created = conn.execute(INSERT_USER, (username, password)).rowcount == 1
+        return created
+
+    def get_password(self, username: str) -> str | None:
+        """Return the stored password of a user, or None if the user does not exist."""
+        row = self.connection().execute(SELECT_USER, (username,)).fetchone()
+        return row[0] if row is not None else None
+
+    def list_users(self, pattern: str, limit: int = 0, after: str | None = None) -> tuple[list[str], str | None]:
+        """
+        Collect one page of the sorted usernames matching a wildcard pattern (with the same matching rules as fnmatch).
+
+        The page starts right after the given username and holds at most limit usernames (0 for no limit).
+        Returns the usernames and the username to continue from, or None if this is the last page.
+        """
+        # The literal prefix never holds a GLOB wildcard, so it can be used as is
+        prefix_glob = compile_pattern(pattern).prefix + "*"
+        sql_limit = limit + 1 if limit else -1
+        if after is None:
+            rows = self.connection().execute(SELECT_USERNAMES, (prefix_glob, pattern, sql_limit))
+        else:
+            rows = self.connection().execute(SELECT_USERNAMES_AFTER, (prefix_glob, after, pattern, sql_limit))
+
+        matches = [username for (username,) in rows]
+        if limit and len(matches) > limit:
+            del matches[limit:]
+            return matches, matches[-1]
+        return matches, None
+
+    def get_messages(self, username: str, since_seq: int, limit: int, after: tuple[float, uuid.UUID] | None,
+                     newest_first: bool) -> InboxSync:
+        """
+        Sync a user's inbox.
+
+        Returns the changes after since_seq if a delta can be computed from it,
+        and otherwise one page of the inbox in timestamp order.
+        """
+        self.catch_up(username)
+        with self.snapshot() as conn:
+            row = conn.execute(SELECT_USER, (username,)).fetchone()
+            assert row is not None
+            _, seq, floor_seq = row
+
+            if since_seq < floor_seq or since_seq > seq or since_seq == 0:
+                rows = self.page(conn, username, limit, after, newest_first)
+                next_key = None
+                if limit and len(rows) > limit:
+                    rows = rows[:limit]
+                    next_key = (rows[-1][4], uuid.UUID(bytes=rows[-1][0]))
+                return InboxSync([to_message(row) for row in rows], [], seq, True, next_key)
+
+            messages = [to_message(row) for row in conn.execute(SELECT_CHANGED, (username, since_seq))]
+            deleted_ids = [uuid.UUID(bytes=message_id)
+                           for (message_id,) in conn.execute(SELECT_DELETED, (username, since_seq))]
+            return InboxSync(messages, deleted_ids, seq, False, None)
+
+    def inbox_summary(self, username: str) -> InboxSummary | None:
+        """
+        Count the messages and unread messages in a user's inbox, or return None if the user does not exist.
+
+        The counts per sender are kept in inbox_counts by triggers on every insert, read, and delete of an inbox row.
+        """
+        self.catch_up(username)
+        with self.snapshot() as conn:
+            row = conn.execute(SELECT_SEQ, (username,)).fetchone()
+            if row is None:
+                return None
+
+            total, unread, unread_by_sender = 0, 0, {}
+            for sender, sender_total, sender_unread in conn.execute(SELECT_COUNTS, (username,)):
+                total += sender_total
+                unread += sender_unread
+                if sender_unread:
+                    unread_by_sender[sender] = sender_unread
+        return InboxSummary(total, unread, unread_by_sender, row[0])
+
+    def inbox_size(self, username: str) -> int | None:
+        """Count the messages in a user's inbox, or return None if the user does not exist."""
+        with self.snapshot() as conn:
+            if conn.execute(SELECT_SEQ, (username,)).fetchone() is None:
+                return None
+            (total,) = conn.execute(SELECT_INBOX_SIZE, (username,)).fetchone()
+        return total or 0
+
+    @staticmethod
+    def page(conn: sqlite3.Connection, username: str, limit: int, after: tuple[float, uuid.UUID] | None,
+             newest_first: bool) -> list[tuple]:
+        """Select one page of an inbox, plus one more row if there is a next page (keyset pagination on the index)."""
+        if after is not None:
+            key = (after[0], after[1].bytes)
+        else:
+            key = LAST_KEY if newest_first else FIRST_KEY
+
+        statement = SELECT_PAGE_DESC if newest_first else SELECT_PAGE
+        return conn.execute(statement, (username, *key, limit + 1 if limit else -1)).fetchall()
+
+    def send_message(self, message: Message) -> bool:
+        """
+        Store a message and add it to the recipient's inbox.
+
+        Returns False if the recipient does not exist.
+        """
+        with self.write_lock:
+            with self.transaction() as conn:
+                row = conn.execute(SELECT_SEQ, (message.recipient,)).fetchone()
+                if row is None:
+                    return False
+
+                seq = row[0] + 1
+                conn.execute(INSERT_MESSAGE, (message.id, message.sender, message.recipient, message.body,
+                                              message.timestamp, message.read, seq))
+                conn.execute(DELETE_TOMBSTONE, (message.recipient, message.id))
+                conn.execute(UPDATE_SEQ, (seq, message.recipient))
+                self.retention.added(message.recipient, message.id, message.timestamp, message.read)
+
+            # Push the new message to the recipient's open streams
+            self.publish(message.recipient, MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                                         message=message,
+                                                         seq=seq))
+        return True
+
+    def send_messages(self, messages: list[Message]) -> list[SendResult]:
+        """
+        Store a batch of messages and add them to their recipients' inboxes, in order.
+
+        The whole batch is one transaction, and every recipient's sequence number is written once.
+        A message whose recipient does not exist, or whose ID is already stored, is skipped without failing the
+        transaction. Returns the result of each message.
+        """
+        with self.write_lock:
+            seqs, events, results = {}, [], []
+            with self.transaction() as conn:
+                for message in messages:
+                    if message.recipient not in seqs:
+                        row = conn.execute(SELECT_SEQ, (message.recipient,)).fetchone()
+                        seqs[message.recipient] = row[0] if row is not None else None
+                    if seqs[message.recipient] is None:
+                        events.append(None)
+                        results.append(SendResult.NO_RECIPIENT)
+                        continue
+                    if conn.execute(SELECT_MESSAGE_ID, (message.id,)).fetchone() is not None:
+                        events.append(None)
+                        results.append(SendResult.DUPLICATE_ID)
+                        continue
+
+                    seq = seqs[message.recipient] = seqs[message.recipient] + 1
+                    conn.execute(INSERT_MESSAGE, (message.id, message.sender, message.recipient, message.body,
+                                                  message.timestamp, message.read, seq))
+                    conn.execute(DELETE_TOMBSTONE, (message.recipient, message.id))
+                    self.retention.added(message.recipient, message.id, message.timestamp, message.read)
+                    events.append(MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                               message=message,
+                                               seq=seq))
+                    results.append(SendResult.SENT)
+
+                conn.executemany(UPDATE_SEQ, [(seq, recipient) for recipient, seq in seqs.items() if seq is not None])
+
+            # Push the new messages to the recipients' open streams
+            for message, event in zip(messages, events):
+                if event is not None:
+                    self.publish(message.recipient, event)
+        return results
+
+    def create_group(self, name: str, members: list[str]) -> list[str] | None:
+        """
+        Create a group, returning None if the name is taken.
+
+        Returns the members without an account, which do not get the group's messages.
+        """
+        members = list(dict.fromkeys(members))
+        with self.write_lock:
+            with self.transaction() as conn:
+                if conn.execute(INSERT_GROUP, (name, len(members))).rowcount == 0:
+                    return None
+                conn.executemany(INSERT_GROUP_MEMBER, [(name, username, username) for username in members])
+                unknown = {username for (username,) in conn.execute(SELECT_UNKNOWN_MEMBERS, (name,))}
+        return [username for username in members if username in unknown]
+
+    def send_group_message(self, message: Message) -> bool:
+        """
+        Store a message to a group once, and deliver it to its members' inboxes.
+
+        It is delivered right away to every member of a group of up to group_fanout_limit members, and only to the
+        members with open streams for larger groups (the others get it when they next sync their inbox).
+        Returns False if the group does not exist or the sender is not a member.
+        """
+        with self.write_lock:
+            with self.transaction() as conn:
+                row = conn.execute(SELECT_GROUP_OF_SENDER, (message.group, message.sender)).fetchone()
+                if row is None:
+                    return False
+
+                seq, size = row
+                conn.execute(INSERT_GROUP_MESSAGE, (message.id, message.group, seq + 1, message.sender, message.body,
+                                                    message.timestamp))
+                conn.execute(UPDATE_GROUP_SEQ, (seq + 1, message.group))
+
+                if size <= self.group_fanout_limit:
+                    recipients = [username for (username,) in conn.execute(SELECT_LOCAL_MEMBERS, (message.group,))]
+                else:
+                    recipients = [username for username in self.subscribers
+                                  if conn.execute(SELECT_LOCAL_MEMBER, (message.group, username)).fetchone()]
+                events = [(username, event) for username in recipients for event in self.deliver(conn, username)]
+
+                # A group without local members has nobody to hold the message
+                conn.execute(RECLAIM_GROUP_MESSAGE, (message.id,))
+
+            for username, event in events:
+                self.publish(username, event)
+        return True
+
+    def catch_up(self, username: str):
+        """Deliver the pending messages of every group of a user, if there are any."""
+        if self.connection().execute(SELECT_HAS_PENDING, (username,)).fetchone() is None:
+            return
+
+        with self.write_lock:
+            with self.transaction() as conn:
+                events = self.deliver(conn, username)
+            for event in events:
+                self.publish(username, event)
+
+    def deliver(self, conn: sqlite3.Connection, username: str) -> list[MessageEvent]:
+        """
+        Add the pending messages of every group of a user to the inbox, in one write transaction.
+
+        Returns the NEW events to publish once the transaction commits.
+        """
+        rows = conn.execute(SELECT_PENDING, (username,)).fetchall()
+        if not rows:
+            return []
+
+        (seq,) = conn.execute(SELECT_SEQ, (username,)).fetchone()
+        conn.executemany(INSERT_GROUP_INBOX, [(username, row[0], row[4], seq + i) for i, row in enumerate(rows, 1)])
+        conn.execute(UPDATE_SEQ, (seq + len(rows), username))
+        conn.execute(UPDATE_CURSORS, (username,))
+        for row in rows:
+            self.retention.added(username, row[0], row[4])
+        return [MessageEvent(event_type=MessageEvent.EventType.NEW, message=to_message(row), seq=seq + i)
+                for i, row in enumerate(rows, 1)]
+
+    def read_messages(self, username: str, message_ids: list[bytes]):
+        """Set the read flag of messages in a user's inbox."""
+        with self.write_lock:
+            with self.transaction() as conn:
+                events = self.mark_read(conn, username, message_ids)
+            for event in events:
+                self.publish(username, event)
+
+    def read_next(self, username: str, count: int) -> list[Message] | None:
+        """
+        Set the read flag of the oldest unread messages in a user's inbox, up to count of them.
+
+        Returns the messages in the order they arrived, or None if the user does not exist.
+        """
+        self.catch_up(username)
+        with self.write_lock:
+            with self.transaction() as conn:
+                if conn.execute(SELECT_SEQ, (username,)).fetchone() is None:
+                    return None
+
+                message_ids = [message_id for message_id, _ in conn.execute(SELECT_OLDEST_UNREAD, (username, count))]
+                events = self.mark_read(conn, username, message_ids) if message_ids else []
+                messages = [to_message(conn.execute(SELECT_MESSAGE, (message_id, username)).fetchone())
+                            for message_id in message_ids]
+
+            for event in events:
+                self.publish(username, event)
+        return messages
+
+    def mark_read(self, conn: sqlite3.Connection, username: str, message_ids: list[bytes]) -> list[MessageEvent]:
+        """
+        Set the read flag of messages in a user's inbox, in a write transaction.
+
+        Returns the READ events to publish once the transaction commits.
+        """
+        (seq,) = conn.execute(SELECT_SEQ, (username,)).fetchone()
+
+        # Every message gets its own sequence number, in request order
+        updates = [(seq + i, message_id, username) for i, message_id in enumerate(message_ids, 1)]
+        updated = conn.executemany(UPDATE_READ, updates).rowcount
+        updated += conn.executemany(UPDATE_GROUP_READ, updates).rowcount
+
+        # Assert that every message exists, belongs to the user, and was unread
+        assert updated == len(message_ids)
+        conn.execute(UPDATE_SEQ, (seq + len(message_ids), username))
+        for message_id in message_ids:
+            self.retention.read(username, message_id)
+
+        events = []
+        if username in self.subscribers:
+            for seq, message_id, _ in updates:
+                message = to_message(conn.execute(SELECT_MESSAGE, (message_id, username)).fetchone())
+                events.append(MessageEvent(event_type=MessageEvent.EventType.READ, message=message, seq=seq))
+        return events
+
+    def delete_messages(self, username: str, message_ids: list[bytes]):
+        """Delete messages from a user's inbox."""
+        with self.write_lock:
+            with self.transaction() as conn:
+                events = self.remove_messages(conn, username, message_ids)
+            for event in events:
+                self.publish(username, event)
+
+    def remove_messages(self, conn: sqlite3.Connection, username: str, message_ids: list[bytes]) -> list[MessageEvent]:
+        """
+        Delete messages from a user's inbox, in a write transaction.
+
+        Returns the DELETED events to publish once the transaction commits.
+        """
+        (seq,) = conn.execute(SELECT_SEQ, (username,)).fetchone()
+
+        # Assert that every message exists and belongs to the user (group messages are only deleted for it)
+        deletes = [(message_id, username) for message_id in message_ids]
+        deleted = conn.executemany(DELETE_MESSAGE, deletes).rowcount
+        deleted += conn.executemany(DELETE_GROUP_INBOX, deletes).rowcount
+        assert deleted == len(message_ids)
+
+        # A group message stays in the group until no member holds it
+        conn.executemany(RECLAIM_GROUP_MESSAGE, [(message_id,) for message_id in message_ids])
+
+        tombstones = [(username, message_id, seq + i) for i, message_id in enumerate(message_ids, 1)]
+        conn.executemany(INSERT_TOMBSTONE, tombstones)
+        conn.execute(UPDATE_SEQ, (seq + len(message_ids), username))
+        self.prune_tombstones(conn, username)
+
+        # Only the ID is needed to drop the message on the subscriber's side
+        return [MessageEvent(event_type=MessageEvent.EventType.DELETED, message=Message(id=message_id), seq=seq)
+                for _, message_id, seq in tombstones]
+
+    def expire(self, now: float):
+        """
+        Delete the inbox messages that are due by now under the retention policy, and the oldest messages of inboxes
+        over its size limit, like delete_messages() does. Each inbox is expired in a transaction of its own.
+
+        Group messages older than max_age are first delivered to the members that never synced them, so that they
+        expire from every inbox, and the group reclaims them once the last copy is deleted.
+        """
+        if self.retention.policy.max_age:
+            horizon = now - self.retention.policy.max_age
+            for (username,) in self.connection().execute(SELECT_LAGGING, (horizon,)).fetchall():
+                self.catch_up(username)
+
+        max_messages = self.retention.policy.max_messages
+        for username, due_ids in self.retention.due(now).items():
+            with self.write_lock:
+                with self.transaction() as conn:
+                    # Skip the messages deleted since they were scheduled
+                    sizes = {}
+                    for message_id in due_ids:
+                        row = conn.execute(SELECT_RECLAIMED, (message_id, username)).fetchone()
+                        if row is not None:
+                            sizes[message_id] = row[0]
+
+                    (total,) = conn.execute(SELECT_INBOX_SIZE, (username,)).fetchone()
+                    excess = (total or 0) - len(sizes) - max_messages if max_messages else 0
+                    if excess > 0:
+                        oldest = [row[0] for row in self.page(conn, username, excess + len(sizes), None, False)]
+                        for message_id in [message_id for message_id in oldest if message_id not in sizes][:excess]:
+                            (sizes[message_id],) = conn.execute(SELECT_RECLAIMED, (message_id, username)).fetchone()
+                    if not sizes:
+                        continue
+
+                    events = self.remove_messages(conn, username, list(sizes))
+
+                for event in events:
+                    self.publish(username, event)
+            self.retention.count(len(sizes), sum(sizes.values()))
+
+    @staticmethod
+    def prune_tombstones(conn: sqlite3.Connection, username: str):
+        """Forget the oldest tombstones of a user: deltas from before them can no longer be computed."""
+        (count,) = conn.execute("SELECT COUNT(*) FROM tombstones WHERE recipient = ?", (username,)).fetchone()
+        if count <= MAX_TOMBSTONES:
+            return
+
+        (floor_seq,) = conn.execute("SELECT seq FROM tombstones WHERE recipient = ? ORDER BY seq LIMIT 1 OFFSET ?",
+                                    (username, count - MAX_TOMBSTONES - 1)).fetchone()
+        conn.execute("DELETE FROM tombstones WHERE recipient = ? AND seq <= ?", (username, floor_seq))
+        conn.execute("UPDATE users SET floor_seq = ? WHERE username = ?", (floor_seq, username))
+
+    def delete_user(self, username: str):
+        """Delete a user along with every message in their inbox."""
+        with self.write_lock:
+            with self.transaction() as conn:
+                assert conn.execute("DELETE FROM users WHERE username = ?", (username,)).rowcount == 1
+                conn.execute("DELETE FROM messages WHERE recipient = ?", (username,))
+                conn.execute("DELETE FROM tombstones WHERE recipient = ?", (username,))
+
+                # Leave every group, giving up the group messages the user held
+                groups = conn.execute("SELECT group_name FROM group_members WHERE username = ?", (username,)).fetchall()
+                conn.execute("DELETE FROM group_inbox WHERE recipient = ?", (username,))
+                conn.execute("""UPDATE groups SET size = size - 1
+                                WHERE name IN (SELECT group_name FROM group_members WHERE username = ?)""", (username,))
+                conn.execute("DELETE FROM group_members WHERE username = ?", (username,))
+                conn.executemany(RECLAIM_GROUP, groups)
+
+            # End any streams the deleted user still has open
+            self.publish(username, None)
+
+    def subscribe(self, username: str, events, limit: int) -> bool:
+        """
+        Register a stream for a user's inbox events.
+
+        The newest messages (up to limit, 0 for all) are replayed onto the stream as NEW events, followed by SYNCED.
+        Registration and replay happen atomically, so no update can fall in between.
+        Returns False if the user does not exist.
+
+        :param events: Queue-like object whose put() method receives MessageEvent objects, or None when the stream ends.
+        """
+        with self.write_lock:
+            # Catch up on the group messages before the replay (the next ones are delivered as they are sent)
+            self.catch_up(username)
+            return self.register(username, events, limit)
+
+    def register(self, username: str, events, limit: int) -> bool:
+        """Register a stream and replay the inbox onto it. Must be called holding the write lock."""
+        with self.snapshot() as conn:
+            row = conn.execute(SELECT_USER, (username,)).fetchone()
+            if row is None:
+                return False
+            _, seq, _ = row
+
+            self.subscribers.setdefault(username, []).append(events)
+
+            # Replay the newest messages, oldest first
+            for row in reversed(self.page(conn, username, limit, None, True)[:limit or None]):
+                events.put(MessageEvent(event_type=MessageEvent.EventType.NEW,
+                                        message=to_message(row)))
+            events.put(MessageEvent(event_type=MessageEvent.EventType.SYNCED,
+                                    seq=seq))
+            return True
+
+    def unsubscribe(self, username: str, events):
+        with self.write_lock:
+            self.subscribers[username].remove(events)
+            if not self.subscribers[username]:
+                del self.subscribers[username]
+
+    def publish(self, username: str, event: MessageEvent | None):
+        """
+        Push an event onto every open stream of a user.
+
+        Must be called while holding the write lock so that events are delivered in commit order.
+        A None event ends the streams.
+        """
+        for events in self.subscribers.get(username, []):
+            events.put(event)
+
+    def stats(self) -> StorageStats:
+        """Count the users, groups, and messages in the database, and the open streams."""
+        with self.snapshot() as conn:
+            users, groups, messages, message_bytes = conn.execute(SELECT_STATS).fetchone()
+        with self.write_lock:
+            subscribers = sum(map(len, self.subscribers.values()))
+        return StorageStats(users, groups, messages, message_bytes, subscribers)
+
+    @property
+    def message_bytes(self) -> int:
+        (message_bytes,) = self.connection().execute(SELECT_MESSAGE_BYTES).fetchone()
+        return message_bytes
+
+    @property
+    def users(self) -> dict[str, User]:
+        """Snapshot of all users, loaded from the database."""
+        users, seqs = {}, {}
+        with self.snapshot() as conn:
+            for username, password, seq in conn.execute("SELECT username, password, seq FROM users"):
+                users[username] = User(username=username, password=password)
+                seqs[username] = seq
+            rows = conn.execute("SELECT id, recipient, timestamp, sender, read FROM inbox")
+            for message_id, recipient, timestamp, sender, read in rows:
+                users[recipient].add_message(uuid.UUID(bytes=message_id), timestamp)
+                if not read:
+                    users[recipient].add_unread(uuid.UUID(bytes=message_id), sender)
+
+        for username, seq in seqs.items():
+            users[username].reset_changes(seq)
+        return users
+
+    @property
+    def messages(self) -> dict[uuid.UUID, Message]:
+        """Snapshot of all messages, loaded from the database (group messages have no recipient)."""
+        with self.snapshot() as conn:
+            rows = conn.execute("""SELECT id, sender, recipient, body, timestamp, read, '' FROM messages UNION ALL
+                                   SELECT id, sender, '', body, timestamp, 0, group_name FROM group_messages""")
+            return {uuid.UUID(bytes=row[0]): to_message(row) for row in rows}
+
+    def close(self):
+        """Stop expiring messages and close every thread's connection."""
+        self.retention.stop()
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
@@ -0,0 +1,289 @@
+import enum
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+
+from collections.abc import Iterable, Iterator
+
+# Every record is framed as: crc32 of type + payload, record type, payload length, payload
+RECORD_HEADER = struct.Struct("!IBI")
+STRING_LENGTH = struct.Struct("!H")
+SEQ = struct.Struct("!Q")
+
+SEGMENT_PATTERN = "segment-{:08d}.log"
+SNAPSHOT_PATTERN = "snapshot-{:08d}.snap"
+
+
+class RecordType(enum.IntEnum):
+    # Log records, one per mutating request
+    CREATE_USER = 1
+    SEND_MESSAGE = 2
+    READ_MESSAGES = 3
+    DELETE_MESSAGES = 4
+    DELETE_USER = 5
+
+    # Snapshot records
+    USER = 6
+    MESSAGE = 7
+
+    # Group log records
+    CREATE_GROUP = 8
+    SEND_GROUP_MESSAGE = 9
+    DELIVER_GROUP_MESSAGES = 10
+
+    # Group snapshot records
+    GROUP = 11
+    GROUP_MESSAGE = 12
+    MEMBERSHIP = 13
+    GROUP_GAP = 14
+
+
+def pack_str(s: str) -> bytes:
+    data = s.encode()
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+def unpack_str(payload: bytes, offset: int = 0) -> tuple[str, int]:
+    """Read a length-prefixed string, returning it and the offset right after it."""
+    (length,) = STRING_LENGTH.unpack_from(payload, offset)
+    offset += STRING_LENGTH.size
+    return payload[offset:offset + length].decode(), offset + length
+
+
+def pack_strs(strings: list[str]) -> bytes:
+    return SEQ.pack(len(strings)) + b"".join(pack_str(s) for s in strings)
+
+
+def unpack_strs(payload: bytes, offset: int = 0) -> tuple[list[str], int]:
+    """Read a count-prefixed list of strings, returning it and the offset right after it."""
+    (count,) = SEQ.unpack_from(payload, offset)
+    offset += SEQ.size
+    strings = []
+    for _ in range(count):
+        s, offset = unpack_str(payload, offset)
+        strings.append(s)
+    return strings, offset
+
+
+def pack_ids(username: str, message_ids: Iterable[bytes]) -> bytes:
+    """Payload of READ_MESSAGES and DELETE_MESSAGES records: the username followed by raw 16-byte message IDs."""
+    return pack_str(username) + b"".join(message_ids)
+
+
+def unpack_ids(payload: bytes) -> tuple[str, list[bytes]]:
+    username, offset = unpack_str(payload)
+    return username, [payload[i:i + 16] for i in range(offset, len(payload), 16)]
+
+
+def frame(record_type: RecordType, payload: bytes) -> bytes:
+    body = bytes((record_type,)) + payload
+    return RECORD_HEADER.pack(zlib.crc32(body), record_type, len(payload)) + payload
+
+
+def read_records(path: str) -> Iterator[tuple[RecordType, bytes]]:
+    """
+    Read the records of a log segment or snapshot file in order.
+
+    Reading stops at the first torn or corrupt record: that is where the process died in the middle of a write.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        crc, record_type, length = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(bytes((record_type,)) + payload) != crc:
+            print(f"WAL: ignoring torn record at byte {offset} of {path}")
+            return
+
+        yield RecordType(record_type), payload
+        offset = start + length
+
+
+class WriteAheadLog:
+    """
+    Append-only log of every state mutation, with group commit and periodic snapshots.
+
+    Records are appended to an in-memory buffer, which a flusher thread writes out and fsyncs.
+    Every request that appended while the previous fsync was running is made durable by the next one,
+    so concurrent requests share fsyncs instead of paying for one each.
+
+    The log is split into numbered segments. A snapshot numbered n holds the state as of the start of segment n,
+    so recovery loads the newest snapshot and replays the segments from its number on.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, group_commit_delay: float = 0.0, snapshot_every: int = 0):
+        """
+        :param path: Directory holding the log segments and snapshots.
+        :param fsync: Whether to fsync after every batch of records (turning it off only survives process crashes).
+        :param group_commit_delay: Seconds the flusher waits for more records before writing a batch.
+        :param snapshot_every: Number of records after which a snapshot is requested, 0 to never request one.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fsync = fsync
+        self.group_commit_delay = group_commit_delay
+        self.snapshot_every = snapshot_every
+
+        # The lock guards the buffer and the sequence numbers, the file lock guards the open segment
+        self.lock = threading.Lock()
+        self.appended = threading.Condition(self.lock)
+        self.flushed = threading.Condition(self.lock)
+        self.file_lock = threading.Lock()
+
+        self.buffer: list[bytes] = []
+        self.appended_lsn = 0
+        self.durable_lsn = 0
+        self.error: Exception | None = None
+        self.closed = False
+
+        self.segment = 0
+        self.file = None
+        self.records_in_segment = 0
+        self.snapshot_needed = threading.Event()
+        self.flusher = None
+
+    def segments(self) -> list[int]:
+        return sorted(int(os.path.basename(p)[8:16]) for p in glob.glob(os.path.join(self.path, "segment-*.log")))
+
+    def snapshots(self) -> list[int]:
+        return sorted(int(os.path.basename(p)[9:17]) for p in glob.glob(os.path.join(self.path, "snapshot-*.snap")))
+
+    def recover(self) -> Iterator[tuple[RecordType, bytes]]:
+        """Yield the records of the newest snapshot, followed by every log record written after it."""
+        snapshots = self.snapshots()
+        start = snapshots[-1] if snapshots else 0
+        if snapshots:
+            yield from read_records(os.path.join(self.path, SNAPSHOT_PATTERN.format(start)))
+
+        for segment in self.segments():
+            if segment >= start:
+                yield from read_records(os.path.join(self.path, SEGMENT_PATTERN.format(segment)))
+
+    def open(self):
+        """Start a fresh segment after the existing ones and start the flusher thread."""
+        existing = self.segments() + self.snapshots()
+        self.segment = max(existing) + 1 if existing else 0
+        self.file = open(os.path.join(self.path, SEGMENT_PATTERN.format(self.segment)), "ab")
+
+        self.flusher = threading.Thread(target=self.flush_loop, name="wal-flusher", daemon=True)
+        self.flusher.start()
+
+    def append(self, record_type: RecordType, payload: bytes) -> int:
+        """Buffer a record and return its log sequence number, to be passed to wait()."""
+        record = frame(record_type, payload)
+        with self.lock:
+            self.buffer.append(record)
+            self.appended_lsn += 1
+            self.appended.notify()
+            return self.appended_lsn
+
+    def wait(self, lsn: int):
+        """Block until the record with the given log sequence number is durable."""
+        with self.lock:
+            while self.durable_lsn < lsn:
+                if self.error is not None:
+                    raise IOError("write-ahead log flush failed") from self.error
+                self.flushed.wait()
+
+    def flush_loop(self):
+        while True:
+            with self.lock:
+                while not self.buffer and not self.closed:
+                    self.appended.wait()
+                if not self.buffer:
+                    return
+
+            # Give concurrent requests a moment to join this batch
+            if self.group_commit_delay:
+                time.sleep(self.group_commit_delay)
+
+            try:
+                with self.file_lock:
+                    self.write_batch()
+            except Exception as e:
+                with self.lock:
+                    self.error = e
+                    self.flushed.notify_all()
+                return
+
+    def write_batch(self):
+        """Write and fsync everything buffered so far. Must be called while holding the file lock."""
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            lsn = self.appended_lsn
+
+        if batch:
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+        with self.lock:
+            self.durable_lsn = lsn
+            self.flushed.notify_all()
+
+        self.records_in_segment += len(batch)
+        if self.snapshot_every and self.records_in_segment >= self.snapshot_every:
+            self.snapshot_needed.set()
+
+    def rotate(self) -> int:
+        """
+        Make everything buffered so far durable in the current segment and start a new one.
+
+        Must be called while no records can be appended (the storage holds all of its locks),
+        so that the new segment number marks an exact point in the log. Returns the new segment number.
+        """
+        with self.file_lock:
+            self.write_batch()
+            self.file.close()
+
+            self.segment += 1
+            self.records_in_segment = 0
+            self.snapshot_needed.clear()
+            self.file = open(os.path.join(self.path, SEGMENT_PATTERN.format(self.segment)), "ab")
+            return self.segment
+
+    def write_snapshot(self, segment: int, records: Iterable[tuple[RecordType, bytes]]):
+        """
+        Write the snapshot of the state as of the start of a segment, then drop the segments and snapshots before it.
+
+        The snapshot is written to a temporary file and renamed into place, so a crash never leaves a partial one,
+        and the directory is fsynced before the segments it replaces are removed.
+        """
+        path = os.path.join(self.path, SNAPSHOT_PATTERN.format(segment))
+        with open(path + ".tmp", "wb") as f:
+            for record_type, payload in records:
+                f.write(frame(record_type, payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        # The rename is only durable once the directory entry is
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        for old in self.segments():
+            if old < segment:
+                os.remove(os.path.join(self.path, SEGMENT_PATTERN.format(old)))
+        for old in self.snapshots():
+            if old < segment:
+                os.remove(os.path.join(self.path, SNAPSHOT_PATTERN.format(old)))
+
+    def close(self):
+        """Flush what is left and stop the flusher thread."""
+        with self.lock:
+            self.closed = True
+            self.appended.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+        if self.file is not None:
+            self.file.close()
@@ -0,0 +1,173 @@
+"""
+This file tests admission control under load: inbox quotas and the server's budget of message bytes.
+
+A ChatServer with a small quota and budget is served on the port after the metrics test's. The test cases fill an inbox
+past its quota, then flood the server from many threads until it runs out of space, and check that sends are turned
+away with RESOURCE_EXHAUSTED and a retry-after hint while other requests keep being served quickly.
+"""
+
+import threading
+import time
+import uuid
+import pytest
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from admission import REFRESH_INTERVAL, Admission
+from config import LOCALHOST, SERVER_PORT
+from metrics import MetricsInterceptor
+from server import ChatServer
+
+SERVER_ADDR = f"{LOCALHOST}:{SERVER_PORT + 6}"
+INBOX_QUOTA = 50
+BUDGET = 64 * 1024
+BODY = "x" * 1024
+NUM_FLOODERS = 8
+
+
+@pytest.fixture()
+def admission_stub(monkeypatch):
+    """Fixture to serve a server with a small inbox quota and budget, and connect to it."""
+    monkeypatch.setattr("server.DEBUG", False)
+
+    chat_server = ChatServer()
+    chat_server.admission = Admission(chat_server.storage, INBOX_QUOTA, BUDGET, high_watermark=0.5, retry_after=1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=NUM_FLOODERS + 4),
+                         interceptors=[MetricsInterceptor(chat_server.metrics)])
+    add_ChatServicer_to_server(chat_server, server)
+    server.add_insecure_port(SERVER_ADDR)
+    server.start()
+
+    channel = grpc.insecure_channel(SERVER_ADDR)
+    yield ChatStub(channel), chat_server
+
+    channel.close()
+    server.stop(None)
+    chat_server.close()
+
+
+def create_users(stub: ChatStub, usernames: list[str]):
+    for username in usernames:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username=username, password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+
+def send(stub: ChatStub, recipient: str, body: str = "") -> Message:
+    """Utility function that sends a message from "flooder" and returns it."""
+    msg = Message(id=uuid.uuid4().bytes, sender="flooder", recipient=recipient, body=body, timestamp=time.time())
+    stub.SendMessage(SendMessageRequest(username="flooder", message=msg))
+    return msg
+
+
+def test_inbox_quota(admission_stub):
+    stub, chat_server = admission_stub
+    create_users(stub, ["flooder", "crowded"])
+
+    # ========================================== TEST ========================================== #
+    msgs = [send(stub, "crowded") for _ in range(INBOX_QUOTA)]
+
+    with pytest.raises(grpc.RpcError) as e:
+        send(stub, "crowded")
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert e.value.details() == "Send message failed: the inbox of \"crowded\" is full, retry in 1 s."
+    assert ("retry-after", "1") in e.value.trailing_metadata()
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Deleting a message makes room for one more
+    stub.DeleteMessages(DeleteMessagesRequest(username="crowded", message_ids=[msgs[0].id]))
+    send(stub, "crowded")
+    assert chat_server.storage.inbox_size("crowded") == INBOX_QUOTA
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A bulk send counts the messages it has not stored yet against the quota, so one batch cannot overfill an inbox
+    create_users(stub, ["roomy"])
+    send(stub, "roomy")
+    resp = stub.SendMessages(iter([SendMessagesRequest(
+        username="flooder", messages=[Message(id=uuid.uuid4().bytes, sender="flooder", recipient="roomy",
+                                              timestamp=time.time()) for _ in range(INBOX_QUOTA)])]))
+    assert [result.status for result in resp.results] == [Status.SUCCESS] * (INBOX_QUOTA - 1) + [Status.ERROR]
+    assert resp.results[-1].error_message == "Send message failed: the inbox of \"roomy\" is full, retry in 1 s."
+    assert chat_server.storage.inbox_size("roomy") == INBOX_QUOTA
+    # ========================================================================================== #
+
+
+def test_memory_budget(admission_stub):
+    """
+    This test case tests the following:
+    1. Bulk sends are turned away past the high watermark, one message at a time, while single sends still pass.
+    2. Flooding the server from many threads fills the budget, and no further, and sends are then turned away.
+    3. Other requests are served quickly all along.
+    4. Freeing space lets sends through again.
+    """
+    stub, chat_server = admission_stub
+    usernames = [f"sink{i}" for i in range(NUM_FLOODERS)]
+    create_users(stub, ["flooder"] + usernames)
+
+    def bulk(count: int) -> SendMessagesRequest:
+        return SendMessagesRequest(username="flooder",
+                                   messages=[Message(id=uuid.uuid4().bytes, sender="flooder",
+                                                     recipient=usernames[i % NUM_FLOODERS], body=BODY,
+                                                     timestamp=time.time()) for i in range(count)])
+
+    # ========================================== TEST ========================================== #
+    resp = stub.SendMessages(iter([bulk(40)]))
+    half = BUDGET // 2 // len(BODY)
+    assert [result.status for result in resp.results] == [Status.SUCCESS] * half + [Status.ERROR] * (40 - half)
+    assert resp.results[-1].error_message == "Send message failed: the server is out of space for messages, " \
+                                             "retry in 1 s."
+    send(stub, usernames[0], BODY)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    rejected, errors, latencies = [], [], []
+    flooding = threading.Event()
+    flooding.set()
+
+    def flooder(username: str):
+        try:
+            while True:
+                send(stub, username, BODY)
+        except grpc.RpcError as e:
+            rejected.append(e)
+        except Exception as e:
+            errors.append(e)
+
+    def prober():
+        while flooding.is_set():
+            start = time.perf_counter()
+            assert stub.Echo(EchoRequest(message="ping")).message == "ping"
+            assert stub.GetMessages(GetMessagesRequest(username="flooder", limit=1)).status == Status.SUCCESS
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=flooder, args=(username,)) for username in usernames]
+    probe = threading.Thread(target=prober)
+    probe.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    flooding.clear()
+    probe.join()
+
+    assert errors == []
+    assert len(rejected) == NUM_FLOODERS
+    assert all(e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED for e in rejected)
+    assert all(e.details().startswith("Send message failed: the server is out of space") for e in rejected)
+    assert BUDGET - len(BODY) < chat_server.storage.message_bytes <= BUDGET + NUM_FLOODERS * len(BODY)
+    assert latencies and max(latencies) < 1.0
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    for username in usernames:
+        resp = stub.GetMessages(GetMessagesRequest(username=username))
+        stub.DeleteMessages(DeleteMessagesRequest(username=username, message_ids=[msg.id for msg in resp.messages]))
+    time.sleep(REFRESH_INTERVAL)
+
+    send(stub, usernames[0], BODY)
+    assert stub.SendMessages(iter([bulk(1)])).status == Status.SUCCESS
+    assert chat_server.admission.rejected == 40 - half + NUM_FLOODERS
+    # ========================================================================================== #
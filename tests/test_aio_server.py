@@ -0,0 +1,96 @@
+"""
+This file tests the asyncio variant of the server.
+
+An AsyncChatServer is served with grpc.aio on an event loop in a background thread, on the port next to the one the
+integration tests use. The test case drives it with a regular client stub, including an open message stream.
+"""
+
+import asyncio
+import threading
+import uuid
+import pytest
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from server import AsyncChatServer
+from sessions import AioSessionInterceptor, SessionTokens
+
+
+@pytest.fixture()
+def aio_stub():
+    """Fixture to serve an AsyncChatServer on a background event loop and connect to it."""
+    server_addr = f"{LOCALHOST}:{SERVER_PORT + 1}"
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+
+    async def start():
+        chat_server = AsyncChatServer()
+        server = grpc.aio.server(interceptors=[AioSessionInterceptor(chat_server.sessions)])
+        add_ChatServicer_to_server(chat_server, server)
+        server.add_insecure_port(server_addr)
+        await server.start()
+        return chat_server, server
+
+    chat_server, server = asyncio.run_coroutine_threadsafe(start(), loop).result(timeout=5)
+    channel = grpc.insecure_channel(server_addr)
+    yield ChatStub(grpc.intercept_channel(channel, SessionTokens()))
+
+    channel.close()
+    asyncio.run_coroutine_threadsafe(server.stop(None), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    chat_server.close()
+
+
+def test_aio_server(aio_stub):
+    """
+    This test case tests the following:
+    1. Create accounts and send a message through the asyncio server.
+    2. Receive the message as a replay and as a pushed event on a message stream.
+    3. Retrieve the messages with a GetMessages request.
+    """
+    # ========================================== TEST ========================================== #
+    for username in ["aio1", "aio2"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert aio_stub.Authenticate(req).status == Status.SUCCESS
+
+    msg1 = Message(id=uuid.UUID(int=1).bytes,
+                   sender="aio1",
+                   recipient="aio2",
+                   body="hello aio2!",
+                   timestamp=1)
+    resp = aio_stub.SendMessage(SendMessageRequest(username="aio1", message=msg1))
+    assert resp == SendMessageResponse(status=Status.SUCCESS)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    events = aio_stub.SubscribeMessages(SubscribeMessagesRequest(username="aio2"), timeout=5)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.NEW, message=msg1)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.SYNCED, seq=1)
+
+    msg2 = Message(id=uuid.UUID(int=2).bytes,
+                   sender="aio1",
+                   recipient="aio2",
+                   body="still there?",
+                   timestamp=2)
+    aio_stub.SendMessage(SendMessageRequest(username="aio1", message=msg2))
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.NEW, message=msg2, seq=2)
+
+    events.cancel()
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="aio2")
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              messages=[msg1, msg2],
+                              seq=2,
+                              full_sync=True)
+
+    resp = aio_stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
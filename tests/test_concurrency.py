@@ -0,0 +1,125 @@
+"""
+This file stress tests the thread safety of the server state.
+
+The request handlers of a ChatServer are called directly from many threads at once, the way the gRPC thread pool calls
+them when it runs with more than one worker. Senders keep sending messages to a set of users while each user's owner
+thread reads and deletes its messages, and deletes and recreates its account.
+
+Afterwards, the test checks that no handler failed and that the invariants the handlers assert still hold.
+"""
+
+import random
+import threading
+import uuid
+import pytest
+
+import server
+
+from protos.chat_pb2 import *
+from metrics import MetricsInterceptor
+from server import ChatServer
+from storage import MemoryStorage, SqliteStorage
+
+NUM_USERS = 8
+NUM_SENDERS = 8
+MESSAGES_PER_SENDER = 500
+OWNER_ROUNDS = 50
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def chat_server(request, monkeypatch, tmp_path):
+    """
+    Fixture to create a server without debug logging on each storage backend.
+    The in-memory storage gets fewer shards than users to force lock sharing.
+    """
+    monkeypatch.setattr(server, "DEBUG", False)
+    if request.param == "memory":
+        chat_server = ChatServer(MemoryStorage(4))
+    else:
+        chat_server = ChatServer(SqliteStorage(str(tmp_path / "chat.db"), fsync=False))
+    yield chat_server
+    chat_server.close()
+
+
+def test_concurrent_send_delete(chat_server):
+    usernames = [f"hammer{i}" for i in range(NUM_USERS)]
+    for username in usernames:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert chat_server.Authenticate(req, None).status == Status.SUCCESS
+
+    errors = []
+    inbound = [0] * (NUM_SENDERS + NUM_USERS)
+
+    def call(slot, handler, req):
+        """Call a handler through the metrics interceptor, like the gRPC server does."""
+        inbound[slot] += req.ByteSize()
+        stats = chat_server.metrics.method(handler.__name__)
+        return MetricsInterceptor.unary_unary(handler, stats)(req, None)
+
+    def sender(slot):
+        rng = random.Random(slot)
+        try:
+            for i in range(MESSAGES_PER_SENDER):
+                msg = Message(id=uuid.uuid4().bytes,
+                              sender=f"sender{slot}",
+                              recipient=rng.choice(usernames),
+                              body=f"message {i}",
+                              timestamp=rng.random())
+                call(slot, chat_server.SendMessage, SendMessageRequest(username=f"sender{slot}", message=msg))
+        except Exception as e:
+            errors.append(e)
+
+    def owner(slot, username):
+        try:
+            for i in range(OWNER_ROUNDS):
+                # Read and delete everything that arrived so far
+                resp = call(slot, chat_server.GetMessages, GetMessagesRequest(username=username))
+                unread_ids = [msg.id for msg in resp.messages if not msg.read]
+                call(slot, chat_server.ReadMessages, ReadMessagesRequest(username=username, message_ids=unread_ids))
+
+                message_ids = [msg.id for msg in resp.messages]
+                call(slot, chat_server.DeleteMessages, DeleteMessagesRequest(username=username,
+                                                                             message_ids=message_ids))
+
+                # Every few rounds, delete the account with whatever is in the inbox and recreate it
+                if i % 10 == 9:
+                    call(slot, chat_server.DeleteUser, DeleteUserRequest(username=username))
+                    req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                                      username=username,
+                                      password="password")
+                    assert call(slot, chat_server.Authenticate, req).status == Status.SUCCESS
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(NUM_SENDERS)]
+    threads += [threading.Thread(target=owner, args=(NUM_SENDERS + i, username))
+                for i, username in enumerate(usernames)]
+    inbound_before = chat_server.metrics.request_bytes
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+    # No traffic was lost to racing metrics updates
+    assert chat_server.metrics.request_bytes - inbound_before == sum(inbound)
+
+    # Every inbox entry is a stored message addressed to its owner, and every stored message is in an inbox
+    users, messages = chat_server.storage.users, chat_server.storage.messages
+    assert sorted(users) == usernames
+
+    inbox_ids = set()
+    for username, user in users.items():
+        for message_id, timestamp in user.message_ids.items():
+            assert message_id in messages
+            assert messages[message_id].recipient == username
+            assert messages[message_id].timestamp == timestamp
+        assert user.page()[0] == sorted(user.message_ids, key=lambda message_id: (user.message_ids[message_id],
+                                                                                   message_id))
+        inbox_ids.update(user.message_ids)
+
+    assert inbox_ids == set(messages)
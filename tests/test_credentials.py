@@ -0,0 +1,67 @@
+"""
+This file tests the password hashing of the server.
+
+The test cases check that passwords are stored salted and verified on the process pool, that verified logins are
+served from the cache until the stored hash changes, and that failed logins are not cached.
+"""
+
+import time
+
+from credentials import Credentials, hash_password, verify_password
+
+# A low cost, so that the tests run fast
+COST = (1024, 8, 1)
+
+
+def test_hash_password():
+    # ========================================== TEST ========================================== #
+    stored = hash_password("password", *COST)
+    assert stored.startswith("scrypt$1024$8$1$") and "password" not in stored
+    assert hash_password("password", *COST) != stored
+    assert verify_password("password", stored)
+    assert not verify_password("wrong", stored)
+    # ========================================================================================== #
+
+
+def test_credentials():
+    credentials = Credentials(*COST, workers=2, cache_ttl=60, cache_max_entries=2)
+    try:
+        # ========================================== TEST ========================================== #
+        stored = credentials.hash("password")
+        assert verify_password("password", stored)
+        assert credentials.verify("alice", "password", stored)
+        assert credentials.cache_hits == 0
+        assert credentials.verify("alice", "password", stored)
+        assert credentials.cache_hits == 1
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        # A wrong password misses the cache, and so does the right one against another stored hash
+        assert not credentials.verify("alice", "wrong", stored)
+        other = credentials.hash("password")
+        assert credentials.verify("alice", "password", other)
+        assert not credentials.verify("bob", "wrong", other)
+        assert credentials.cache_hits == 1
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        # Passwords stored before hashing are compared as they are
+        assert credentials.verify("carol", "legacy", "legacy")
+        assert not credentials.verify("carol", "wrong", "legacy")
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        # The cache holds at most cache_max_entries logins, for cache_ttl seconds
+        for username in ["dave", "erin", "frank"]:
+            assert credentials.verify(username, "password", stored)
+        assert list(credentials.cache) == ["erin", "frank"]
+
+        credentials.cache_ttl = 0.05
+        assert credentials.verify("grace", "password", stored)
+        time.sleep(0.1)
+        hits = credentials.cache_hits
+        assert credentials.verify("grace", "password", stored)
+        assert credentials.cache_hits == hits
+        # ========================================================================================== #
+    finally:
+        credentials.close()
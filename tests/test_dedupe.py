@@ -0,0 +1,80 @@
+"""
+This file tests the cache that makes retried requests idempotent.
+
+The test cases check that a duplicate gets the first result without running again, also while the first call is still
+running, and that entries are evicted by age and by count.
+"""
+
+import threading
+import time
+import pytest
+
+from dedupe import DedupeCache
+
+
+def test_duplicates():
+    cache = DedupeCache(max_entries=10, window=60)
+    calls = []
+
+    def call(value):
+        calls.append(value)
+        return value
+
+    # ========================================== TEST ========================================== #
+    assert cache.run(b"a", lambda: call(1)) == 1
+    assert cache.run(b"a", lambda: call(2)) == 1
+    assert cache.run(b"b", lambda: call(3)) == 3
+    assert calls == [1, 3]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A duplicate of a running call waits for its result
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return "slow"
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.run(b"c", slow)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(cache.run(b"c", lambda: call(4))))
+    second.start()
+    release.set()
+    first.join()
+    second.join()
+    assert results == ["slow", "slow"] and 4 not in calls
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A call that raises is not remembered
+    with pytest.raises(ValueError):
+        cache.run(b"d", lambda: int("not a number"))
+    assert cache.run(b"d", lambda: call(5)) == 5
+
+    # So is a result that is not kept
+    assert cache.run(b"e", lambda: call(6), keep=lambda value: value > 6) == 6
+    assert cache.run(b"e", lambda: call(7), keep=lambda value: value > 6) == 7
+    assert cache.run(b"e", lambda: call(8)) == 7
+    # ========================================================================================== #
+
+
+def test_eviction():
+    # ========================================== TEST ========================================== #
+    cache = DedupeCache(max_entries=3, window=60)
+    for i in range(5):
+        cache.run(bytes([i]), lambda: i)
+    assert len(cache) == 3
+    assert cache.run(bytes([0]), lambda: "again") == "again"
+    assert cache.run(bytes([4]), lambda: "again") == 4
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    cache = DedupeCache(max_entries=3, window=0.05)
+    cache.run(b"a", lambda: 1)
+    time.sleep(0.1)
+    assert cache.run(b"a", lambda: 2) == 2
+    assert len(cache) == 1
+    # ========================================================================================== #
@@ -16,6 +16,10 @@ import subprocess
 from protos.chat_pb2 import *
 from protos.chat_pb2_grpc import *
 from config import LOCALHOST, SERVER_PORT
+from sessions import SessionTokens
+
+# Session tokens of the users the tests log in, kept across test cases like the server
+TOKENS = SessionTokens()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -53,7 +57,7 @@ def start_server():
 def stub():
     """Fixture to create and close a GRPC channels connection before and after each test."""
     channel = grpc.insecure_channel(f"{LOCALHOST}:{SERVER_PORT}")
-    stub = ChatStub(channel)
+    stub = ChatStub(grpc.intercept_channel(channel, TOKENS))
     print("client connected to the server")
     yield stub
     channel.close()
@@ -82,10 +86,8 @@ def test_auth(stub):
     req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
                       username="user1",
                       password="password")
-    exp = AuthResponse(status=Status.SUCCESS)
-
     resp = stub.Authenticate(req)
-    assert resp == exp
+    assert resp.status == Status.SUCCESS and resp.session_token
     # ========================================================================================== #
 
     # ========================================== TEST ========================================== #
@@ -122,10 +124,8 @@ def test_send_and_get(stub):
     req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
                       username="user2",
                       password="password")
-    exp = AuthResponse(status=Status.SUCCESS)
-
     resp = stub.Authenticate(req)
-    assert resp == exp
+    assert resp.status == Status.SUCCESS and resp.session_token
     # ========================================================================================== #
 
     # ========================================== TEST ========================================== #
@@ -174,7 +174,9 @@ def test_send_and_get(stub):
     # ========================================== TEST ========================================== #
     req = GetMessagesRequest(username="user1")
     exp = GetMessagesResponse(status=Status.SUCCESS,
-                              messages=[])
+                              messages=[],
+                              seq=0,
+                              full_sync=True)
 
     resp = stub.GetMessages(req)
     assert resp == exp
@@ -183,7 +185,9 @@ def test_send_and_get(stub):
     # ========================================== TEST ========================================== #
     req = GetMessagesRequest(username="user2")
     exp = GetMessagesResponse(status=Status.SUCCESS,
-                              messages=[msg1, msg2])
+                              messages=[msg1, msg2],
+                              seq=2,
+                              full_sync=True)
 
     resp = stub.GetMessages(req)
     assert resp == exp
@@ -195,6 +199,8 @@ def test_list_users(stub):
     This test case tests the following:
     1. List all users of the form user*.
     2. List all users of the form a*.
+    3. Page through the users of the form user* one at a time.
+    4. Reject a malformed page token.
     """
     # ========================================== TEST ========================================== #
     req = ListUsersRequest(username="user1", pattern="user*")
@@ -213,6 +219,32 @@ def test_list_users(stub):
     assert resp == exp
     # ========================================================================================== #
 
+    # ========================================== TEST ========================================== #
+    req = ListUsersRequest(username="user1", pattern="user*", limit=1)
+    exp = ListUsersResponse(status=Status.SUCCESS,
+                            usernames=["user1"],
+                            next_page_token=b"user1")
+
+    resp = stub.ListUsers(req)
+    assert resp == exp
+
+    req = ListUsersRequest(username="user1", pattern="user*", limit=1, page_token=resp.next_page_token)
+    exp = ListUsersResponse(status=Status.SUCCESS,
+                            usernames=["user2"])
+
+    resp = stub.ListUsers(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = ListUsersRequest(username="user1", pattern="user*", page_token=b"\xff")
+    exp = ListUsersResponse(status=Status.ERROR,
+                            error_message="List users failed: invalid page token.")
+
+    resp = stub.ListUsers(req)
+    assert resp == exp
+    # ========================================================================================== #
+
 
 def test_read_messages(stub):
     """
@@ -278,7 +310,9 @@ def test_delete_messages(stub):
     # ========================================== TEST ========================================== #
     req = GetMessagesRequest(username="user2")
     exp = GetMessagesResponse(status=Status.SUCCESS,
-                              messages=[])
+                              messages=[],
+                              seq=6,
+                              full_sync=True)
 
     resp = stub.GetMessages(req)
     assert resp == exp
@@ -330,10 +364,8 @@ def test_delete_user(stub):
     req = AuthRequest(action_type=AuthRequest.ActionType.LOGIN,
                       username="user1",
                       password="password")
-    exp = AuthResponse(status=Status.SUCCESS)
-
     resp = stub.Authenticate(req)
-    assert resp == exp
+    assert resp.status == Status.SUCCESS and resp.session_token
     # ========================================================================================== #
 
     # ========================================== TEST ========================================== #
@@ -349,3 +381,536 @@ def test_delete_user(stub):
     resp = stub.SendMessage(req)
     assert resp == exp
     # ========================================================================================== #
+
+
+def test_subscribe_messages(stub):
+    """
+    This test case tests the following:
+    1. Subscribe as a user that isn't logged in.
+    2. Subscribe to an inbox that already holds a message and receive it as a replay.
+    3. Receive a pushed event for a new message, a read message, and a deleted message.
+    """
+    for username in ["subscriber", "publisher"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    # ========================================== TEST ========================================== #
+    # Users who are not logged in have no session
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="ghost"), timeout=5)
+
+    with pytest.raises(grpc.RpcError) as e:
+        next(events)
+    assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg1 = Message(id=uuid.UUID(int=101).bytes,
+                   sender="publisher",
+                   recipient="subscriber",
+                   body="sent before subscribing",
+                   timestamp=1)
+    stub.SendMessage(SendMessageRequest(username="publisher", message=msg1))
+
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="subscriber"), timeout=5)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.NEW, message=msg1)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.SYNCED, seq=1)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg2 = Message(id=uuid.UUID(int=102).bytes,
+                   sender="publisher",
+                   recipient="subscriber",
+                   body="sent while subscribed",
+                   timestamp=2)
+    stub.SendMessage(SendMessageRequest(username="publisher", message=msg2))
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.NEW, message=msg2, seq=2)
+
+    stub.ReadMessages(ReadMessagesRequest(username="subscriber", message_ids=[msg2.id]))
+    read_msg2 = Message()
+    read_msg2.CopyFrom(msg2)
+    read_msg2.read = True
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.READ, message=read_msg2, seq=3)
+
+    stub.DeleteMessages(DeleteMessagesRequest(username="subscriber", message_ids=[msg1.id, msg2.id]))
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.DELETED, message=Message(id=msg1.id), seq=4)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.DELETED, message=Message(id=msg2.id), seq=5)
+
+    events.cancel()
+    # ========================================================================================== #
+
+
+def test_get_messages_delta(stub):
+    """
+    This test case tests the following:
+    1. A full sync returns the whole inbox and its sequence number.
+    2. A delta sync with an up-to-date sequence number returns nothing.
+    3. A delta sync returns only the messages added, read, or deleted after the given sequence number.
+    """
+    for username in ["deltasender", "deltarecipient"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    msgs = [Message(id=uuid.UUID(int=200 + i).bytes,
+                    sender="deltasender",
+                    recipient="deltarecipient",
+                    body=f"message {i}",
+                    timestamp=i) for i in range(3)]
+    for msg in msgs[:2]:
+        stub.SendMessage(SendMessageRequest(username="deltasender", message=msg))
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="deltarecipient")
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              messages=msgs[:2],
+                              seq=2,
+                              full_sync=True)
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="deltarecipient", since_seq=2)
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              seq=2)
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    stub.SendMessage(SendMessageRequest(username="deltasender", message=msgs[2]))
+    stub.ReadMessages(ReadMessagesRequest(username="deltarecipient", message_ids=[msgs[0].id]))
+    stub.DeleteMessages(DeleteMessagesRequest(username="deltarecipient", message_ids=[msgs[1].id]))
+
+    read_msg0 = Message()
+    read_msg0.CopyFrom(msgs[0])
+    read_msg0.read = True
+
+    req = GetMessagesRequest(username="deltarecipient", since_seq=2)
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              messages=[msgs[2], read_msg0],
+                              deleted_ids=[msgs[1].id],
+                              seq=5)
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+
+def test_get_messages_paged(stub):
+    """
+    This test case tests the following:
+    1. Page through an inbox oldest first, regardless of the order the messages were sent in.
+    2. Page through an inbox newest first.
+    3. Request a page with an invalid page token.
+    """
+    for username in ["pagesender", "pagerecipient"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    msgs = [Message(id=uuid.UUID(int=300 + i).bytes,
+                    sender="pagesender",
+                    recipient="pagerecipient",
+                    body=f"message {i}",
+                    timestamp=i) for i in range(5)]
+    for i in [3, 0, 4, 1, 2]:
+        stub.SendMessage(SendMessageRequest(username="pagesender", message=msgs[i]))
+
+    # ========================================== TEST ========================================== #
+    pages = []
+    page_token = b""
+    while True:
+        req = GetMessagesRequest(username="pagerecipient", limit=2, page_token=page_token)
+        resp = stub.GetMessages(req)
+        assert resp.status == Status.SUCCESS and resp.full_sync and resp.seq == 5
+
+        pages.append(list(resp.messages))
+        page_token = resp.next_page_token
+        if not page_token:
+            break
+
+    assert pages == [msgs[0:2], msgs[2:4], msgs[4:5]]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="pagerecipient",
+                             limit=3,
+                             direction=GetMessagesRequest.Direction.NEWEST_FIRST)
+    resp = stub.GetMessages(req)
+    assert list(resp.messages) == [msgs[4], msgs[3], msgs[2]]
+
+    req = GetMessagesRequest(username="pagerecipient",
+                             limit=3,
+                             page_token=resp.next_page_token,
+                             direction=GetMessagesRequest.Direction.NEWEST_FIRST)
+    resp = stub.GetMessages(req)
+    assert list(resp.messages) == [msgs[1], msgs[0]]
+    assert resp.next_page_token == b""
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="pagerecipient", page_token=b"garbage")
+    exp = GetMessagesResponse(status=Status.ERROR,
+                              error_message="Get messages failed: invalid page token.")
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+
+def test_send_message_retry(stub):
+    """
+    This test case tests the following:
+    1. A retried send gets the response of the first send, and the message is stored once.
+    2. A retried send that failed runs again.
+    3. A send from another user with the same message ID is not answered with the first sender's response.
+    """
+    for username in ["retrysender", "retryrecipient"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        stub.Authenticate(req)
+
+    # ========================================== TEST ========================================== #
+    msg = Message(id=uuid.uuid4().bytes, sender="retrysender", recipient="retryrecipient", body="once", timestamp=2500)
+    req = SendMessageRequest(username="retrysender", message=msg)
+
+    assert stub.SendMessage(req) == SendMessageResponse(status=Status.SUCCESS)
+    assert stub.SendMessage(req) == SendMessageResponse(status=Status.SUCCESS)
+
+    resp = stub.GetMessages(GetMessagesRequest(username="retryrecipient"))
+    assert resp == GetMessagesResponse(status=Status.SUCCESS, messages=[msg], seq=1, full_sync=True)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg = Message(id=uuid.uuid4().bytes, sender="retrysender", recipient="retryghost", timestamp=2501)
+    req = SendMessageRequest(username="retrysender", message=msg)
+    exp = SendMessageResponse(status=Status.ERROR,
+                              error_message="Send message failed: recipient \"retryghost\" does not exist.")
+
+    assert stub.SendMessage(req) == exp
+    assert stub.SendMessage(req) == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg = Message(id=uuid.uuid4().bytes, sender="retrysender", recipient="retryrecipient", body="mine", timestamp=2502)
+    assert stub.SendMessage(SendMessageRequest(username="retrysender", message=msg)).status == Status.SUCCESS
+
+    msg = Message(id=msg.id, sender="retryrecipient", recipient="retryghost", timestamp=2503)
+    exp = SendMessageResponse(status=Status.ERROR,
+                              error_message="Send message failed: recipient \"retryghost\" does not exist.")
+
+    assert stub.SendMessage(SendMessageRequest(username="retryrecipient", message=msg)) == exp
+    # ========================================================================================== #
+
+
+def test_send_messages(stub):
+    """
+    This test case tests the following:
+    1. Send a stream of message batches, some messages invalid, and get one result per message in order.
+    2. The valid messages are all delivered, in order.
+    3. An empty stream succeeds with no results.
+    4. Messages replayed by a stream fail on their own.
+    """
+    for username in ["bulksender", "bulkrecipient"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        stub.Authenticate(req)
+
+    # ========================================== TEST ========================================== #
+    msgs = [Message(id=uuid.uuid4().bytes,
+                    sender="bulksender",
+                    recipient="bulkrecipient",
+                    body=f"bulk message {i}",
+                    timestamp=3000 + i) for i in range(5)]
+    ghost_msg = Message(id=uuid.uuid4().bytes, sender="bulksender", recipient="bulkghost", timestamp=3005)
+    forged_msg = Message(id=uuid.uuid4().bytes, sender="bulkrecipient", recipient="bulksender", timestamp=3006)
+
+    reqs = [SendMessagesRequest(username="bulksender", messages=msgs[:2] + [ghost_msg]),
+            SendMessagesRequest(username="bulksender", messages=[forged_msg] + msgs[2:])]
+    ghost_error = "Send message failed: recipient \"bulkghost\" does not exist."
+    forged_error = "Send message failed: sender does not match the requesting user."
+    exp = SendMessagesResponse(status=Status.ERROR,
+                               error_message="Send messages failed: 2 of 7 messages were not sent.",
+                               results=[SendMessageResponse(status=Status.SUCCESS)] * 2 +
+                                       [SendMessageResponse(status=Status.ERROR, error_message=ghost_error),
+                                        SendMessageResponse(status=Status.ERROR, error_message=forged_error)] +
+                                       [SendMessageResponse(status=Status.SUCCESS)] * 3)
+
+    resp = stub.SendMessages(iter(reqs))
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetMessagesRequest(username="bulkrecipient")
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              messages=msgs,
+                              seq=5,
+                              full_sync=True)
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    resp = stub.SendMessages(iter([]))
+    assert resp == SendMessagesResponse(status=Status.SUCCESS)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Replaying the stream fails the messages already sent, one by one, and stores the new one
+    new_msg = Message(id=uuid.uuid4().bytes, sender="bulksender", recipient="bulkrecipient", timestamp=3007)
+    resp = stub.SendMessages(iter([SendMessagesRequest(username="bulksender", messages=msgs[:2] + [new_msg])]))
+    duplicate_error = "Send message failed: a message with this ID was already sent."
+    assert resp == SendMessagesResponse(status=Status.ERROR,
+                                        error_message="Send messages failed: 2 of 3 messages were not sent.",
+                                        results=[SendMessageResponse(status=Status.ERROR,
+                                                                     error_message=duplicate_error)] * 2 +
+                                                [SendMessageResponse(status=Status.SUCCESS)])
+    assert stub.GetMessages(GetMessagesRequest(username="bulkrecipient")).messages == msgs + [new_msg]
+    # ========================================================================================== #
+
+
+def test_groups(stub):
+    """
+    This test case tests the following:
+    1. Create a group, getting back the members without an account, and fail to create it twice.
+    2. Send a message to the group, and every member (the sender included) gets it as the recipient.
+    3. Read flags are per member.
+    4. Sending to a missing group, or to a group one is not a member of, fails.
+    """
+    for username in ["groupowner", "groupmember", "outsider"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        stub.Authenticate(req)
+
+    # ========================================== TEST ========================================== #
+    req = CreateGroupRequest(username="groupowner", group="friends", members=["groupmember", "groupghost"])
+    exp = CreateGroupResponse(status=Status.SUCCESS, unknown_members=["groupghost"])
+
+    resp = stub.CreateGroup(req)
+    assert resp == exp
+
+    exp = CreateGroupResponse(status=Status.ERROR, error_message="Create group failed: group \"friends\" already exists.")
+
+    resp = stub.CreateGroup(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg = Message(id=uuid.uuid4().bytes, sender="groupowner", group="friends", body="hello friends", timestamp=4000)
+    resp = stub.SendGroupMessage(SendGroupMessageRequest(username="groupowner", message=msg))
+    assert resp == SendGroupMessageResponse(status=Status.SUCCESS)
+
+    for username in ["groupowner", "groupmember"]:
+        received = Message()
+        received.CopyFrom(msg)
+        received.recipient = username
+
+        resp = stub.GetMessages(GetMessagesRequest(username=username))
+        assert resp == GetMessagesResponse(status=Status.SUCCESS, messages=[received], seq=1, full_sync=True)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    stub.ReadMessages(ReadMessagesRequest(username="groupmember", message_ids=[msg.id]))
+    assert stub.GetMessages(GetMessagesRequest(username="groupmember")).messages[0].read
+    assert not stub.GetMessages(GetMessagesRequest(username="groupowner")).messages[0].read
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    for username, group in [("outsider", "friends"), ("groupowner", "strangers")]:
+        other = Message(id=uuid.uuid4().bytes, sender=username, group=group, body="hi", timestamp=4001)
+        exp = SendGroupMessageResponse(status=Status.ERROR,
+                                       error_message=f"Send group message failed: group \"{group}\" does not exist "
+                                                     f"or \"{username}\" is not a member.")
+
+        resp = stub.SendGroupMessage(SendGroupMessageRequest(username=username, message=other))
+        assert resp == exp
+    # ========================================================================================== #
+
+
+def test_get_inbox_summary(stub):
+    """
+    This test case tests the following:
+    1. Get the counts of an inbox without its messages.
+    2. Reading a message updates the counts.
+    3. Getting the summary of a missing user fails.
+    """
+    for username in ["summarized", "summarizer"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        stub.Authenticate(req)
+
+    msgs = [Message(id=uuid.uuid4().bytes,
+                    sender="summarizer",
+                    recipient="summarized",
+                    body=f"counted message {i}",
+                    timestamp=5000 + i) for i in range(3)]
+    for msg in msgs:
+        stub.SendMessage(SendMessageRequest(username="summarizer", message=msg))
+
+    # ========================================== TEST ========================================== #
+    req = GetInboxSummaryRequest(username="summarized")
+    exp = GetInboxSummaryResponse(status=Status.SUCCESS, total=3, unread=3, unread_by_sender={"summarizer": 3}, seq=3)
+
+    resp = stub.GetInboxSummary(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    stub.ReadMessages(ReadMessagesRequest(username="summarized", message_ids=[msgs[0].id]))
+    exp = GetInboxSummaryResponse(status=Status.SUCCESS, total=3, unread=2, unread_by_sender={"summarizer": 2}, seq=4)
+
+    resp = stub.GetInboxSummary(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = GetInboxSummaryRequest(username="summaryghost")
+
+    with pytest.raises(grpc.RpcError) as e:
+        stub.GetInboxSummary(req)
+    assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+    # ========================================================================================== #
+
+
+def test_read_next(stub):
+    """
+    This test case tests the following:
+    1. Read the oldest unread messages in the order they arrived.
+    2. Reading when no message is unread returns no messages.
+    3. Reading zero messages or the messages of a user that isn't logged in fails.
+    """
+    for username in ["nextreader", "nextsender"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        stub.Authenticate(req)
+
+    msgs = [Message(id=uuid.uuid4().bytes,
+                    sender="nextsender",
+                    recipient="nextreader",
+                    body=f"queued message {i}",
+                    timestamp=6000 - i) for i in range(3)]
+    for msg in msgs:
+        stub.SendMessage(SendMessageRequest(username="nextsender", message=msg))
+
+    # ========================================== TEST ========================================== #
+    resp = stub.ReadNext(ReadNextRequest(username="nextreader", count=2))
+    for msg in msgs[:2]:
+        msg.read = True
+    assert resp == ReadNextResponse(status=Status.SUCCESS, messages=msgs[:2])
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    resp = stub.ReadNext(ReadNextRequest(username="nextreader", count=2))
+    msgs[2].read = True
+    assert resp == ReadNextResponse(status=Status.SUCCESS, messages=msgs[2:])
+
+    resp = stub.ReadNext(ReadNextRequest(username="nextreader", count=2))
+    assert resp == ReadNextResponse(status=Status.SUCCESS)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    resp = stub.ReadNext(ReadNextRequest(username="nextreader"))
+    assert resp == ReadNextResponse(status=Status.ERROR, error_message="Read next failed: count must be at least 1.")
+
+    with pytest.raises(grpc.RpcError) as e:
+        stub.ReadNext(ReadNextRequest(username="nextghost", count=1))
+    assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+    # ========================================================================================== #
+
+
+def test_sessions(stub):
+    """
+    This test case tests the following:
+    1. Calls without a session token, or with a forged one, are rejected.
+    2. A session cannot act as another user.
+    3. Requests that leave out the username act as the user of the session.
+    """
+    for username in ["sessionuser", "sessionother"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        resp = stub.Authenticate(req)
+        assert resp.status == Status.SUCCESS and resp.session_token
+
+    req = AuthRequest(action_type=AuthRequest.ActionType.LOGIN,
+                      username="sessionuser",
+                      password="password")
+    token = stub.Authenticate(req).session_token
+
+    # ========================================== TEST ========================================== #
+    with grpc.insecure_channel(f"{LOCALHOST}:{SERVER_PORT}") as channel:
+        plain_stub = ChatStub(channel)
+        for metadata in [(), (("authorization", "Bearer " + token[:-1]),), (("authorization", token),)]:
+            with pytest.raises(grpc.RpcError) as e:
+                plain_stub.GetInboxSummary(GetInboxSummaryRequest(username="sessionuser"), metadata=metadata)
+            assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+
+        metadata = (("authorization", "Bearer " + token),)
+        resp = plain_stub.GetInboxSummary(GetInboxSummaryRequest(username="sessionuser"), metadata=metadata)
+        assert resp.status == Status.SUCCESS
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        with pytest.raises(grpc.RpcError) as e:
+            plain_stub.DeleteUser(DeleteUserRequest(username="sessionother"), metadata=metadata)
+        assert e.value.code() == grpc.StatusCode.PERMISSION_DENIED
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        msg = Message(id=uuid.uuid4().bytes,
+                      sender="sessionuser",
+                      recipient="sessionother",
+                      body="sent without a username",
+                      timestamp=7000)
+        resp = plain_stub.SendMessage(SendMessageRequest(message=msg), metadata=metadata)
+        assert resp == SendMessageResponse(status=Status.SUCCESS)
+        # ========================================================================================== #
+
+    resp = stub.GetInboxSummary(GetInboxSummaryRequest(username="sessionother"))
+    assert resp.total == 1 and resp.unread_by_sender == {"sessionuser": 1}
+
+
+def test_delete_account(stub):
+    """
+    This test case tests deleting an account the way the GUI client does, with a channel of its own session tokens:
+    1. The delete request is sent while the client still holds the session token, and succeeds.
+    2. Signing out afterwards forgets the token, after which the same request is rejected.
+    """
+    tokens = SessionTokens()
+    with grpc.insecure_channel(f"{LOCALHOST}:{SERVER_PORT}") as channel:
+        client_stub = ChatStub(grpc.intercept_channel(channel, tokens))
+        for username in ["leaving", "staying"]:
+            req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                              username=username,
+                              password="password")
+            assert client_stub.Authenticate(req).status == Status.SUCCESS
+
+        # ========================================== TEST ========================================== #
+        resp = client_stub.DeleteUser(DeleteUserRequest(username="leaving"))
+        assert resp == DeleteUserResponse(status=Status.SUCCESS)
+        tokens.clear()
+
+        req = AuthRequest(action_type=AuthRequest.ActionType.LOGIN,
+                          username="leaving",
+                          password="password")
+        assert client_stub.Authenticate(req).status == Status.ERROR
+        # ========================================================================================== #
+
+        # ========================================== TEST ========================================== #
+        with pytest.raises(grpc.RpcError) as e:
+            client_stub.DeleteUser(DeleteUserRequest(username="staying"))
+        assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+        # ========================================================================================== #
@@ -0,0 +1,85 @@
+"""
+This file tests the load generator against a server, and the reproducibility of its requests.
+
+A ChatServer with the session interceptor is served on the port after the transport test's, and the load generator runs
+a few simulated users against it for a second. The test case checks the JSON report it writes. The other test case
+compares dry runs with the same seed, and the requests of users whose inboxes differ.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import uuid
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from loadgen import DEFAULT_MIX, SimulatedUser
+from server import ChatServer
+from sessions import SessionInterceptor
+
+PORT = SERVER_PORT + 9
+
+
+def test_loadgen(tmp_path, monkeypatch):
+    monkeypatch.setattr("server.DEBUG", False)
+    chat_server = ChatServer()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8),
+                         interceptors=[SessionInterceptor(chat_server.sessions)])
+    add_ChatServicer_to_server(chat_server, server)
+    server.add_insecure_port(f"{LOCALHOST}:{PORT}")
+    server.start()
+
+    # ========================================== TEST ========================================== #
+    output = tmp_path / "report.json"
+    subprocess.run([sys.executable, "loadgen.py", "--port", str(PORT), "--users", "4", "--processes", "2",
+                    "--duration", "1", "--think", "0.01", "--seed", "7", "--output", str(output)],
+                   check=True, timeout=60)
+    server.stop(None)
+    chat_server.close()
+
+    report = json.loads(output.read_text())
+    assert report["users"] == 4 and report["seed"] == 7
+    assert report["requests"] == sum(rpc["requests"] for rpc in report["rpcs"].values()) > 0
+    for rpc in report["rpcs"].values():
+        assert rpc["codes"] == {"OK": rpc["requests"]}
+        latency = rpc["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+
+    # Every simulated user has an account
+    assert all(chat_server.storage.get_password(f"loaduser{i}") is not None for i in range(4))
+    # ========================================================================================== #
+
+
+def test_loadgen_seed(tmp_path):
+    # ========================================== TEST ========================================== #
+    def dry_run(seed: int) -> str:
+        output = tmp_path / f"requests-{seed}.jsonl"
+        subprocess.run([sys.executable, "loadgen.py", "--dry-run", "--users", "3", "--requests", "50",
+                        "--seed", str(seed), "--output", str(output)], check=True, timeout=60)
+        return output.read_text()
+
+    first = dry_run(7)
+    assert len(first.splitlines()) == 150
+    assert dry_run(7) == first
+    assert dry_run(8) != first
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # The inbox only decides which IDs are read or deleted, not the rest of the requests
+    args = argparse.Namespace(prefix="loaduser", seed=7, users=3, mix=DEFAULT_MIX, think=0.1)
+    empty, full = SimulatedUser(0, args, None), SimulatedUser(0, args, None)
+    full.inbox = {uuid.uuid4().bytes: False for _ in range(100)}
+
+    def without_ids(requests: list[dict]) -> list[dict]:
+        for request in requests:
+            request["request"].pop("messageIds", None)
+        return requests
+
+    planned = full.plan(200)
+    assert any(request["request"].get("messageIds") for request in planned)
+    assert without_ids(planned) == without_ids(empty.plan(200))
+    # ========================================================================================== #
@@ -0,0 +1,89 @@
+"""
+This file tests the columnar message store that backs the in-memory storage.
+
+The test cases check that messages come back out of the columns exactly as they went in, across handle reuse,
+read flags, arena compaction, and copies.
+"""
+
+import uuid
+
+import storage.message_store
+
+from protos.chat_pb2 import *
+from storage.message_store import MessageStore
+
+
+def make_message(i: int, body: str = "") -> tuple[uuid.UUID, Message]:
+    """Utility function that creates a message with a fresh ID."""
+    message_id = uuid.uuid4()
+    return message_id, Message(id=message_id.bytes,
+                               sender=f"sender{i % 3}",
+                               recipient=f"recipient{i % 2}",
+                               body=body or f"message {i} ✉",
+                               timestamp=i + 0.5)
+
+
+def test_round_trip():
+    store = MessageStore()
+    messages = dict(make_message(i) for i in range(20))
+
+    # ========================================== TEST ========================================== #
+    handles = {message_id: store.add(message_id, message) for message_id, message in messages.items()}
+    assert len(store) == 20
+    assert sorted(handles.values()) == list(range(20))
+
+    for message_id, message in messages.items():
+        assert store.lookup(message_id) == message
+        assert store.recipient(handles[message_id]) == message.recipient
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Read flags are independent bits
+    read_id = list(messages)[9]
+    store.set_read(handles[read_id])
+    messages[read_id].read = True
+    assert [store.is_read(handle) for handle in range(20)] == [handle == 9 for handle in range(20)]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Freed handles are reused, and the new message does not inherit the old read flag
+    store.remove(read_id)
+    del messages[read_id]
+    assert read_id not in store
+
+    message_id, message = make_message(100)
+    assert store.add(message_id, message) == handles[read_id]
+    messages[message_id] = message
+
+    assert sorted(store.messages(), key=lambda message: message.timestamp) == \
+           sorted(messages.values(), key=lambda message: message.timestamp)
+    # ========================================================================================== #
+
+
+def test_compaction(monkeypatch):
+    monkeypatch.setattr(storage.message_store, "MIN_COMPACT_BYTES", 100)
+    store = MessageStore()
+    messages = dict(make_message(i, body=str(i) * 50) for i in range(10))
+    for message_id, message in messages.items():
+        store.add(message_id, message)
+
+    # ========================================== TEST ========================================== #
+    for message_id in list(messages)[:6]:
+        store.remove(message_id)
+        del messages[message_id]
+
+    # The arena only holds the live bodies, and they are still intact
+    assert len(store.arena) == sum(len(message.body) for message in messages.values())
+    for message_id, message in messages.items():
+        assert store.lookup(message_id) == message
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A copy is unaffected by later changes to the original
+    copy = store.copy()
+    for message_id in list(messages):
+        store.remove(message_id)
+
+    assert len(store) == 0
+    assert sorted(copy.messages(), key=lambda message: message.timestamp) == list(messages.values())
+    # ========================================================================================== #
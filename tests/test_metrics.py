@@ -0,0 +1,153 @@
+"""
+This file tests the per-RPC metrics recorded by the server interceptors.
+
+A ChatServer (or AsyncChatServer) is served with its metrics interceptor on the port after the router test's, and its
+metrics on an HTTP port picked by the OS. The test case makes successful, failing, and streaming calls with a regular
+client stub, then scrapes the metrics and checks the counters, status codes, and sizes.
+"""
+
+import asyncio
+import threading
+import time
+import urllib.request
+import uuid
+import pytest
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from metrics import AioMetricsInterceptor, MetricsInterceptor, serve_metrics
+from server import AsyncChatServer, ChatServer
+
+SERVER_ADDR = f"{LOCALHOST}:{SERVER_PORT + 5}"
+
+
+@pytest.fixture(params=["sync", "aio"])
+def metrics_stub(request, monkeypatch):
+    """Fixture to serve a server with its metrics interceptor and metrics endpoint, and connect to it."""
+    monkeypatch.setattr("server.DEBUG", False)
+
+    if request.param == "sync":
+        chat_server = ChatServer()
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4),
+                             interceptors=[MetricsInterceptor(chat_server.metrics)])
+        add_ChatServicer_to_server(chat_server, server)
+        server.add_insecure_port(SERVER_ADDR)
+        server.start()
+        stop = lambda: server.stop(None)
+    else:
+        chat_server = AsyncChatServer()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+
+        async def start():
+            aio_server = grpc.aio.server(interceptors=[AioMetricsInterceptor(chat_server.metrics)])
+            add_ChatServicer_to_server(chat_server, aio_server)
+            aio_server.add_insecure_port(SERVER_ADDR)
+            await aio_server.start()
+            return aio_server
+
+        aio_server = asyncio.run_coroutine_threadsafe(start(), loop).result(timeout=5)
+
+        def stop():
+            asyncio.run_coroutine_threadsafe(aio_server.stop(None), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    http_server = serve_metrics(chat_server.metrics, LOCALHOST, 0)
+    channel = grpc.insecure_channel(SERVER_ADDR)
+    yield ChatStub(channel), f"http://{LOCALHOST}:{http_server.server_address[1]}/metrics"
+
+    channel.close()
+    http_server.shutdown()
+    stop()
+    chat_server.close()
+
+
+def scrape(url: str) -> dict[str, float]:
+    """Utility function that fetches the metrics and parses the samples into a dict."""
+    with urllib.request.urlopen(url) as resp:
+        assert resp.headers["Content-Type"].startswith("text/plain")
+        text = resp.read().decode()
+
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics(metrics_stub):
+    """
+    This test case tests the following:
+    1. Calls are counted per method and status code, with their request and response sizes.
+    2. Errors reported in the response and errors reported as a status code are both counted.
+    3. Streams count every event they send, and a cancelled stream is counted as CANCELLED.
+    4. Client streams count every request they receive.
+    5. Counters kept by the storage are exported along with the RPC metrics.
+    """
+    stub, url = metrics_stub
+
+    # ========================================== TEST ========================================== #
+    req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                      username="metered",
+                      password="password")
+    ok = stub.Authenticate(req)
+    duplicate = stub.Authenticate(req)
+    assert duplicate.status == Status.ERROR
+
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="ghost"), timeout=5)
+    with pytest.raises(grpc.RpcError):
+        next(events)
+
+    msg = Message(id=uuid.uuid4().bytes, sender="metered", recipient="metered", body="hello me", timestamp=1)
+    stub.SendMessage(SendMessageRequest(username="metered", message=msg))
+
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="metered"), timeout=5)
+    assert next(events).event_type == MessageEvent.EventType.NEW
+    assert next(events).event_type == MessageEvent.EventType.SYNCED
+    events.cancel()
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    bulk = [SendMessagesRequest(username="metered",
+                                messages=[Message(id=uuid.uuid4().bytes, sender="metered", recipient="metered",
+                                                  timestamp=2 + i)])
+            for i in range(3)]
+    assert stub.SendMessages(iter(bulk)).status == Status.SUCCESS
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # The cancelled stream is recorded once the server notices
+    samples = {}
+    for _ in range(50):
+        samples = scrape(url)
+        if samples.get('chat_rpc_handled_total{method="SubscribeMessages",code="CANCELLED"}') == 1:
+            break
+        time.sleep(0.1)
+
+    assert samples['chat_rpc_started_total{method="Authenticate"}'] == 2
+    assert samples['chat_rpc_handled_total{method="Authenticate",code="OK"}'] == 2
+    assert samples['chat_rpc_error_responses_total{method="Authenticate"}'] == 1
+    assert samples['chat_rpc_request_bytes_total{method="Authenticate"}'] == 2 * req.ByteSize()
+    assert samples['chat_rpc_response_bytes_total{method="Authenticate"}'] == ok.ByteSize() + duplicate.ByteSize()
+    assert samples['chat_rpc_handling_seconds_count{method="Authenticate"}'] == 2
+    assert samples['chat_rpc_handling_seconds_bucket{method="Authenticate",le="+Inf"}'] == 2
+
+    assert samples['chat_rpc_started_total{method="SubscribeMessages"}'] == 2
+    assert samples['chat_rpc_handled_total{method="SubscribeMessages",code="NOT_FOUND"}'] == 1
+    assert samples['chat_rpc_handled_total{method="SubscribeMessages",code="CANCELLED"}'] == 1
+    assert samples['chat_rpc_responses_total{method="SubscribeMessages"}'] == 2
+
+    assert samples['chat_rpc_started_total{method="SendMessages"}'] == 1
+    assert samples['chat_rpc_handled_total{method="SendMessages",code="OK"}'] == 1
+    assert samples['chat_rpc_requests_total{method="SendMessages"}'] == 3
+    assert samples['chat_rpc_request_bytes_total{method="SendMessages"}'] == sum(req.ByteSize() for req in bulk)
+
+    assert samples["chat_messages_expired_total"] == 0
+    # ========================================================================================== #
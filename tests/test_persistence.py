@@ -0,0 +1,236 @@
+"""
+This file tests the write-ahead log that persists the server state.
+
+Each test case runs requests against a ChatServer that logs to a temporary directory, shuts it down, and checks that a
+new ChatServer recovering from the same directory ends up with the same users, inboxes, messages, and sequence numbers.
+"""
+
+import os
+import threading
+import uuid
+import pytest
+
+import server
+import storage.wal
+
+from protos.chat_pb2 import *
+from config import STATE_SHARDS
+from server import ChatServer
+from storage import MemoryStorage, WriteAheadLog
+
+
+@pytest.fixture(autouse=True)
+def no_debug_logging(monkeypatch):
+    monkeypatch.setattr(server, "DEBUG", False)
+
+
+def open_server(data_dir) -> ChatServer:
+    # Groups of two get their messages as they are sent, and larger groups when their members sync
+    return ChatServer(MemoryStorage(STATE_SHARDS, WriteAheadLog(str(data_dir)), group_fanout_limit=2))
+
+
+def dump(chat_server: ChatServer) -> tuple[dict, dict]:
+    """Utility function that captures the state of a server in comparable form."""
+    users = {username: (user.password, user.seq, user.page()[0], user.unread, user.unread_senders)
+             for username, user in chat_server.storage.users.items()}
+    messages = {message_id: message.SerializeToString()
+                for message_id, message in chat_server.storage.messages.items()}
+    return users, messages
+
+
+def restart(chat_server: ChatServer, data_dir) -> ChatServer:
+    chat_server.close()
+    return open_server(data_dir)
+
+
+def run_requests(chat_server: ChatServer, tag: int):
+    """Run a mix of every mutating request against a server."""
+    for username in [f"alice{tag}", f"bob{tag}", f"carol{tag}"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        chat_server.Authenticate(req, None)
+
+    msgs = [Message(id=uuid.uuid4().bytes,
+                    sender=f"alice{tag}",
+                    recipient=recipient,
+                    body=f"message {i}",
+                    timestamp=i) for i, recipient in enumerate([f"bob{tag}", f"bob{tag}", f"bob{tag}", f"carol{tag}"])]
+    for msg in msgs:
+        chat_server.SendMessage(SendMessageRequest(username=f"alice{tag}", message=msg), None)
+
+    chat_server.ReadMessages(ReadMessagesRequest(username=f"bob{tag}", message_ids=[msgs[0].id, msgs[1].id]), None)
+    chat_server.DeleteMessages(DeleteMessagesRequest(username=f"bob{tag}", message_ids=[msgs[1].id]), None)
+
+    group_msgs = [Message(id=uuid.uuid4().bytes,
+                          sender=f"alice{tag}",
+                          group=group,
+                          body=f"message to {group}",
+                          timestamp=10 + i) for i, group in enumerate([f"pair{tag}", f"team{tag}"])]
+    chat_server.CreateGroup(CreateGroupRequest(username=f"alice{tag}", group=f"pair{tag}", members=[f"bob{tag}"]), None)
+    chat_server.CreateGroup(CreateGroupRequest(username=f"alice{tag}",
+                                               group=f"team{tag}",
+                                               members=[f"bob{tag}", f"carol{tag}"]), None)
+    for msg in group_msgs:
+        chat_server.SendGroupMessage(SendGroupMessageRequest(username=f"alice{tag}", message=msg), None)
+
+    # Syncing delivers the message to the larger group, which alice and carol never sync
+    chat_server.GetMessages(GetMessagesRequest(username=f"bob{tag}"), None)
+    chat_server.ReadMessages(ReadMessagesRequest(username=f"bob{tag}", message_ids=[group_msgs[1].id]), None)
+    chat_server.DeleteUser(DeleteUserRequest(username=f"carol{tag}"), None)
+
+
+def test_recover_from_log(tmp_path):
+    chat_server = open_server(tmp_path)
+    run_requests(chat_server, 0)
+    before = dump(chat_server)
+
+    chat_server = restart(chat_server, tmp_path)
+    assert dump(chat_server) == before
+
+    # Requests keep working on the recovered state, and recovery works again from the new segment
+    run_requests(chat_server, 1)
+    before = dump(chat_server)
+
+    chat_server = restart(chat_server, tmp_path)
+    assert dump(chat_server) == before
+    chat_server.close()
+
+
+def test_recover_from_snapshot(tmp_path):
+    chat_server = open_server(tmp_path)
+    run_requests(chat_server, 0)
+    chat_server.storage.snapshot()
+    run_requests(chat_server, 1)
+    before = dump(chat_server)
+
+    # Only the snapshot and the segment after it are left
+    assert len(os.listdir(tmp_path)) == 2
+
+    chat_server = restart(chat_server, tmp_path)
+    assert dump(chat_server) == before
+
+    # Inboxes continue from their sequence numbers, and deltas from before the snapshot fall back to a full sync
+    resp = chat_server.GetMessages(GetMessagesRequest(username="bob0", since_seq=1), None)
+    assert resp.full_sync and resp.seq == 9
+
+    resp = chat_server.GetMessages(GetMessagesRequest(username="bob0", since_seq=9), None)
+    assert not resp.full_sync and resp.seq == 9 and len(resp.messages) == 0
+
+    # Pending group messages are still delivered on the next sync
+    resp = chat_server.GetMessages(GetMessagesRequest(username="alice0"), None)
+    assert [msg.group for msg in resp.messages] == ["pair0", "team0"]
+    chat_server.close()
+
+
+def test_torn_write(tmp_path):
+    chat_server = open_server(tmp_path)
+    run_requests(chat_server, 0)
+    before = dump(chat_server)
+    chat_server.close()
+
+    # Simulate a crash in the middle of writing a record
+    segment = sorted(os.listdir(tmp_path))[-1]
+    with open(tmp_path / segment, "ab") as f:
+        f.write(storage.wal.frame(storage.RecordType.DELETE_USER, b"\x00\x04bob0")[:-2])
+
+    chat_server = open_server(tmp_path)
+    assert dump(chat_server) == before
+    chat_server.close()
+
+
+def test_group_commit(tmp_path, monkeypatch):
+    fsyncs = []
+    monkeypatch.setattr(storage.wal.os, "fsync", lambda fd: fsyncs.append(fd))
+
+    chat_server = open_server(tmp_path)
+    chat_server.storage.wal.group_commit_delay = 0.005
+    chat_server.Authenticate(AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                                         username="inbox",
+                                         password="password"), None)
+
+    def sender(i):
+        for j in range(50):
+            msg = Message(id=uuid.uuid4().bytes, sender=f"sender{i}", recipient="inbox", body=f"message {j}")
+            chat_server.SendMessage(SendMessageRequest(username=f"sender{i}", message=msg), None)
+
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every request waited for its record to be durable, but concurrent requests shared fsyncs
+    assert chat_server.storage.wal.durable_lsn == 1 + 8 * 50
+    assert len(fsyncs) < 8 * 50
+
+    chat_server = restart(chat_server, tmp_path)
+    assert len(chat_server.storage.messages) == 8 * 50
+    chat_server.close()
+
+
+def test_partial_failure(tmp_path):
+    chat_server = open_server(tmp_path)
+    for username in ["alice", "bob"]:
+        chat_server.storage.create_user(username, "password")
+    msgs = [Message(id=uuid.uuid4().bytes, sender="alice", recipient="bob", body=f"message {i}", timestamp=i)
+            for i in range(2)]
+    for msg in msgs:
+        chat_server.storage.send_message(msg)
+    unknown_id = uuid.uuid4().bytes
+
+    # A request with an unknown or repeated ID changes nothing, so the live state matches the one recovered from the log
+    for fn, message_ids in [(chat_server.storage.read_messages, [msgs[0].id, unknown_id]),
+                            (chat_server.storage.read_messages, [msgs[0].id, msgs[0].id]),
+                            (chat_server.storage.delete_messages, [msgs[1].id, unknown_id])]:
+        with pytest.raises(AssertionError):
+            fn("bob", message_ids)
+    assert chat_server.storage.users["bob"].unread == 2
+    assert not any(message.read for message in chat_server.storage.messages.values())
+
+    chat_server.storage.read_messages("bob", [msgs[0].id])
+    before = dump(chat_server)
+
+    chat_server = restart(chat_server, tmp_path)
+    assert dump(chat_server) == before
+    chat_server.close()
+
+
+def test_recover_reclaimed_group_messages(tmp_path):
+    chat_server = open_server(tmp_path)
+    store = chat_server.storage
+    for username in ["alice", "bob", "carol"]:
+        store.create_user(username, "password")
+    store.create_group("trio", ["alice", "bob", "carol"])
+
+    def send_to_group(i: int) -> Message:
+        msg = Message(id=uuid.uuid4().bytes, sender="alice", group="trio", body=f"message {i}", timestamp=i)
+        store.send_group_message(msg)
+        return msg
+
+    # Reclaim the first and the third message, which leaves gaps before and between the messages kept
+    msgs = [send_to_group(i) for i in range(4)]
+    for username in ["alice", "bob", "carol"]:
+        store.get_messages(username, 0, 0, None, False)
+        store.delete_messages(username, [msgs[0].id, msgs[2].id])
+    store.snapshot()
+
+    # Deliveries after the snapshot are logged with positions past the gaps
+    msgs.append(send_to_group(4))
+    store.get_messages("bob", 0, 0, None, False)
+    store.delete_messages("bob", [msgs[1].id])
+    store.delete_user("carol")
+    before = dump(chat_server)
+    group = store.groups["trio"]
+    positions, holders = group.positions, group.holders
+    assert len(group.messages) == 3 and group.end == 5
+
+    chat_server = restart(chat_server, tmp_path)
+    assert dump(chat_server) == before
+    group = chat_server.storage.groups["trio"]
+    assert (group.positions, group.holders, group.end) == (positions, holders, 5)
+
+    # The recovered holds still reclaim the messages
+    chat_server.storage.delete_messages("alice", [msgs[1].id])
+    assert msgs[1].id not in {message.id for message in chat_server.storage.messages.values()}
+    chat_server.close()
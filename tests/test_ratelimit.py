@@ -0,0 +1,181 @@
+"""
+This file tests the rate limits of the server: token buckets per user and method, and the limit on calls handled at once.
+
+A ChatServer with low limits is served on the port after the admission test's. The test cases flood it as one user and
+check that the calls over the limit are shed with RESOURCE_EXHAUSTED and a retry-after hint, while other users and
+methods keep being served, and that the bucket refills. Streams past the server's limit of open message streams are
+turned away the same way, without holding up other calls.
+"""
+
+import threading
+import time
+import pytest
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from metrics import MetricsInterceptor
+from ratelimit import RateLimiter, RateLimitInterceptor
+from server import ChatServer
+from sessions import SessionInterceptor, Sessions, SessionTokens
+
+SERVER_ADDR = f"{LOCALHOST}:{SERVER_PORT + 7}"
+RATE = 5
+BURST = 5
+
+
+@pytest.fixture()
+def limited_stub(monkeypatch):
+    """Fixture to serve a server with low rate limits, and connect to it."""
+    monkeypatch.setattr("server.DEBUG", False)
+
+    chat_server = ChatServer()
+    chat_server.rate_limiter = RateLimiter(chat_server.sessions, RATE, BURST, {"Authenticate": {"rate": 0, "burst": 0}},
+                                           max_concurrent=0, retry_after=1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4),
+                         interceptors=[MetricsInterceptor(chat_server.metrics),
+                                       RateLimitInterceptor(chat_server.rate_limiter),
+                                       SessionInterceptor(chat_server.sessions)])
+    add_ChatServicer_to_server(chat_server, server)
+    server.add_insecure_port(SERVER_ADDR)
+    server.start()
+
+    channel = grpc.insecure_channel(SERVER_ADDR)
+    yield ChatStub(grpc.intercept_channel(channel, SessionTokens())), chat_server
+
+    channel.close()
+    server.stop(None)
+    chat_server.close()
+
+
+def test_rate_limit(limited_stub):
+    stub, chat_server = limited_stub
+    for username in ["spammer", "bystander"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username=username, password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    # ========================================== TEST ========================================== #
+    for _ in range(BURST):
+        assert stub.GetInboxSummary(GetInboxSummaryRequest(username="spammer")).status == Status.SUCCESS
+
+    with pytest.raises(grpc.RpcError) as e:
+        stub.GetInboxSummary(GetInboxSummaryRequest(username="spammer"))
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert e.value.details().startswith("Too many GetInboxSummary requests, retry in ")
+    assert 0 < float(dict(e.value.trailing_metadata())["retry-after"]) <= 1 / RATE
+    assert chat_server.rate_limiter.rate_limited == 1
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Other users and the user's other methods have their own buckets
+    assert stub.GetInboxSummary(GetInboxSummaryRequest(username="bystander")).status == Status.SUCCESS
+    assert stub.ListUsers(ListUsersRequest(username="spammer", pattern="*")).status == Status.SUCCESS
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # The bucket refills at the rate
+    time.sleep(1 / RATE)
+    assert stub.GetInboxSummary(GetInboxSummaryRequest(username="spammer")).status == Status.SUCCESS
+    assert chat_server.metrics.methods["GetInboxSummary"].handled["RESOURCE_EXHAUSTED"] == 1
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Neither the shed calls nor the handled ones are left counted as running
+    assert chat_server.rate_limiter.running == 0
+    # ========================================================================================== #
+
+
+def test_anonymous_rate_limit(limited_stub):
+    """
+    This test case tests the following:
+    1. Calls without a session from one client do not use up the bucket of another client.
+    2. Authenticate calls take from a bucket per account, so flooding the login of one account does not shed others.
+    """
+    stub, chat_server = limited_stub
+    # Logins hash the password, so the bucket must not refill while the test makes them
+    chat_server.rate_limiter.method_limits["Authenticate"] = (0.01, BURST)
+
+    # ========================================== TEST ========================================== #
+    # A channel of its own subchannel pool opens its own connection, so the server sees it as another peer
+    with grpc.insecure_channel(SERVER_ADDR, options=[("grpc.use_local_subchannel_pool", 1)]) as channel:
+        flooder = ChatStub(channel)
+        for _ in range(BURST):
+            assert flooder.Echo(EchoRequest(message="ping")).message == "ping"
+        with pytest.raises(grpc.RpcError) as e:
+            flooder.Echo(EchoRequest(message="ping"))
+        assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        assert e.value.details().startswith("Too many Echo requests, retry in ")
+
+        assert stub.Echo(EchoRequest(message="ping")).message == "ping"
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username="target", password="password")
+    assert stub.Authenticate(req).status == Status.SUCCESS
+
+    guess = AuthRequest(action_type=AuthRequest.ActionType.LOGIN, username="target", password="guess")
+    for _ in range(BURST - 1):
+        assert stub.Authenticate(guess).status == Status.ERROR
+    with pytest.raises(grpc.RpcError) as e:
+        stub.Authenticate(guess)
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert e.value.details().startswith("Too many Authenticate requests, retry in ")
+
+    req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username="newcomer", password="password")
+    assert stub.Authenticate(req).status == Status.SUCCESS
+    # ========================================================================================== #
+
+
+def test_max_concurrent():
+    sessions = Sessions(b"key", ttl=60)
+    limiter = RateLimiter(sessions, rate=0, burst=0, method_limits={}, max_concurrent=2, retry_after=1)
+
+    # ========================================== TEST ========================================== #
+    assert limiter.admit("SendMessage", "alice") is None
+    assert limiter.admit("SendMessage", "bob") is None
+    assert limiter.admit("SendMessage", "alice") == ("The server is overloaded, retry in 1 s.", 1)
+    assert limiter.overloaded == 1
+
+    # Message streams do not count
+    assert limiter.admit("SubscribeMessages", "alice", concurrent=False) is None
+
+    limiter.done()
+    assert limiter.admit("SendMessage", "alice") is None
+    assert limiter.running == 2
+    # ========================================================================================== #
+
+
+def test_max_streams(limited_stub):
+    stub, chat_server = limited_stub
+    chat_server.stream_slots = threading.Semaphore(1)
+    req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username="streamer", password="password")
+    assert stub.Authenticate(req).status == Status.SUCCESS
+
+    # ========================================== TEST ========================================== #
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="streamer"), timeout=5)
+    assert next(events).event_type == MessageEvent.EventType.SYNCED
+
+    with pytest.raises(grpc.RpcError) as e:
+        next(stub.SubscribeMessages(SubscribeMessagesRequest(username="streamer"), timeout=5))
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert float(dict(e.value.trailing_metadata())["retry-after"]) == 1
+
+    # Other calls are still served while the stream is open
+    assert stub.GetInboxSummary(GetInboxSummaryRequest(username="streamer"), timeout=5).status == Status.SUCCESS
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Closing the stream frees its slot
+    events.cancel()
+    deadline = time.monotonic() + 5
+    while not chat_server.stream_slots.acquire(blocking=False):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    chat_server.stream_slots.release()
+
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="streamer"), timeout=5)
+    assert next(events).event_type == MessageEvent.EventType.SYNCED
+    events.cancel()
+    # ========================================================================================== #
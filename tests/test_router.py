@@ -0,0 +1,166 @@
+"""
+This file tests the router that fronts a chat server split into user shards.
+
+Two ChatServer shards are served on their own ports, and a ChatRouter is served on an event loop in a background thread
+in front of them, the same way the server runs with more than one process. The test case drives the router with a
+regular client stub and checks which shard ends up holding the state.
+"""
+
+import asyncio
+import threading
+import uuid
+import pytest
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, SERVER_PORT
+from router import shard_for, serve_router
+from server import ChatServer
+from sessions import SessionInterceptor, SessionTokens, Sessions
+
+SHARD_ADDRS = [f"{LOCALHOST}:{SERVER_PORT + 2}", f"{LOCALHOST}:{SERVER_PORT + 3}"]
+ROUTER_ADDR = f"{LOCALHOST}:{SERVER_PORT + 4}"
+
+
+@pytest.fixture()
+def sharded():
+    """Fixture to serve two shards behind a router and connect to the router."""
+    shards, servers = [], []
+    sessions = Sessions(b"shared key", ttl=60)
+    for shard_addr in SHARD_ADDRS:
+        shard = ChatServer(sessions=sessions)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), interceptors=[SessionInterceptor(sessions)])
+        add_ChatServicer_to_server(shard, server)
+        server.add_insecure_port(shard_addr)
+        server.start()
+        shards.append(shard)
+        servers.append(server)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    router = asyncio.run_coroutine_threadsafe(serve_router(ROUTER_ADDR, SHARD_ADDRS), loop)
+
+    channel = grpc.insecure_channel(ROUTER_ADDR)
+    grpc.channel_ready_future(channel).result(timeout=5)
+    yield ChatStub(grpc.intercept_channel(channel, SessionTokens())), shards
+
+    channel.close()
+    router.cancel()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    for server in servers:
+        server.stop(None)
+    for shard in shards:
+        shard.close()
+
+
+def test_router(sharded):
+    """
+    This test case tests the following:
+    1. Accounts are created in the shard that owns their username.
+    2. A message sent across shards is delivered into the recipient's shard.
+    3. ListUsers merges the matches of every shard.
+    4. Message streams and errors are forwarded.
+    5. A SendMessages stream is split between the shards, and its results come back in stream order.
+    6. Groups are created on every shard, and each shard delivers group messages to the members it owns.
+    """
+    stub, shards = sharded
+
+    # Pick one user owned by each shard
+    candidates = [f"routed{i}" for i in range(100)]
+    sender = next(name for name in candidates if shard_for(name, 2) == 0)
+    recipient = next(name for name in candidates if shard_for(name, 2) == 1)
+
+    # ========================================== TEST ========================================== #
+    for username in [sender, recipient]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT,
+                          username=username,
+                          password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    assert list(shards[0].storage.users) == [sender]
+    assert list(shards[1].storage.users) == [recipient]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msg = Message(id=uuid.UUID(int=1).bytes,
+                  sender=sender,
+                  recipient=recipient,
+                  body="hello from the other shard!",
+                  timestamp=1)
+    resp = stub.SendMessage(SendMessageRequest(username=sender, message=msg))
+    assert resp == SendMessageResponse(status=Status.SUCCESS)
+
+    assert len(shards[0].storage.messages) == 0
+    assert len(shards[1].storage.messages) == 1
+
+    req = GetMessagesRequest(username=recipient)
+    exp = GetMessagesResponse(status=Status.SUCCESS,
+                              messages=[msg],
+                              seq=1,
+                              full_sync=True)
+
+    resp = stub.GetMessages(req)
+    assert resp == exp
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = ListUsersRequest(username=sender, pattern="routed*")
+    exp = ListUsersResponse(status=Status.SUCCESS,
+                            usernames=sorted([sender, recipient]))
+
+    resp = stub.ListUsers(req)
+    assert resp == exp
+
+    # Pages span both shards
+    req = ListUsersRequest(username=sender, pattern="routed*", limit=1)
+    first = stub.ListUsers(req)
+    assert first.usernames == [min(sender, recipient)] and first.next_page_token
+
+    req = ListUsersRequest(username=sender, pattern="routed*", limit=1, page_token=first.next_page_token)
+    second = stub.ListUsers(req)
+    assert second.usernames == [max(sender, recipient)] and not second.next_page_token
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username=recipient), timeout=5)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.NEW, message=msg)
+    assert next(events) == MessageEvent(event_type=MessageEvent.EventType.SYNCED, seq=1)
+    events.cancel()
+
+    events = stub.SubscribeMessages(SubscribeMessagesRequest(username="ghost"), timeout=5)
+    with pytest.raises(grpc.RpcError) as e:
+        next(events)
+    assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    msgs = [Message(id=uuid.UUID(int=10 + i).bytes, sender=sender, recipient=to, body=f"bulk {i}", timestamp=10 + i)
+            for i, to in enumerate([recipient, sender, "ghost", recipient])]
+    reqs = [SendMessagesRequest(username=sender, messages=msgs[:3]), SendMessagesRequest(username=sender, messages=msgs[3:])]
+    resp = stub.SendMessages(iter(reqs))
+
+    assert resp.status == Status.ERROR
+    assert [result.status for result in resp.results] == [Status.SUCCESS, Status.SUCCESS, Status.ERROR, Status.SUCCESS]
+    assert resp.results[2].error_message == "Send message failed: recipient \"ghost\" does not exist."
+
+    assert len(shards[0].storage.messages) == 1
+    assert len(shards[1].storage.messages) == 3
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    req = CreateGroupRequest(username=sender, group="routed", members=[recipient, "ghost"])
+    assert stub.CreateGroup(req) == CreateGroupResponse(status=Status.SUCCESS, unknown_members=["ghost"])
+    assert stub.CreateGroup(req).status == Status.ERROR
+
+    group_msg = Message(id=uuid.UUID(int=20).bytes, sender=sender, group="routed", body="hello all", timestamp=20)
+    resp = stub.SendGroupMessage(SendGroupMessageRequest(username=sender, message=group_msg))
+    assert resp == SendGroupMessageResponse(status=Status.SUCCESS)
+
+    for username in [sender, recipient]:
+        resp = stub.GetMessages(GetMessagesRequest(username=username))
+        assert [(m.id, m.recipient, m.group) for m in resp.messages][-1] == (group_msg.id, username, "routed")
+    # ========================================================================================== #
@@ -0,0 +1,75 @@
+"""
+This file tests the structured server log.
+
+Each test case writes a ServerLog to a temporary file, closes it to flush the queued records, and parses the JSON lines
+back to check which events were logged and what they contain.
+"""
+
+import json
+import uuid
+
+from protos.chat_pb2 import *
+from metrics import Metrics
+from server_log import ServerLog
+from storage import MemoryStorage
+
+
+def read_events(path) -> list[dict]:
+    """Utility function that parses every line of the log."""
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_request_sampling(tmp_path):
+    path = tmp_path / "server.log"
+
+    # ========================================== TEST ========================================== #
+    # With sampling off, nothing is logged, failures included
+    server_log = ServerLog(MemoryStorage(4), Metrics(), sample_rate=0.0, path=str(path))
+    server_log.request("SendMessage", "alice", SendMessageResponse(status=Status.ERROR, error_message="failed"))
+    server_log.close()
+    assert not path.exists()
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # With a tiny sample rate, failures are still logged
+    server_log = ServerLog(MemoryStorage(4), Metrics(), sample_rate=1e-12, path=str(path))
+    for _ in range(100):
+        server_log.request("SendMessage", "alice", SendMessageResponse(status=Status.SUCCESS))
+    server_log.request("SendMessage", "alice", SendMessageResponse(status=Status.ERROR, error_message="failed"))
+    server_log.close()
+
+    [event] = read_events(path)
+    assert event["event"] == "request"
+    assert (event["method"], event["username"], event["status"], event["error"]) == \
+           ("SendMessage", "alice", "ERROR", "failed")
+    # ========================================================================================== #
+
+
+def test_summary_and_dump(tmp_path):
+    path = tmp_path / "server.log"
+    storage = MemoryStorage(4)
+    storage.create_user("alice", "password")
+    message_id = uuid.uuid4()
+    storage.send_message(Message(id=message_id.bytes, sender="alice", recipient="alice", body="hi", timestamp=1))
+
+    # ========================================== TEST ========================================== #
+    server_log = ServerLog(storage, Metrics(), path=str(path))
+    server_log.summary()
+    server_log.dump()
+    server_log.close()
+
+    summary, dump = read_events(path)
+    assert summary["event"] == "state_summary"
+    assert (summary["users"], summary["messages"], summary["message_bytes"], summary["subscribers"]) == (1, 1, 2, 0)
+    assert summary["dropped_records"] == 0
+
+    # Summaries only carry counts, while dumps carry the whole state (but no passwords)
+    assert dump["event"] == "state_dump"
+    assert dump["users"] == {"alice": {"seq": 1, "message_ids": [str(message_id)]}}
+    assert dump["messages"][str(message_id)] == {"sender": "alice",
+                                                 "recipient": "alice",
+                                                 "body": "hi",
+                                                 "timestamp": 1,
+                                                 "read": False}
+    # ========================================================================================== #
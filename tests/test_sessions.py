@@ -0,0 +1,35 @@
+"""
+This file tests the signed session tokens.
+
+The test cases check that a token verifies as its user until it expires, and that tokens that were tampered with or
+signed with another key do not.
+"""
+
+from sessions import Sessions, token_username
+
+
+def test_sessions():
+    sessions = Sessions(b"key", ttl=60)
+
+    # ========================================== TEST ========================================== #
+    token = sessions.issue("alice")
+    assert sessions.verify(token) == "alice"
+    assert token_username((("authorization", "Bearer " + token),)) == "alice"
+    assert token_username(()) == ""
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Changing any part of a token breaks its signature
+    username, expiry, signature = token.split(".")
+    bob = Sessions(b"other key", ttl=60).issue("bob").split(".")[0]
+    for forged in [f"{bob}.{expiry}.{signature}", f"{username}.{int(expiry) + 1}.{signature}",
+                   f"{username}.{expiry}.{signature[:-1]}", "", "garbage"]:
+        assert sessions.verify(forged) is None
+    assert sessions.verify(None) is None
+    assert Sessions(b"other key", ttl=60).verify(token) is None
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    sessions.ttl = -1
+    assert sessions.verify(sessions.issue("alice")) is None
+    # ========================================================================================== #
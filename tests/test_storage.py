@@ -0,0 +1,510 @@
+"""
+This file tests the storage backends against each other.
+
+Each test case runs against every backend through the Storage interface, so the in-memory state and the SQLite
+database must agree on inbox order, paging, delta syncs, and the events pushed to open streams.
+"""
+
+import time
+import uuid
+import pytest
+
+from protos.chat_pb2 import *
+from entity.user import MAX_TOMBSTONES
+from storage import InboxSummary, InboxSync, MemoryStorage, RetentionPolicy, SendResult, SqliteStorage, Storage, StorageStats
+
+
+class EventList(list):
+    """Queue-like object that collects the events pushed to a stream."""
+
+    def put(self, event):
+        self.append(event)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path) -> Storage:
+    """Fixture to create an empty storage of each backend."""
+    if request.param == "memory":
+        store = MemoryStorage(4)
+    else:
+        store = SqliteStorage(str(tmp_path / "chat.db"), fsync=False)
+    yield store
+    store.close()
+
+
+def send(store: Storage, recipient: str, timestamp: float) -> Message:
+    """Utility function that sends a message from "sender" and returns it."""
+    msg = Message(id=uuid.uuid4().bytes,
+                  sender="sender",
+                  recipient=recipient,
+                  body=f"message at {timestamp}",
+                  timestamp=timestamp)
+    assert store.send_message(msg)
+    return msg
+
+
+def test_users(store):
+    # ========================================== TEST ========================================== #
+    assert store.create_user("alice", "password1")
+    assert store.create_user("bob", "password2")
+    assert not store.create_user("alice", "other")
+
+    assert store.get_password("alice") == "password1"
+    assert store.get_password("carol") is None
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    store.create_user("alfred", "password3")
+    assert store.list_users("al*") == (["alfred", "alice"], None)
+    assert store.list_users("?o?") == (["bob"], None)
+    assert store.list_users("[!a]*") == (["bob"], None)
+    assert store.list_users("alice") == (["alice"], None)
+    assert store.list_users("*") == (["alfred", "alice", "bob"], None)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    assert store.list_users("*", 2) == (["alfred", "alice"], "alice")
+    assert store.list_users("*", 2, "alice") == (["bob"], None)
+    assert store.list_users("al*", 2) == (["alfred", "alice"], None)
+    assert store.list_users("al*", 1, "alfred") == (["alice"], None)
+
+    # More users than shards, so that some shard holds several matches
+    many = sorted(f"many{i}" for i in range(20))
+    for username in many:
+        store.create_user(username, "password")
+    assert store.list_users("many*") == (many, None)
+    assert store.list_users("many*", 15) == (many[:15], many[14])
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    assert not store.send_message(Message(id=uuid.uuid4().bytes, sender="alice", recipient="carol"))
+
+    msg = send(store, "bob", 1)
+    store.delete_user("bob")
+    assert store.get_password("bob") is None
+    assert uuid.UUID(bytes=msg.id) not in store.messages
+
+    # A recreated account starts with an empty inbox
+    assert store.create_user("bob", "password2")
+    sync = store.get_messages("bob", 0, 0, None, False)
+    assert sync.messages == [] and sync.seq == 0
+    # ========================================================================================== #
+
+
+def test_paging(store):
+    store.create_user("pager", "password")
+    msgs = [send(store, "pager", timestamp) for timestamp in [3, 1, 4, 1.5, 9, 2, 6]]
+    by_time = sorted(msgs, key=lambda msg: msg.timestamp)
+
+    # ========================================== TEST ========================================== #
+    sync = store.get_messages("pager", 0, 0, None, False)
+    assert sync.messages == by_time
+    assert sync.full_sync and sync.seq == 7 and sync.next_key is None
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    for newest_first, expected in [(False, by_time), (True, by_time[::-1])]:
+        pages, after = [], None
+        while True:
+            sync = store.get_messages("pager", 0, 3, after, newest_first)
+            pages.append(sync.messages)
+            after = sync.next_key
+            if after is None:
+                break
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert [msg for page in pages for msg in page] == expected
+    # ========================================================================================== #
+
+
+def test_delta_sync(store):
+    store.create_user("syncer", "password")
+    msgs = [send(store, "syncer", timestamp) for timestamp in range(4)]
+
+    # ========================================== TEST ========================================== #
+    store.read_messages("syncer", [msgs[0].id, msgs[1].id])
+    store.delete_messages("syncer", [msgs[1].id, msgs[2].id])
+    new_msg = send(store, "syncer", 10)
+
+    sync = store.get_messages("syncer", 4, 0, None, False)
+    read_msg = Message()
+    read_msg.CopyFrom(msgs[0])
+    read_msg.read = True
+
+    assert sync.messages == [read_msg, new_msg]
+    assert sync.deleted_ids == [uuid.UUID(bytes=msgs[1].id), uuid.UUID(bytes=msgs[2].id)]
+    assert sync.seq == 9 and not sync.full_sync
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Deltas from the current sequence number are empty, and deltas from the future need a full sync
+    sync = store.get_messages("syncer", 9, 0, None, False)
+    assert sync.messages == [] and sync.deleted_ids == [] and not sync.full_sync
+
+    sync = store.get_messages("syncer", 10, 0, None, False)
+    assert sync.full_sync and sync.messages == [read_msg, msgs[3], new_msg]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Once the oldest tombstones are forgotten, deltas from before them need a full sync
+    doomed = [send(store, "syncer", 100 + i) for i in range(MAX_TOMBSTONES)]
+    store.delete_messages("syncer", [msg.id for msg in doomed])
+
+    assert store.get_messages("syncer", 7, 0, None, False).full_sync
+    sync = store.get_messages("syncer", 8, 0, None, False)
+    assert not sync.full_sync and len(sync.deleted_ids) == MAX_TOMBSTONES
+    # ========================================================================================== #
+
+
+def test_send_messages(store):
+    store.create_user("alice", "password")
+    store.create_user("bob", "password")
+    msgs = [Message(id=uuid.uuid4().bytes, sender="sender", recipient=recipient, body=str(i), timestamp=i)
+            for i, recipient in enumerate(["alice", "ghost", "bob", "alice", "ghost", "alice"])]
+
+    # ========================================== TEST ========================================== #
+    events = EventList()
+    store.subscribe("alice", events, 0)
+    sent, missing = SendResult.SENT, SendResult.NO_RECIPIENT
+    assert store.send_messages(msgs) == [sent, missing, sent, sent, missing, sent]
+
+    # Every recipient gets its messages in batch order, with consecutive sequence numbers
+    assert [(event.message, event.seq) for event in events[1:]] == [(msgs[0], 1), (msgs[3], 2), (msgs[5], 3)]
+    assert store.get_messages("alice", 0, 0, None, False) == InboxSync([msgs[0], msgs[3], msgs[5]], [], 3, True, None)
+    assert store.get_messages("bob", 0, 0, None, False) == InboxSync([msgs[2]], [], 1, True, None)
+    assert store.send_messages([]) == []
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A replayed batch stores nothing twice, and the new messages in it are still sent
+    new_msg = Message(id=uuid.uuid4().bytes, sender="sender", recipient="bob", body="new", timestamp=6)
+    results = store.send_messages([msgs[0], new_msg, new_msg, msgs[2]])
+    assert results == [SendResult.DUPLICATE_ID, sent, SendResult.DUPLICATE_ID, SendResult.DUPLICATE_ID]
+    assert [(event.message, event.seq) for event in events[1:]] == [(msgs[0], 1), (msgs[3], 2), (msgs[5], 3)]
+    assert store.get_messages("alice", 0, 0, None, False).seq == 3
+    assert store.get_messages("bob", 0, 0, None, False) == InboxSync([msgs[2], new_msg], [], 2, True, None)
+    # ========================================================================================== #
+
+
+def test_groups(store):
+    for username in ["alice", "bob", "carol"]:
+        store.create_user(username, "password")
+
+    def send_to_group(sender: str, timestamp: float) -> Message:
+        msg = Message(id=uuid.uuid4().bytes, sender=sender, group="team", body=f"group message at {timestamp}",
+                      timestamp=timestamp)
+        assert store.send_group_message(msg)
+        return msg
+
+    def as_received(msg: Message, recipient: str, read: bool = False) -> Message:
+        received = Message()
+        received.CopyFrom(msg)
+        received.recipient, received.read = recipient, read
+        return received
+
+    # ========================================== TEST ========================================== #
+    assert store.create_group("team", ["alice", "bob", "carol", "ghost", "bob"]) == ["ghost"]
+    assert store.create_group("team", ["alice"]) is None
+
+    # Only members can send, and only to existing groups
+    assert not store.send_group_message(Message(id=uuid.uuid4().bytes, sender="dave", group="team"))
+    assert not store.send_group_message(Message(id=uuid.uuid4().bytes, sender="alice", group="nope"))
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A small group delivers as it sends, so open streams and syncs see the message under its own ID
+    events = EventList()
+    store.subscribe("bob", events, 0)
+    small = send_to_group("alice", 1)
+    assert events[1:] == [MessageEvent(event_type=MessageEvent.EventType.NEW, message=as_received(small, "bob"), seq=1)]
+    assert store.get_messages("carol", 0, 0, None, False) == InboxSync([as_received(small, "carol")], [], 1, True, None)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A large group only delivers to open streams as it sends, and to the others when they sync
+    store.group_fanout_limit = 1
+    large = send_to_group("carol", 2)
+    assert events[2:] == [MessageEvent(event_type=MessageEvent.EventType.NEW, message=as_received(large, "bob"), seq=2)]
+
+    sync = store.get_messages("carol", 1, 0, None, False)
+    assert sync == InboxSync([as_received(large, "carol")], [], 2, False, None)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Read flags and deletes are per member: the body is stored once
+    store.read_messages("carol", [small.id])
+    store.delete_messages("carol", [large.id])
+    assert store.get_messages("carol", 0, 0, None, False) == InboxSync([as_received(small, "carol", True)], [], 4,
+                                                                       True, None)
+    assert store.get_messages("alice", 0, 0, None, False) == InboxSync([as_received(small, "alice"),
+                                                                        as_received(large, "alice")], [], 2, True, None)
+    assert store.stats().groups == 1 and store.stats().messages == 2
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # A deleted member leaves the group, and the group keeps its messages
+    store.unsubscribe("bob", events)
+    store.delete_user("bob")
+    assert not store.send_group_message(Message(id=uuid.uuid4().bytes, sender="bob", group="team"))
+    assert store.stats().messages == 2
+    # ========================================================================================== #
+
+
+def test_group_reclaim(store):
+    for username in ["alice", "bob", "carol"]:
+        store.create_user(username, "password")
+    store.create_group("trio", ["alice", "bob", "carol"])
+
+    def send_to_group(body: str, timestamp: float) -> Message:
+        msg = Message(id=uuid.uuid4().bytes, sender="alice", group="trio", body=body, timestamp=timestamp)
+        assert store.send_group_message(msg)
+        return msg
+
+    # ========================================== TEST ========================================== #
+    # A group message is stored until every member deleted it
+    msg = send_to_group("to everyone", 1)
+    store.delete_messages("alice", [msg.id])
+    store.delete_messages("bob", [msg.id])
+    assert store.message_bytes == len(msg.body)
+    store.delete_messages("carol", [msg.id])
+    assert store.stats().messages == 0 and store.message_bytes == 0
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Members that have not synced a message yet hold it too, until they leave the group
+    store.group_fanout_limit = 0
+    msg = send_to_group("to everyone again", 2)
+    for username in ["alice", "bob"]:
+        store.get_messages(username, 0, 0, None, False)
+        store.delete_messages(username, [msg.id])
+    assert store.message_bytes == len(msg.body)
+    store.delete_user("carol")
+    assert store.stats().messages == 0 and store.message_bytes == 0
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Past max_age, messages nobody synced are delivered and expire from every inbox, and then from the group
+    store.retention.policy = RetentionPolicy(max_age=100)
+    now = time.time()
+    msgs = [send_to_group(f"unsynced {i}", now + i) for i in range(2)]
+    store.expire(now + 100.5)
+    assert store.message_bytes == len(msgs[1].body)
+    assert store.get_messages("bob", 0, 0, None, False).messages == [
+        Message(id=msgs[1].id, sender="alice", recipient="bob", body=msgs[1].body, timestamp=now + 1, group="trio")]
+
+    store.expire(now + 200)
+    assert store.stats().messages == 0 and store.message_bytes == 0
+    assert store.inbox_summary("alice").total == store.inbox_summary("bob").total == 0
+    # ========================================================================================== #
+
+
+def test_inbox_summary(store):
+    store.create_user("counter", "password")
+    store.create_user("friend", "password")
+    msgs = [send(store, "counter", timestamp) for timestamp in range(3)]
+    from_friend = Message(id=uuid.uuid4().bytes, sender="friend", recipient="counter", body="hi", timestamp=3)
+    store.send_message(from_friend)
+
+    # ========================================== TEST ========================================== #
+    assert store.inbox_summary("nobody") is None
+    assert store.inbox_summary("counter") == InboxSummary(4, 4, {"sender": 3, "friend": 1}, 4)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Reads and deletes of read and unread messages each update the counts once
+    store.read_messages("counter", [msgs[0].id, from_friend.id])
+    store.delete_messages("counter", [msgs[0].id, msgs[1].id])
+    assert store.inbox_summary("counter") == InboxSummary(2, 1, {"sender": 1}, 8)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Group messages count once they are delivered, which the summary does for large groups
+    store.group_fanout_limit = 0
+    store.create_group("pair", ["counter", "friend"])
+    group_msg = Message(id=uuid.uuid4().bytes, sender="friend", group="pair", body="hi all", timestamp=4)
+    store.send_group_message(group_msg)
+    assert store.inbox_summary("counter") == InboxSummary(3, 2, {"sender": 1, "friend": 1}, 9)
+
+    store.read_messages("counter", [group_msg.id])
+    store.delete_messages("counter", [group_msg.id])
+    assert store.inbox_summary("counter") == InboxSummary(2, 1, {"sender": 1}, 11)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Messages sent already read (as when they are replayed or migrated) are stored and counted as read
+    read_msg = Message(id=uuid.uuid4().bytes, sender="friend", recipient="counter", body="seen", timestamp=5, read=True)
+    assert store.send_message(read_msg)
+    assert store.send_messages([Message(id=uuid.uuid4().bytes, sender="friend", recipient="counter", body="seen",
+                                        timestamp=6, read=True)]) == [SendResult.SENT]
+    assert store.inbox_summary("counter") == InboxSummary(4, 1, {"sender": 1}, 13)
+    sync = store.get_messages("counter", 0, 0, None, False)
+    assert [msg.read for msg in sync.messages if msg.body == "seen"] == [True, True]
+    # ========================================================================================== #
+
+
+def test_read_next(store):
+    store.create_user("reader", "password")
+    store.create_user("friend", "password")
+    # Arrival order differs from timestamp order
+    msgs = [send(store, "reader", timestamp) for timestamp in (5, 1, 3, 2)]
+
+    # ========================================== TEST ========================================== #
+    assert store.read_next("nobody", 1) is None
+
+    read = store.read_next("reader", 2)
+    assert [m.id for m in read] == [msgs[0].id, msgs[1].id] and all(m.read for m in read)
+    assert store.inbox_summary("reader").unread == 2
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Messages read or deleted another way are skipped, and group messages are queued as they are delivered
+    store.read_messages("reader", [msgs[2].id])
+    store.group_fanout_limit = 0
+    store.create_group("pair", ["reader", "friend"])
+    group_msg = Message(id=uuid.uuid4().bytes, sender="friend", group="pair", body="hi all", timestamp=0)
+    store.send_group_message(group_msg)
+    late = send(store, "reader", 4)
+    store.delete_messages("reader", [late.id])
+
+    read = store.read_next("reader", 10)
+    assert [m.id for m in read] == [msgs[3].id, group_msg.id] and all(m.read for m in read)
+    assert store.read_next("reader", 10) == []
+    assert store.inbox_summary("reader").unread == 0
+    # ========================================================================================== #
+
+
+def test_retention(store):
+    # The expiry passes are run by hand instead of by the background thread
+    store.retention.policy = RetentionPolicy(max_age=100, max_messages=3, read_ttl=10)
+    store.create_user("keeper", "password")
+    store.create_user("friend", "password")
+    now = time.time()
+    msgs = [send(store, "keeper", now + i) for i in range(4)]
+    size = lambda msg: len(msg.body.encode())
+
+    # ========================================== TEST ========================================== #
+    # The oldest messages beyond max_messages are deleted, like any other delete
+    store.expire(now)
+    sync = store.get_messages("keeper", 4, 0, None, False)
+    assert sync.deleted_ids == [uuid.UUID(bytes=msgs[0].id)]
+    assert (store.retention.expired, store.retention.reclaimed_bytes) == (1, size(msgs[0]))
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Read messages are deleted read_ttl after they are read
+    store.read_messages("keeper", [msgs[1].id])
+    store.expire(now + 5)
+    assert store.inbox_summary("keeper").total == 3
+    store.expire(now + 30)
+    assert store.inbox_summary("keeper").total == 2
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Every message is deleted max_age after its timestamp, except the ones deleted before, and a group message is
+    # reclaimed from its group once every member's copy is deleted
+    store.create_group("pair", ["keeper", "friend"])
+    group_msg = Message(id=uuid.uuid4().bytes, sender="friend", group="pair", body="hi all", timestamp=now + 4)
+    store.send_group_message(group_msg)
+    store.delete_messages("keeper", [msgs[3].id])
+
+    store.expire(now + 200)
+    assert store.inbox_summary("keeper").total == 0
+    assert store.inbox_summary("friend").total == 0
+    assert store.retention.expired == 5
+    assert store.retention.reclaimed_bytes == size(msgs[0]) + size(msgs[1]) + size(msgs[2])
+    assert store.stats().messages == 0 and store.message_bytes == 0
+    # ========================================================================================== #
+
+
+def test_invalid_requests(store):
+    store.create_user("owner", "password")
+    store.create_user("intruder", "password")
+    msg = send(store, "owner", 1)
+
+    # ========================================== TEST ========================================== #
+    # Reading or deleting someone else's message fails
+    with pytest.raises(AssertionError):
+        store.read_messages("intruder", [msg.id])
+    with pytest.raises(AssertionError):
+        store.delete_messages("intruder", [msg.id])
+
+    # So does reading a message twice, and SQLite rolls back the rest of the batch along with it
+    store.read_messages("owner", [msg.id])
+    other = send(store, "owner", 2)
+    with pytest.raises(AssertionError):
+        store.read_messages("owner", [other.id, msg.id])
+
+    if isinstance(store, SqliteStorage):
+        sync = store.get_messages("owner", 0, 0, None, False)
+        assert [m.read for m in sync.messages] == [True, False] and sync.seq == 3
+    # ========================================================================================== #
+
+
+def test_subscribe(store):
+    store.create_user("watcher", "password")
+    msgs = [send(store, "watcher", timestamp) for timestamp in range(3)]
+
+    # ========================================== TEST ========================================== #
+    events = EventList()
+    assert not store.subscribe("nobody", events, 0)
+    assert store.subscribe("watcher", events, 2)
+
+    assert events == [MessageEvent(event_type=MessageEvent.EventType.NEW, message=msgs[1]),
+                      MessageEvent(event_type=MessageEvent.EventType.NEW, message=msgs[2]),
+                      MessageEvent(event_type=MessageEvent.EventType.SYNCED, seq=3)]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    events.clear()
+    new_msg = send(store, "watcher", 5)
+    store.read_messages("watcher", [msgs[0].id])
+    store.delete_messages("watcher", [msgs[1].id])
+
+    read_msg = Message()
+    read_msg.CopyFrom(msgs[0])
+    read_msg.read = True
+
+    assert events == [MessageEvent(event_type=MessageEvent.EventType.NEW, message=new_msg, seq=4),
+                      MessageEvent(event_type=MessageEvent.EventType.READ, message=read_msg, seq=5),
+                      MessageEvent(event_type=MessageEvent.EventType.DELETED, message=Message(id=msgs[1].id), seq=6)]
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Stats count the open stream along with the remaining messages
+    bodies = [msgs[0].body, msgs[2].body, new_msg.body]
+    assert store.stats() == StorageStats(users=1,
+                                         groups=0,
+                                         messages=3,
+                                         message_bytes=sum(len(body.encode()) for body in bodies),
+                                         subscribers=1)
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    events.clear()
+    store.delete_user("watcher")
+    assert events == [None]
+
+    store.unsubscribe("watcher", events)
+    # ========================================================================================== #
+
+
+def test_sqlite_reopen(tmp_path):
+    path = str(tmp_path / "chat.db")
+    store = SqliteStorage(path, fsync=False)
+    store.create_user("keeper", "password")
+    msgs = [send(store, "keeper", timestamp) for timestamp in range(3)]
+    store.read_messages("keeper", [msgs[0].id])
+    store.delete_messages("keeper", [msgs[1].id])
+    before = store.get_messages("keeper", 0, 0, None, False)
+    store.close()
+
+    # ========================================== TEST ========================================== #
+    store = SqliteStorage(path, fsync=False)
+    assert store.get_password("keeper") == "password"
+    assert store.get_messages("keeper", 0, 0, None, False) == before
+
+    # Delta syncs continue across the restart
+    sync = store.get_messages("keeper", 4, 0, None, False)
+    assert not sync.full_sync and sync.seq == 5 and sync.deleted_ids == [uuid.UUID(bytes=msgs[1].id)]
+    store.close()
+    # ========================================================================================== #
@@ -0,0 +1,66 @@
+"""
+This file tests the transport settings of the server and the clients.
+
+A ChatServer that compresses GetMessages responses is served with the configured server options on the port after the
+rate limit test's, and a client that compresses its SendMessages requests sends a batch and reads it back.
+"""
+
+import uuid
+import pytest
+
+from concurrent import futures
+
+from protos.chat_pb2 import *
+from protos.chat_pb2_grpc import *
+from config import LOCALHOST, MAX_MESSAGE_BYTES, SERVER_PORT
+from server import ChatServer
+from transport import ClientCompression, CompressionInterceptor, channel_options, server_options
+
+SERVER_ADDR = f"{LOCALHOST}:{SERVER_PORT + 8}"
+
+
+@pytest.fixture()
+def compressed_stub(monkeypatch):
+    """Fixture to serve a server that compresses responses, and connect to it with a client that compresses requests."""
+    monkeypatch.setattr("server.DEBUG", False)
+
+    chat_server = ChatServer()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4),
+                         interceptors=[CompressionInterceptor({"GetMessages": grpc.Compression.Gzip})],
+                         options=server_options())
+    add_ChatServicer_to_server(chat_server, server)
+    server.add_insecure_port(SERVER_ADDR)
+    server.start()
+
+    channel = grpc.insecure_channel(SERVER_ADDR, options=channel_options())
+    yield ChatStub(grpc.intercept_channel(channel, ClientCompression({"SendMessages": grpc.Compression.Deflate})))
+
+    channel.close()
+    server.stop(None)
+    chat_server.close()
+
+
+def test_compression(compressed_stub):
+    stub = compressed_stub
+    for username in ["compressor", "decompressor"]:
+        req = AuthRequest(action_type=AuthRequest.ActionType.CREATE_ACCOUNT, username=username, password="password")
+        assert stub.Authenticate(req).status == Status.SUCCESS
+
+    # ========================================== TEST ========================================== #
+    msgs = [Message(id=uuid.uuid4().bytes, sender="compressor", recipient="decompressor", body="squeeze me " * 100,
+                    timestamp=i) for i in range(100)]
+    resp = stub.SendMessages(iter([SendMessagesRequest(username="compressor", messages=msgs)]))
+    assert resp.status == Status.SUCCESS and len(resp.results) == len(msgs)
+
+    resp = stub.GetMessages(GetMessagesRequest(username="decompressor"))
+    assert resp.status == Status.SUCCESS
+    assert sorted(resp.messages, key=lambda msg: msg.timestamp) == msgs
+    # ========================================================================================== #
+
+    # ========================================== TEST ========================================== #
+    # Messages over the size limit are refused
+    big = Message(id=uuid.uuid4().bytes, sender="compressor", recipient="decompressor", body="x" * MAX_MESSAGE_BYTES)
+    with pytest.raises(grpc.RpcError) as e:
+        stub.SendMessage(SendMessageRequest(username="compressor", message=big))
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    # ========================================================================================== #
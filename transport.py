@@ -0,0 +1,133 @@
+import grpc
+
+from sessions import CallDetails
+from config import FLOW_CONTROL_WINDOW, KEEPALIVE_TIME, KEEPALIVE_TIMEOUT, MAX_CONCURRENT_STREAMS, MAX_MESSAGE_BYTES
+
+ALGORITHMS = {"none": grpc.Compression.NoCompression,
+              "gzip": grpc.Compression.Gzip,
+              "deflate": grpc.Compression.Deflate}
+
+
+def method_compression(methods: dict[str, str]) -> dict[str, grpc.Compression]:
+    """The configured compression algorithm of each method, by method name."""
+    return {method: ALGORITHMS[algorithm] for method, algorithm in methods.items()}
+
+
+def common_options() -> list[tuple[str, int]]:
+    """Options of both ends of a connection: message size limits, keepalive pings, and HTTP/2 flow control."""
+    options = [("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+               ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES)]
+    if KEEPALIVE_TIME:
+        options += [("grpc.keepalive_time_ms", int(KEEPALIVE_TIME * 1000)),
+                    ("grpc.keepalive_timeout_ms", int(KEEPALIVE_TIMEOUT * 1000)),
+                    ("grpc.keepalive_permit_without_calls", 1),
+                    ("grpc.http2.max_pings_without_data", 0)]
+    if FLOW_CONTROL_WINDOW:
+        # A fixed window per stream, instead of the one gRPC sizes to the bandwidth-delay product of the connection
+        options += [("grpc.http2.lookahead_bytes", FLOW_CONTROL_WINDOW),
+                    ("grpc.http2.bdp_probe", 0)]
+    return options
+
+
+def server_options() -> list[tuple[str, int]]:
+    options = common_options() + [("grpc.max_concurrent_streams", MAX_CONCURRENT_STREAMS)]
+    if KEEPALIVE_TIME:
+        # Accept the pings of clients as often as they are configured to send them
+        options.append(("grpc.http2.min_ping_interval_without_data_ms", int(KEEPALIVE_TIME * 1000)))
+    return options
+
+
+def channel_options() -> list[tuple[str, int]]:
+    return common_options()
+
+
+class CompressionInterceptor(grpc.ServerInterceptor):
+    """Compresses the responses of each method configured with an algorithm, on a thread pool server."""
+
+    def __init__(self, compression: dict[str, grpc.Compression]):
+        self.compression = compression
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        algorithm = self.compression.get(handler_call_details.method.rsplit("/", 1)[-1])
+        if handler is None or algorithm is None:
+            return handler
+
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+        else:
+            return handler
+
+        def wrapped(request, context):
+            context.set_compression(algorithm)
+            return behavior(request, context)
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+
+class AioCompressionInterceptor(grpc.aio.ServerInterceptor):
+    """Compresses the responses of each method configured with an algorithm, on a grpc.aio server."""
+
+    def __init__(self, compression: dict[str, grpc.Compression]):
+        self.compression = compression
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        algorithm = self.compression.get(handler_call_details.method.rsplit("/", 1)[-1])
+        if handler is None or algorithm is None:
+            return handler
+
+        if handler.unary_unary is not None:
+            behavior, wrap = handler.unary_unary, grpc.unary_unary_rpc_method_handler
+
+            async def wrapped(request, context):
+                context.set_compression(algorithm)
+                return await behavior(request, context)
+        elif handler.unary_stream is not None:
+            behavior, wrap = handler.unary_stream, grpc.unary_stream_rpc_method_handler
+
+            async def wrapped(request, context):
+                context.set_compression(algorithm)
+                async for response in behavior(request, context):
+                    yield response
+        elif handler.stream_unary is not None:
+            behavior, wrap = handler.stream_unary, grpc.stream_unary_rpc_method_handler
+
+            async def wrapped(request_iterator, context):
+                context.set_compression(algorithm)
+                return await behavior(request_iterator, context)
+        else:
+            return handler
+
+        return wrap(wrapped,
+                    request_deserializer=handler.request_deserializer,
+                    response_serializer=handler.response_serializer)
+
+
+class ClientCompression(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor,
+                        grpc.StreamUnaryClientInterceptor):
+    """Compresses the requests of each method configured with an algorithm, on a client channel."""
+
+    def __init__(self, compression: dict[str, grpc.Compression]):
+        self.compression = compression
+
+    def details(self, client_call_details):
+        algorithm = self.compression.get(client_call_details.method.rsplit("/", 1)[-1])
+        if algorithm is None or client_call_details.compression is not None:
+            return client_call_details
+        return CallDetails.of(client_call_details)._replace(compression=algorithm)
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return continuation(self.details(client_call_details), request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return continuation(self.details(client_call_details), request)
+
+    def intercept_stream_unary(self, continuation, client_call_details, request_iterator):
+        return continuation(self.details(client_call_details), request_iterator)
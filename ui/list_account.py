@@ -22,6 +22,8 @@ class ListUsers(QWidget):
         self.search_button = QPushButton("Search")
         self.account_list = QListWidget()
         self.account_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        self.more_button = QPushButton("More")
+        self.more_button.setEnabled(False)
 
         self.frame_layout.addWidget(self.frame_label)
 
@@ -32,6 +34,7 @@ class ListUsers(QWidget):
 
         self.frame_layout.addLayout(self.entry_box)
         self.frame_layout.addWidget(self.account_list)
+        self.frame_layout.addWidget(self.more_button)
 
         self.frame = QFrame()
         self.setLayout(self.frame_layout)
@@ -60,11 +60,9 @@ class ViewMessage(QWidget):
         self.message_list.blockSignals(True)
         self.message_list.clear()
 
-        # Rerender each message one by one
-        num_unread = 0
+        # Rerender each message one by one (unread messages stay hidden until they are read)
         for message in messages:
             if not message.read:
-                num_unread += 1
                 continue
 
             # Convert timestamp to a readable string
@@ -87,6 +85,9 @@ class ViewMessage(QWidget):
         # Unblock UI updates
         self.message_list.blockSignals(False)
         self.message_list.repaint()
+
+    def update_unread_count(self, num_unread: int):
+        # The count comes from the server, which counts the whole inbox, not just the messages shown
         self.unread_count_label.setText(f"Unread: {num_unread}")
 
 